@@ -2,19 +2,35 @@
 """
 Sistema de Gerenciamento de Banca Esportiva - Versão CLI
 Aplicação de linha de comando para gerenciar banca esportiva sem dependências de rede.
+
+Sem argumentos abre o menu interativo. Com um subcomando roda sem interação
+e imprime o resultado em JSON:
+
+    python app.py add-transaction --user ana --type deposit --amount 50
+    python app.py report --user ana
+    python app.py batch --file comandos.txt --atomic
+
+Com `python app.py serve` rodando, os subcomandos são atendidos por um daemon
+residente (socket Unix), sem reler o arquivo de dados a cada execução.
 """
 
 import json
 import os
 import sys
 from datetime import datetime, timedelta
-import hashlib
 
 # Importar módulos locais
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-from db.models import Database
+from db.dates import day_of
+from db.models import Balance, Database, Goal, Transaction, User
+from db.records import json_default
 from services.forecast_engine import ForecastEngine
 from services.report import ReportService
+from services.importer import ImportService
+from services.exporter import ExportService
+from services.passwords import hasher
+from services.commands import CommandError, CommandService, build_parser
+from services import daemon
 
 class BankingCLI:
     def __init__(self):
@@ -24,8 +40,8 @@ class BankingCLI:
         self.current_user = None
         
     def hash_password(self, password):
-        """Hash da senha usando SHA-256"""
-        return hashlib.sha256(password.encode()).hexdigest()
+        """Hash da senha com o serviço de senhas (mesmo formato da versão web)"""
+        return hasher.hash(password)
     
     def clear_screen(self):
         """Limpa a tela do terminal"""
@@ -72,7 +88,8 @@ class BankingCLI:
         username = self.get_input("Nome de usuário")
         
         # Verificar se usuário já existe
-        if self.db.get_user_by_username(username):
+        users = User(self.db)
+        if users.get_user_by_username(username):
             print("❌ Usuário já existe!")
             return False
         
@@ -80,14 +97,7 @@ class BankingCLI:
         email = self.get_input("Email")
         
         # Criar usuário
-        user_data = {
-            'username': username,
-            'password': self.hash_password(password),
-            'email': email
-        }
-        
-        user_id = self.db.create_user(user_data)
-        if user_id:
+        if users.create_user(username, self.hash_password(password), email):
             print("✅ Usuário registrado com sucesso!")
             return True
         else:
@@ -101,8 +111,14 @@ class BankingCLI:
         username = self.get_input("Nome de usuário")
         password = self.get_input("Senha")
         
-        user = self.db.get_user_by_username(username)
-        if user and user['password'] == self.hash_password(password):
+        users = User(self.db)
+        user = users.get_user_by_username(username)
+        valid, new_hash = (hasher.verify_and_update(user['password'], password) if user
+                           else hasher.verify_dummy(password))
+        if valid:
+            if new_hash:
+                # Migra hashes SHA-256 antigos (ou de custo desatualizado)
+                users.update_password(user['id'], new_hash)
             self.current_user = user
             print(f"✅ Bem-vindo, {username}!")
             return True
@@ -117,20 +133,22 @@ class BankingCLI:
         
         user_id = self.current_user['id']
         
-        # Obter dados
-        balances = self.db.get_balances_by_user(user_id)
-        transactions = self.db.get_transactions_by_user(user_id)
-        goals = self.db.get_goals_by_user(user_id)
+        # Obter dados (apenas os registros exibidos)
+        balance_model = Balance(self.db)
+        first_balance = balance_model.get_balances_page(user_id, limit=1)
+        last_balance = balance_model.get_last_balances(user_id, 1)
+        transactions = Transaction(self.db).get_last_transactions(user_id, 5)
+        goals = Goal(self.db).get_goals_by_user(user_id)
         
         self.print_header(f"DASHBOARD - {self.current_user['username']}")
         
         # Saldo atual
-        current_balance = balances[-1]['amount'] if balances else 0
+        current_balance = last_balance[0]['amount'] if last_balance else 0
         print(f"💰 Saldo Atual: {self.format_currency(current_balance)}")
         
         # Estatísticas
-        if balances:
-            initial_balance = balances[0]['amount']
+        if first_balance:
+            initial_balance = first_balance[0]['amount']
             profit_loss = current_balance - initial_balance
             profit_percentage = (profit_loss / initial_balance * 100) if initial_balance > 0 else 0
             
@@ -139,18 +157,20 @@ class BankingCLI:
         
         # Transações recentes
         if transactions:
-            print(f"\n📋 Últimas {min(5, len(transactions))} transações:")
-            for transaction in transactions[-5:]:
+            print(f"\n📋 Últimas {len(transactions)} transações:")
+            for transaction in transactions:
                 date = transaction['date']
                 type_symbol = "💰" if transaction['type'] == 'deposit' else "💸"
                 print(f"  {type_symbol} {date}: {self.format_currency(transaction['amount'])}")
         
-        # Metas
+        # Metas (todas avaliadas com uma única regressão da série de saldos)
         if goals:
+            balances = balance_model.get_balances_by_user(user_id)
             print(f"\n🎯 Metas ativas: {len(goals)}")
-            for goal in goals:
-                progress = (current_balance / goal['target_amount'] * 100) if goal['target_amount'] > 0 else 0
-                print(f"  • {goal['description']}: {progress:.1f}% ({self.format_currency(goal['target_amount'])})")
+            for goal in self.forecast_engine.evaluate_goals(balances, goals):
+                forecast = f" — previsão: {goal['predicted_date']}" if goal['predicted_date'] else ""
+                print(f"  • {goal['description'] or 'Meta'}: {goal['progress']:.1f}% "
+                      f"({self.format_currency(goal['target_amount'])}){forecast}")
         
         print("-"*60)
     
@@ -213,14 +233,7 @@ class BankingCLI:
         target_amount = self.get_input("Valor alvo", float)
         target_date = self.get_input("Data alvo (YYYY-MM-DD)", str)
         
-        goal_data = {
-            'user_id': self.current_user['id'],
-            'description': description,
-            'target_amount': target_amount,
-            'target_date': target_date
-        }
-        
-        if self.db.create_goal(goal_data):
+        if Goal(self.db).add_goal(self.current_user['id'], target_amount, description, target_date):
             print(f"✅ Meta '{description}' de {self.format_currency(target_amount)} criada!")
         else:
             print("❌ Erro ao criar meta!")
@@ -230,19 +243,18 @@ class BankingCLI:
         self.print_header("PREVISÃO DE CRESCIMENTO")
         
         user_id = self.current_user['id']
-        balances = self.db.get_balances_by_user(user_id)
+        balances = Balance(self.db).get_balances_by_user(user_id)
         
         if len(balances) < 2:
             print("❌ Dados insuficientes para previsão (mínimo 2 registros de saldo)")
             return
         
         # Preparar dados para previsão
-        dates = [datetime.strptime(b['date'], '%Y-%m-%d') for b in balances]
         amounts = [b['amount'] for b in balances]
         
         # Converter datas para números (dias desde o primeiro registro)
-        base_date = dates[0]
-        x_values = [(d - base_date).days for d in dates]
+        base_day = day_of(balances[0])
+        x_values = [day_of(b) - base_day for b in balances]
         
         # Fazer previsão
         try:
@@ -287,6 +299,44 @@ class BankingCLI:
         except Exception as e:
             print(f"❌ Erro ao gerar relatórios: {e}")
     
+    def import_file(self):
+        """Importa saldos e transações de um arquivo CSV/NDJSON"""
+        self.print_header("IMPORTAR ARQUIVO")
+        
+        path = self.get_input("Caminho do arquivo (.csv ou .ndjson)")
+        if not os.path.exists(path):
+            print("❌ Arquivo não encontrado!")
+            return
+        
+        try:
+            result = ImportService.import_file(self.db, self.current_user['id'], path)
+        except (ValueError, IOError) as e:
+            print(f"❌ Erro ao importar arquivo: {e}")
+            return
+        
+        print(f"✅ {result['balances']} saldo(s) e {result['transactions']} transação(ões) importados!")
+        print(f"   Datas recalculadas: {result['recalculated_dates']}")
+        if result['error_count']:
+            print(f"⚠️  {result['error_count']} linha(s) ignoradas:")
+            for line_no, message in result['errors'][:10]:
+                print(f"   linha {line_no}: {message}")
+    
+    def export_file(self):
+        """Exporta o histórico do usuário para um arquivo CSV/NDJSON"""
+        self.print_header("EXPORTAR HISTÓRICO")
+        
+        path = self.get_input("Arquivo de destino (.csv ou .ndjson)")
+        start = self.get_input("Data inicial (YYYY-MM-DD) ou Enter para todo o período", str, False)
+        end = self.get_input("Data final (YYYY-MM-DD) ou Enter para todo o período", str, False)
+        fmt = 'ndjson' if path.lower().endswith(('.ndjson', '.jsonl')) else 'csv'
+        
+        try:
+            ExportService.export_file(self.db, self.current_user['id'], path,
+                                      fmt=fmt, start=start or None, end=end or None)
+            print(f"✅ Histórico exportado para {path}!")
+        except (ValueError, IOError) as e:
+            print(f"❌ Erro ao exportar histórico: {e}")
+    
     def reset_bank(self):
         """Reset da banca"""
         self.print_header("RESET DA BANCA")
@@ -298,11 +348,7 @@ class BankingCLI:
             user_id = self.current_user['id']
             
             # Remover todos os dados do usuário
-            self.db.data['balances'] = [b for b in self.db.data['balances'] if b['user_id'] != user_id]
-            self.db.data['transactions'] = [t for t in self.db.data['transactions'] if t['user_id'] != user_id]
-            self.db.data['goals'] = [g for g in self.db.data['goals'] if g['user_id'] != user_id]
-            
-            self.db.save_data()
+            self.db.delete_user_data(user_id)
             print("✅ Banca resetada com sucesso!")
         else:
             print("❌ Reset cancelado.")
@@ -320,6 +366,8 @@ class BankingCLI:
                 "Ver Previsões",
                 "Ver Relatórios",
                 "Reset da Banca",
+                "Importar Arquivo",
+                "Exportar Histórico",
                 "Logout"
             ]
             
@@ -328,7 +376,7 @@ class BankingCLI:
             try:
                 choice = int(input("Escolha uma opção: "))
                 
-                if choice == 0 or choice == 7:  # Logout
+                if choice == 0 or choice == 9:  # Logout
                     self.current_user = None
                     break
                 elif choice == 1:
@@ -343,10 +391,14 @@ class BankingCLI:
                     self.show_reports()
                 elif choice == 6:
                     self.reset_bank()
+                elif choice == 7:
+                    self.import_file()
+                elif choice == 8:
+                    self.export_file()
                 else:
                     print("❌ Opção inválida!")
                 
-                if choice != 0 and choice != 7:
+                if choice != 0 and choice != 9:
                     input("\nPressione Enter para continuar...")
                     
             except ValueError:
@@ -389,6 +441,51 @@ class BankingCLI:
                 print("\n👋 Até logo!")
                 break
 
+def main(argv=None):
+    """Ponto de entrada: menu interativo ou subcomando não interativo"""
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        BankingCLI().run()
+        return 0
+    
+    try:
+        args = build_parser().parse_args(argv)
+    except CommandError as e:
+        print(json.dumps({'error': str(e)}, ensure_ascii=False))
+        return 2
+    
+    options = vars(args)
+    name = options.pop('command')
+    db_path = options.pop('db')
+    socket_path = options.pop('socket') or daemon.default_socket_path(db_path)
+    use_daemon = not options.pop('no_daemon') and os.environ.get('META_CLI_DAEMON', '1') != '0'
+    
+    if name == 'serve':
+        if not daemon.available():
+            print(json.dumps({'error': "Sockets Unix não são suportados nesta plataforma"}))
+            return 1
+        server = daemon.CommandDaemon(db_path, socket_path)
+        print(json.dumps({'serving': server.socket_path, 'db': server.db_path, 'pid': os.getpid()}), flush=True)
+        server.serve()
+        return 0
+    
+    lines = None
+    if name == 'batch':
+        if options['file'] == '-':
+            lines = sys.stdin.readlines()
+        else:
+            with open(options['file'], 'r', encoding='utf-8') as f:
+                lines = f.readlines()
+    
+    # Com o daemon rodando, o comando é atendido pelo Database já carregado
+    response = daemon.send_command(socket_path, db_path, name, options, lines) if use_daemon else None
+    if response is not None:
+        status, output = response['status'], response['output']
+    else:
+        status, output = CommandService(Database(db_path)).dispatch(name, options, lines)
+    
+    print(json.dumps(output, ensure_ascii=False, default=json_default))
+    return status
+
 if __name__ == "__main__":
-    app = BankingCLI()
-    app.run()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
@@ -1,23 +1,30 @@
 # Nome do arquivo completo: auth/auth.py
 
 from flask import Blueprint, render_template, request, redirect, url_for, flash, session
-from werkzeug.security import generate_password_hash, check_password_hash
-import sqlite3
-from db.models import create_user, get_user_by_username
+from db import get_db
+from db.models import User
+from services.passwords import hash_password, verify_password, PasswordServiceBusy
 
 auth_bp = Blueprint('auth', __name__, url_prefix='')
 
 @auth_bp.route('/register', methods=['GET', 'POST'])
 def register():
     if request.method == 'POST':
-        username = request.form['username']
-        password = generate_password_hash(request.form['password'])
-        try:
-            create_user(username, password)
-            flash("Registro realizado com sucesso! Faça login.", "success")
-            return redirect(url_for('auth.login'))
-        except sqlite3.IntegrityError:
+        username = request.form['username'].strip()
+        users = User(get_db())
+        # Checa antes de gerar o hash para não gastar CPU com nomes já usados
+        if users.get_user_by_username(username):
             flash("Nome de usuário já existe. Tente outro.", "danger")
+        else:
+            try:
+                password = hash_password(request.form['password'])
+            except PasswordServiceBusy:
+                flash("Servidor ocupado. Tente novamente em instantes.", "warning")
+                return render_template('register.html'), 503
+            if users.create_user(username, password):
+                flash("Registro realizado com sucesso! Faça login.", "success")
+                return redirect(url_for('auth.login'))
+            flash("Nome de usuário inválido ou já existente.", "danger")
     return render_template('register.html')
 
 @auth_bp.route('/login', methods=['GET', 'POST'])
@@ -25,11 +32,23 @@ def login():
     if request.method == 'POST':
         username = request.form['username']
         passwd = request.form['password']
-        user = get_user_by_username(username)
-        if user and check_password_hash(user['password'], passwd):
+        users = User(get_db())
+        user = users.get_user_by_username(username)
+        try:
+            # Usuário inexistente também paga uma verificação, para não ser distinguível
+            valid, new_hash = verify_password(user['password'] if user else None, passwd)
+        except PasswordServiceBusy:
+            flash("Servidor ocupado. Tente novamente em instantes.", "warning")
+            return render_template('login.html'), 503
+        if valid:
+            if new_hash:
+                # Parâmetros de hash mudaram: regrava com o custo atual
+                users.update_password(user['id'], new_hash)
             session.clear()
             session['user_id'] = user['id']
             session['username'] = user['username']
+            # Registro resumido em sessão: as views não precisam buscar o usuário
+            session['user'] = {'id': user['id'], 'username': user['username']}
             flash("Login realizado com sucesso!", "success")
             return redirect(url_for('dashboard.dashboard'))
         flash("Credenciais inválidas.", "danger")
@@ -0,0 +1,4 @@
+"""
+Benchmarks dos caminhos de armazenamento, relatórios, previsão e dashboard
+Uso: python -m benchmarks.run --help
+"""
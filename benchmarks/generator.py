@@ -0,0 +1,77 @@
+"""
+Gerador determinístico de dados sintéticos
+Produz N usuários × M dias × K transações por dia no mesmo formato de
+data.json, com saldos diários coerentes com as transações.
+"""
+import random
+from datetime import date, datetime, timedelta
+from typing import Dict
+
+START_DATE = date(2023, 1, 1)
+CREATED_AT = datetime(2024, 1, 1, 12, 0, 0)
+
+
+def generate_dataset(users: int = 10, days: int = 365, tx_per_day: int = 3,
+                     seed: int = 42) -> Dict:
+    """Gera a estrutura completa do banco de dados
+
+    O resultado depende apenas dos parâmetros e da semente, para que duas
+    execuções comparem exatamente a mesma carga.
+    """
+    rng = random.Random(seed)
+    data = {'users': [], 'balances': [], 'transactions': [], 'goals': [], 'rollups': []}
+    balance_id = transaction_id = 0
+
+    for user_id in range(1, users + 1):
+        data['users'].append({
+            'id': user_id,
+            'username': f"bench_user_{user_id}",
+            'password': 'pbkdf2:sha256:1$bench$0',
+            'created_at': CREATED_AT.isoformat()
+        })
+        data['goals'].append({
+            'id': user_id,
+            'user_id': user_id,
+            'target_amount': float(rng.randrange(5_000, 50_000)),
+            'created_at': CREATED_AT.isoformat(),
+            'updated_at': CREATED_AT.isoformat()
+        })
+
+        amount = float(rng.randrange(500, 5_000))
+        for day in range(days):
+            date_str = (START_DATE + timedelta(days=day)).isoformat()
+            stamp = (CREATED_AT + timedelta(days=day)).isoformat()
+            deposits = withdrawals = 0.0
+            for _ in range(tx_per_day):
+                transaction_id += 1
+                # Leve tendência de alta para que as previsões tenham solução
+                type_ = 'deposit' if rng.random() < 0.55 else 'withdrawal'
+                value = round(rng.uniform(5, 200), 2)
+                if type_ == 'deposit':
+                    deposits += value
+                else:
+                    withdrawals += value
+                data['transactions'].append({
+                    'id': transaction_id,
+                    'user_id': user_id,
+                    'date': date_str,
+                    'type': type_,
+                    'amount': value,
+                    'description': f"Aposta {transaction_id}",
+                    'created_at': stamp
+                })
+
+            amount = round(amount + deposits - withdrawals, 2)
+            balance_id += 1
+            data['balances'].append({
+                'id': balance_id,
+                'user_id': user_id,
+                'date': date_str,
+                'amount': amount,
+                'deposits': round(deposits, 2),
+                'withdrawals': round(withdrawals, 2),
+                'created_at': stamp,
+                'updated_at': stamp
+            })
+
+    return data
@@ -0,0 +1,453 @@
+"""
+Teste de carga da aplicação web com sessões concorrentes
+
+    python -m benchmarks.load --users 10 --clients 32 --duration 30
+    python -m benchmarks.load --clients 64 --processes 4 --output load.json
+
+Gera o conjunto sintético dos benchmarks em um diretório temporário, sobe a
+aplicação (blueprints auth e dashboard) em um processo separado, em
+127.0.0.1, e dispara clientes concorrentes em threads (ou em vários
+processos, com --processes). Cada cliente faz login com um dos usuários e
+segue uma mistura de visitas ao dashboard, consultas ao histórico,
+transações novas, edições e previsões (--mix). Nada sai da máquina.
+
+O resultado traz, por rota, requisições, erros, vazão e latências p50, p95
+e p99. Ao final o arquivo de dados é relido para contar atualizações
+perdidas: transações confirmadas (redirecionamento) que não estão no
+arquivo e edições confirmadas cujo valor final não é o último enviado. Cada
+cliente edita apenas as suas próprias transações, então o último valor
+confirmado é sempre o esperado; transações com uma edição sem resposta
+ficam de fora da conta (a falha já aparece como erro). Erros ou
+atualizações perdidas fazem o comando terminar com código 1.
+"""
+import argparse
+import http.client
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlencode
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.generator import START_DATE, generate_dataset
+from db import codec
+from db.money import to_cents
+
+LOAD_PASSWORD = 'load-test'
+DEFAULT_MIX = {'dashboard': 50, 'history': 10, 'add': 15, 'edit': 15, 'predict': 10}
+# Transações editáveis: as dos últimos dias, como em um uso normal
+EDIT_WINDOW_DAYS = 30
+PERCENTILES = (50, 95, 99)
+SERVER_START_TIMEOUT = 30.0
+REQUEST_TIMEOUT = 60.0
+LOGIN_RETRY_DELAY = 0.5
+
+# (rota, segundos, sucesso)
+Sample = Tuple[str, float, bool]
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """Percentil pelo método do posto mais próximo"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def parse_mix(value: str) -> Dict[str, int]:
+    """'dashboard=50,add=20' -> {'dashboard': 50, 'add': 20}"""
+    mix = {}
+    for part in value.split(','):
+        name, sep, weight = part.partition('=')
+        name = name.strip()
+        if not sep or name not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(
+                f"Mistura inválida: '{part}' (ações: {', '.join(DEFAULT_MIX)})")
+        try:
+            mix[name] = int(weight)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"Peso inválido: '{part}'")
+    if not any(w > 0 for w in mix.values()):
+        raise argparse.ArgumentTypeError("A mistura precisa de ao menos um peso positivo")
+    return mix
+
+
+# ----------------------------------------------------------------------
+# Servidor
+# ----------------------------------------------------------------------
+
+def serve(workdir: str):
+    """Sobe a aplicação em uma porta livre e anuncia 'ready <porta>' na saída"""
+    os.chdir(workdir)
+    from benchmarks.run import ScenarioUnavailable, _make_app
+    try:
+        app = _make_app()
+        from werkzeug.serving import make_server
+    except (ScenarioUnavailable, ImportError) as e:
+        print(f"unavailable {e}", flush=True)
+        return 2
+    from db import init_app
+    init_app(app)
+    app.config['TESTING'] = False
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    print(f"ready {server.server_port}", flush=True)
+    server.serve_forever()
+    return 0
+
+
+def start_server(workdir: str) -> Tuple[subprocess.Popen, int]:
+    """Processo do servidor e porta em que ele atende"""
+    # O log de acesso vai para um arquivo: um pipe que ninguém lê enche e
+    # trava o servidor no meio da carga
+    log_path = os.path.join(workdir, 'server.log')
+    with open(log_path, 'w', encoding='utf-8') as log:
+        process = subprocess.Popen([sys.executable, '-m', 'benchmarks.load', '--serve', workdir],
+                                   cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                   stdout=subprocess.PIPE, stderr=log, text=True)
+    result = {}
+
+    def read_ready():
+        result['line'] = process.stdout.readline().strip()
+
+    reader = threading.Thread(target=read_ready, daemon=True)
+    reader.start()
+    reader.join(SERVER_START_TIMEOUT)
+    line = result.get('line', '')
+    if not line.startswith('ready '):
+        stop_server(process)
+        with open(log_path, 'r', encoding='utf-8', errors='replace') as log:
+            errors = log.read().strip().splitlines()
+        detail = line.partition(' ')[2] or (errors[-1] if errors else 'sem resposta')
+        raise RuntimeError(f"servidor não iniciou: {detail}")
+    return process, int(line.split()[1])
+
+
+def stop_server(process: subprocess.Popen):
+    if process.poll() is None:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+# ----------------------------------------------------------------------
+# Clientes
+# ----------------------------------------------------------------------
+
+class LoadClient:
+    """Uma sessão de navegador: cookies próprios e uma conexão HTTP"""
+
+    def __init__(self, spec: Dict, port: int, mix: Dict[str, int], seed: int):
+        self.spec = spec
+        self.rng = random.Random(seed)
+        self.connection = http.client.HTTPConnection('127.0.0.1', port, timeout=REQUEST_TIMEOUT)
+        self.cookies: Dict[str, str] = {}
+        self.actions = [name for name, weight in mix.items() if weight > 0]
+        self.weights = [mix[name] for name in self.actions]
+        self.samples: List[Sample] = []
+        self.status: Optional[int] = None
+        self.added = 0
+        # id da transação -> (data, tipo, último valor confirmado)
+        self.edits: Dict[int, Tuple] = {}
+        # Edições sem resposta: o servidor pode tê-las aplicado depois
+        self.uncertain: set = set()
+
+    def request(self, route: str, method: str, path: str, form: Optional[Dict] = None,
+                expect: Tuple[int, ...] = (200,)) -> bool:
+        headers = {}
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f"{k}={v}" for k, v in self.cookies.items())
+        body = None
+        if form is not None:
+            body = urlencode(form)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        started = time.perf_counter()
+        self.status = None
+        try:
+            self.connection.request(method, path, body=body, headers=headers)
+            response = self.connection.getresponse()
+            response.read()
+            self.status = response.status
+            ok = response.status in expect
+            for cookie in response.headers.get_all('Set-Cookie') or ():
+                name, _, value = cookie.split(';', 1)[0].partition('=')
+                self.cookies[name.strip()] = value
+        except (OSError, http.client.HTTPException):
+            self.connection.close()
+            ok = False
+        self.samples.append((route, time.perf_counter() - started, ok))
+        return ok
+
+    def login(self, deadline: float) -> bool:
+        # Login correto redireciona para o dashboard; credencial recusada volta 200.
+        # 503 é a fila de hash de senhas cheia: o cliente espera e tenta de novo,
+        # como faria o usuário, e a tentativa aparece em uma rota à parte
+        form = {'username': self.spec['username'], 'password': LOAD_PASSWORD}
+        while True:
+            if self.request('POST /login', 'POST', '/login', form, expect=(302,)):
+                return True
+            if self.status != 503 or time.time() >= deadline:
+                return False
+            route, seconds, _ = self.samples.pop()
+            self.samples.append((f"{route} (503)", seconds, True))
+            time.sleep(LOGIN_RETRY_DELAY)
+
+    def dashboard(self):
+        self.request('GET /dashboard', 'GET', '/dashboard')
+
+    def history(self):
+        self.request('GET /api/transactions', 'GET', '/api/transactions?limit=25')
+
+    def add(self):
+        form = {'date': self.spec['date'], 'type': self.rng.choice(('deposit', 'withdrawal')),
+                'amount': f"{self.rng.randrange(100, 20_000) / 100:.2f}"}
+        if self.request('POST /add_transaction', 'POST', '/add_transaction', form, expect=(302,)):
+            self.added += 1
+
+    def edit(self):
+        if not self.spec['editable']:
+            return self.dashboard()
+        transaction_id, date_str, type_ = self.rng.choice(self.spec['editable'])
+        amount = f"{self.rng.randrange(100, 20_000) / 100:.2f}"
+        if self.request('POST /edit_transaction/<id>', 'POST', f"/edit_transaction/{transaction_id}",
+                        {'date': date_str, 'type': type_, 'amount': amount}, expect=(302,)):
+            self.edits[transaction_id] = (date_str, type_, amount)
+        else:
+            self.uncertain.add(transaction_id)
+
+    def predict(self):
+        self.request('POST /predict', 'POST', '/predict',
+                     {'target_value': str(self.spec['target'])}, expect=(302,))
+
+    def run(self, start_at: float, deadline: float, max_requests: Optional[int]):
+        # Todos começam juntos: o login também acontece sob concorrência
+        time.sleep(max(0.0, start_at - time.time()))
+        if self.login(deadline):
+            while time.time() < deadline and (max_requests is None or len(self.samples) < max_requests):
+                getattr(self, self.rng.choices(self.actions, self.weights)[0])()
+        self.connection.close()
+
+    def result(self) -> Dict:
+        return {'user_id': self.spec['user_id'], 'samples': self.samples,
+                'added': self.added, 'edits': self.edits, 'uncertain': sorted(self.uncertain)}
+
+
+def run_clients(specs: List[Dict], port: int, mix: Dict[str, int], seed: int,
+                start_at: float, deadline: float, max_requests: Optional[int]) -> List[Dict]:
+    """Executa os clientes em threads e devolve o resultado de cada um"""
+    clients = [LoadClient(spec, port, mix, seed * 100_003 + spec['client']) for spec in specs]
+    threads = [threading.Thread(target=c.run, args=(start_at, deadline, max_requests)) for c in clients]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return [c.result() for c in clients]
+
+
+def _run_clients(args) -> List[Dict]:
+    return run_clients(*args)
+
+
+# ----------------------------------------------------------------------
+# Preparação e relatório
+# ----------------------------------------------------------------------
+
+def prepare_dataset(users: int, days: int, tx_per_day: int, seed: int) -> Dict:
+    """Conjunto sintético com senhas reais (mesmo hash para todos os usuários)"""
+    from services.passwords import hash_password
+    dataset = generate_dataset(users=users, days=days, tx_per_day=tx_per_day, seed=seed)
+    password = hash_password(LOAD_PASSWORD)
+    for user in dataset['users']:
+        user['password'] = password
+    return dataset
+
+
+def client_specs(dataset: Dict, clients: int, days: int) -> List[Dict]:
+    """Usuário, data das novas transações e transações editáveis de cada cliente
+
+    Clientes do mesmo usuário dividem as transações recentes entre si, para
+    que nenhuma seja editada por duas sessões.
+    """
+    users = dataset['users']
+    last_day = START_DATE + timedelta(days=days - 1)
+    window = (last_day - timedelta(days=EDIT_WINDOW_DAYS - 1)).isoformat()
+    recent = defaultdict(list)
+    for t in dataset['transactions']:
+        if t['date'] >= window:
+            recent[t['user_id']].append((t['id'], t['date'], t['type']))
+    targets = {g['user_id']: g['target_amount'] for g in dataset['goals']}
+
+    specs = []
+    for i in range(clients):
+        user = users[i % len(users)]
+        sharing = len(range(i % len(users), clients, len(users)))
+        slot = i // len(users)
+        specs.append({
+            'client': i,
+            'user_id': user['id'],
+            'username': user['username'],
+            'date': last_day.isoformat(),
+            'editable': recent[user['id']][slot::sharing],
+            'target': targets.get(user['id'], 10_000.0)
+        })
+    return specs
+
+
+def lost_updates(path: str, dataset: Dict, results: List[Dict]) -> Dict:
+    """Compara o arquivo final com o que o servidor confirmou"""
+    from db.models import Database
+    db = Database(path)
+    view = db.snapshot()
+    initial = defaultdict(int)
+    for t in dataset['transactions']:
+        initial[t['user_id']] += 1
+    added = defaultdict(int)
+    edits = {}
+    uncertain = set()
+    for result in results:
+        added[result['user_id']] += result['added']
+        edits.update(result['edits'])
+        uncertain.update(result['uncertain'])
+    # Uma edição que falhou já conta como erro; o valor final dela é incerto
+    for transaction_id in uncertain:
+        edits.pop(transaction_id, None)
+
+    missing = 0
+    for user_id, count in added.items():
+        found = len(view.rows('transactions', user_id))
+        if db.archive.has_archive(user_id):
+            found += sum(1 for _ in db.archive.iter_rows('transactions', user_id))
+        missing += max(0, initial[user_id] + count - found)
+
+    stored = {t['id']: t for t in view.iter_table('transactions')} if edits else {}
+    lost_edits = 0
+    for transaction_id, (date_str, type_, amount) in edits.items():
+        row = stored.get(transaction_id)
+        if (row is None or row['date'] != date_str or row['type'] != type_
+                or to_cents(row['amount']) != to_cents(amount)):
+            lost_edits += 1
+    return {'transactions_added': sum(added.values()), 'missing_transactions': missing,
+            'transactions_edited': len(edits), 'lost_edits': lost_edits,
+            'total': missing + lost_edits}
+
+
+def summarize(samples: List[Sample], seconds: float) -> Dict:
+    """Requisições, erros, vazão e percentis de latência por rota"""
+    by_route: Dict[str, List[Sample]] = defaultdict(list)
+    for sample in samples:
+        by_route[sample[0]].append(sample)
+        by_route['total'].append(sample)
+
+    routes = {}
+    for route in sorted(by_route, key=lambda r: (r == 'total', r)):
+        entries = by_route[route]
+        latencies = sorted(s[1] * 1000 for s in entries)
+        stats = {'requests': len(entries), 'errors': sum(1 for s in entries if not s[2]),
+                 'throughput_rps': round(len(entries) / seconds, 2) if seconds else 0.0}
+        for p in PERCENTILES:
+            stats[f"p{p}_ms"] = round(percentile(latencies, p), 3)
+        stats['max_ms'] = round(latencies[-1], 3)
+        routes[route] = stats
+    return routes
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Teste de carga da aplicação web (local, sem rede)")
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--days', type=int, default=90)
+    parser.add_argument('--tx-per-day', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--clients', type=int, default=16, help="sessões concorrentes")
+    parser.add_argument('--processes', type=int, default=1,
+                        help="processos geradores de carga (os clientes são divididos entre eles)")
+    parser.add_argument('--duration', type=float, default=20.0, help="segundos de carga")
+    parser.add_argument('--requests', type=int, help="limite de requisições por cliente")
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX,
+                        help="pesos das ações, ex.: dashboard=50,history=10,add=15,edit=15,predict=10")
+    parser.add_argument('--output', help="grava os resultados em JSON")
+    parser.add_argument('--serve', metavar='DIR', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.serve:
+        return serve(args.serve)
+    if args.users < 1 or args.clients < 1 or args.days < 1:
+        parser.error("--users, --clients e --days devem ser positivos")
+
+    workdir = tempfile.mkdtemp(prefix='load_')
+    process = None
+    try:
+        dataset = prepare_dataset(args.users, args.days, args.tx_per_day, args.seed)
+        path = os.path.join(workdir, 'data.json')
+        with open(path, 'wb') as f:
+            f.write(codec.dumps(dataset))
+        try:
+            process, port = start_server(workdir)
+        except RuntimeError as e:
+            print(f"Teste de carga ignorado ({e})")
+            return 2
+
+        specs = client_specs(dataset, args.clients, args.days)
+        processes = max(1, min(args.processes, len(specs)))
+        start_at = time.time() + 0.5 + 0.2 * processes
+        deadline = start_at + args.duration
+        jobs = [(specs[i::processes], port, args.mix, args.seed, start_at, deadline, args.requests)
+                for i in range(processes)]
+        if processes == 1:
+            results = run_clients(*jobs[0])
+        else:
+            with ProcessPoolExecutor(max_workers=processes) as pool:
+                results = [r for batch in pool.map(_run_clients, jobs) for r in batch]
+        finished = time.time()
+        stop_server(process)
+        process = None
+
+        samples = [s for r in results for s in r['samples']]
+        report = {
+            'meta': {
+                'users': args.users, 'days': args.days, 'tx_per_day': args.tx_per_day,
+                'seed': args.seed, 'clients': args.clients, 'processes': processes,
+                'duration': args.duration, 'mix': args.mix,
+                'python': platform.python_version(), 'platform': platform.platform(),
+                'timestamp': datetime.now().isoformat()
+            },
+            'seconds': round(finished - start_at, 3),
+            'routes': summarize(samples, finished - start_at) if samples else {},
+            'lost_updates': lost_updates(path, dataset, results)
+        }
+    finally:
+        if process is not None:
+            stop_server(process)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    for route, stats in report['routes'].items():
+        print(f"{route:<30} {stats['requests']:>7} req  {stats['errors']:>5} erros  "
+              f"{stats['throughput_rps']:>8.1f} req/s  p50 {stats['p50_ms']:>8.1f} ms  "
+              f"p95 {stats['p95_ms']:>8.1f} ms  p99 {stats['p99_ms']:>8.1f} ms")
+    lost = report['lost_updates']
+    print(f"Atualizações perdidas: {lost['missing_transactions']} de {lost['transactions_added']} "
+          f"transações novas, {lost['lost_edits']} de {lost['transactions_edited']} edições")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+    errors = report['routes'].get('total', {}).get('errors', 0)
+    return 1 if errors or lost['total'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,100 @@
+"""
+Memória ocupada pelos registros em memória, em bytes por linha
+
+    python -m benchmarks.memory --users 20 --days 365 --tx-per-day 3
+
+Compara, para cada tabela principal, os registros como dicts (como lidos
+do arquivo) com os registros compactos de db/records.py, medindo as
+alocações com tracemalloc sobre o conjunto sintético dos benchmarks.
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import tracemalloc
+from typing import Callable, Dict, List
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.generator import generate_dataset
+from db import codec
+from db.dates import DATED_TABLES, add_day_ordinals
+from db.records import RECORD_TYPES, wrap
+
+# Tabelas pequenas (usuários, metas) são repetidas até este tamanho, para que
+# alocações fixas não distorçam a média
+MIN_ROWS = 5000
+
+
+def _measure(build: Callable[[], List]) -> int:
+    """Bytes alocados (e mantidos) pela estrutura construída"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        rows = build()
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del rows
+    return after - before
+
+
+def measure_table(raw: bytes, table: str) -> Dict:
+    """Bytes por linha da tabela (JSON da lista de linhas) como dicts e como
+    registros compactos
+
+    Cada variante decodifica o JSON de novo, para que as strings não sejam
+    compartilhadas entre as medições.
+    """
+    def as_dicts():
+        rows = json.loads(raw)
+        if table in DATED_TABLES:
+            add_day_ordinals(rows)
+        return rows
+
+    def as_records():
+        return [wrap(table, row) for row in as_dicts()]
+
+    count = len(as_dicts())
+    if not count:
+        return {'rows': 0}
+    dict_bytes = _measure(as_dicts)
+    record_bytes = _measure(as_records)
+    return {
+        'rows': count,
+        'dict_bytes_per_row': round(dict_bytes / count, 1),
+        'record_bytes_per_row': round(record_bytes / count, 1),
+        'ratio': round(record_bytes / dict_bytes, 3) if dict_bytes else None
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Bytes por linha: dicts x registros compactos")
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--tx-per-day', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help="grava os resultados em JSON")
+    args = parser.parse_args(argv)
+
+    dataset = generate_dataset(users=args.users, days=args.days, tx_per_day=args.tx_per_day, seed=args.seed)
+    results = {}
+    for table in RECORD_TYPES:
+        rows = dataset.get(table, [])
+        if rows and len(rows) < MIN_ROWS:
+            rows = rows * -(-MIN_ROWS // len(rows))
+        stats = results[table] = measure_table(codec.dumps(rows), table)
+        if stats['rows']:
+            print(f"{table:<14} {stats['rows']:>8} linhas   dict {stats['dict_bytes_per_row']:>7.1f} B/linha"
+                  f"   registro {stats['record_bytes_per_row']:>7.1f} B/linha   ({stats['ratio']:.2f}x)")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
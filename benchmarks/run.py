@@ -0,0 +1,300 @@
+"""
+Executa os cenários de benchmark e compara com uma baseline
+
+    python -m benchmarks.run --users 20 --days 365 --tx-per-day 3 --output results.json
+    python -m benchmarks.run --baseline results.json --threshold 0.2
+
+Cada cenário roda sobre uma cópia do conjunto sintético em um diretório
+temporário, sem acesso à rede. Com --baseline, cenários cuja mediana piorar
+além do limite são marcados como regressão e o comando termina com código 1.
+Um cenário que não pode rodar (ex.: aplicação web sem Flask) ou que está na
+baseline e ficou sem resultado é uma falha: o comando termina com código 2.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.generator import generate_dataset
+from db import codec
+from db.models import Balance, Database, Goal, Transaction
+from services.forecast_engine import ForecastEngine
+from services.report import ReportService
+
+DEFAULT_THRESHOLD = 0.20
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class ScenarioUnavailable(Exception):
+    """Cenário que não pode rodar neste ambiente (ex.: Flask não instalado)"""
+
+
+class BenchContext:
+    def __init__(self, workdir: str, users: int, days: int, tx_per_day: int):
+        self.workdir = workdir
+        self.path = os.path.join(workdir, 'data.json')
+        self.users = users
+        self.days = days
+        self.tx_per_day = tx_per_day
+
+    def database(self) -> Database:
+        return Database(self.path)
+
+    @property
+    def user_id(self) -> int:
+        # Usuário do meio, para não favorecer o início ou o fim das listas
+        return max(1, self.users // 2)
+
+
+SCENARIOS: Dict[str, Callable[[BenchContext], Callable[[], object]]] = {}
+
+
+def scenario(name: str):
+    """Registra um cenário: a função prepara o estado e devolve a operação medida"""
+    def register(setup):
+        SCENARIOS[name] = setup
+        return setup
+    return register
+
+
+@scenario('load')
+def bench_load(ctx):
+    return lambda: Database(ctx.path)
+
+
+@scenario('save')
+def bench_save(ctx):
+    db = ctx.database()
+    return db._save_data
+
+
+@scenario('insert_balance')
+def bench_insert_balance(ctx):
+    model = Balance(ctx.database())
+    counter = iter(range(1, 10 ** 6))
+    return lambda: model.add_balance(ctx.user_id, f"2100-01-{next(counter) % 28 + 1:02d}", 1000.0)
+
+
+@scenario('insert_transaction')
+def bench_insert_transaction(ctx):
+    model = Transaction(ctx.database())
+    return lambda: model.add_transaction(ctx.user_id, '2100-01-01', 'deposit', 10.0, 'bench')
+
+
+@scenario('update_transaction')
+def bench_update_transaction(ctx):
+    db = ctx.database()
+    model = Transaction(db)
+    target = next(t for t in db.data['transactions'] if t['user_id'] == ctx.user_id)
+    return lambda: model.update_transaction(target['id'], ctx.user_id, target['date'],
+                                            'deposit', 42.0, 'bench')
+
+
+@scenario('delete_transaction')
+def bench_delete_transaction(ctx):
+    db = ctx.database()
+    model = Transaction(db)
+    ids = iter([t['id'] for t in db.data['transactions'] if t['user_id'] == ctx.user_id])
+    return lambda: model.delete_transaction(next(ids), ctx.user_id)
+
+
+@scenario('report')
+def bench_report(ctx):
+    db = ctx.database()
+
+    def run():
+        balances = Balance(db).get_balances_by_user(ctx.user_id)
+        transactions = Transaction(db).get_transactions_by_user(ctx.user_id)
+        ReportService.calculate_performance_from_data(balances, transactions)
+        ReportService.calculate_transactions_summary(transactions)
+        ReportService.calculate_win_rate(balances)
+        ReportService.get_weekly_stats(balances)
+        ReportService.get_chart_data(balances)
+    return run
+
+
+@scenario('forecast')
+def bench_forecast(ctx):
+    db = ctx.database()
+    engine = ForecastEngine()
+    goal = Goal(db).get_goal(ctx.user_id)
+    target = goal['target_amount'] if goal else 10_000.0
+
+    def run():
+        balances = Balance(db).get_balances_by_user(ctx.user_id)
+        engine.predict_goal_date(balances, target)
+    return run
+
+
+def _make_app():
+    """Monta uma aplicação Flask mínima com os blueprints do projeto"""
+    try:
+        from flask import Flask
+        from auth.auth import auth_bp
+        from dashboard.dashboard import dashboard_bp
+        from utils import register_filters
+    except ImportError as e:
+        raise ScenarioUnavailable(f"aplicação web indisponível: {e}")
+
+    app = Flask('benchmark',
+                template_folder=os.path.join(ROOT_DIR, 'templates'),
+                static_folder=os.path.join(ROOT_DIR, 'static'))
+    app.config.update(SECRET_KEY='benchmark', TESTING=True)
+    app.register_blueprint(auth_bp)
+    app.register_blueprint(dashboard_bp)
+    register_filters(app)
+    return app
+
+
+@scenario('dashboard')
+def bench_dashboard(ctx):
+    app = _make_app()
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = ctx.user_id
+        sess['username'] = f"bench_user_{ctx.user_id}"
+
+    def run():
+        response = client.get('/dashboard')
+        if response.status_code != 200:
+            raise RuntimeError(f"/dashboard respondeu {response.status_code}")
+    return run
+
+
+def run_scenario(name: str, dataset: Dict, params: Dict, repeat: int, warmup: int) -> Dict:
+    """Executa um cenário em um diretório isolado e retorna as estatísticas"""
+    workdir = tempfile.mkdtemp(prefix=f"bench_{name}_")
+    previous_cwd = os.getcwd()
+    try:
+        ctx = BenchContext(workdir, **params)
+        with open(ctx.path, 'wb') as f:
+            f.write(codec.dumps(dataset))
+        # get_db() e afins usam caminhos relativos
+        os.chdir(workdir)
+
+        try:
+            operation = SCENARIOS[name](ctx)
+            for _ in range(warmup):
+                operation()
+            timings: List[float] = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                operation()
+                timings.append((time.perf_counter() - start) * 1000)
+        except ScenarioUnavailable as e:
+            return {'error': str(e)}
+
+        return {
+            'runs': repeat,
+            'min_ms': round(min(timings), 3),
+            'median_ms': round(statistics.median(timings), 3),
+            'mean_ms': round(statistics.mean(timings), 3),
+            'max_ms': round(max(timings), 3)
+        }
+    finally:
+        os.chdir(previous_cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def missing(results: Dict, baseline: Dict, selected: Optional[List[str]] = None) -> List[str]:
+    """Cenários com mediana na baseline que ficaram sem resultado
+
+    Sem seleção explícita (--scenario) todos os cenários da baseline contam,
+    inclusive os que deixaram de existir.
+    """
+    return [name for name, base in baseline.get('results', {}).items()
+            if 'median_ms' in base and (selected is None or name in selected)
+            and 'median_ms' not in results['results'].get(name, {})]
+
+
+def compare(results: Dict, baseline: Dict, threshold: float) -> List[Dict]:
+    """Lista os cenários cuja mediana piorou mais que o limite"""
+    regressions = []
+    for name, current in results['results'].items():
+        base = baseline.get('results', {}).get(name)
+        if not base or 'median_ms' not in base or 'median_ms' not in current:
+            continue
+        ratio = current['median_ms'] / base['median_ms'] if base['median_ms'] else 1.0
+        current['baseline_median_ms'] = base['median_ms']
+        current['ratio'] = round(ratio, 3)
+        if ratio > 1 + threshold:
+            regressions.append({'scenario': name, 'baseline_ms': base['median_ms'],
+                                'current_ms': current['median_ms'], 'ratio': round(ratio, 3)})
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmarks de armazenamento, relatórios, previsão e dashboard")
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--tx-per-day', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--warmup', type=int, default=1)
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS),
+                        help="executa apenas os cenários indicados (pode repetir)")
+    parser.add_argument('--output', help="grava os resultados em JSON")
+    parser.add_argument('--baseline', help="resultados anteriores para comparação")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="piora relativa tolerada na mediana (padrão: 0.20)")
+    args = parser.parse_args(argv)
+
+    params = {'users': args.users, 'days': args.days, 'tx_per_day': args.tx_per_day}
+    dataset = generate_dataset(seed=args.seed, **params)
+    results = {
+        'meta': {
+            **params,
+            'seed': args.seed,
+            'repeat': args.repeat,
+            'rows': {k: len(v) for k, v in dataset.items()},
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'timestamp': datetime.now().isoformat()
+        },
+        'results': {}
+    }
+
+    for name in args.scenario or list(SCENARIOS):
+        stats = run_scenario(name, dataset, params, args.repeat, args.warmup)
+        results['results'][name] = stats
+        if 'error' in stats:
+            print(f"{name:<22} FALHOU ({stats['error']})")
+        else:
+            print(f"{name:<22} mediana {stats['median_ms']:>10.3f} ms   mín {stats['min_ms']:>10.3f} ms")
+
+    failures = [name for name, stats in results['results'].items() if 'error' in stats]
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        results['regressions'] = regressions
+        absent = missing(results, baseline, args.scenario)
+        for name in absent:
+            print(f"SEM RESULTADO {name}: presente na baseline")
+        failures = sorted(set(failures) | set(absent))
+        for r in regressions:
+            print(f"REGRESSÃO {r['scenario']}: {r['baseline_ms']:.3f} ms -> "
+                  f"{r['current_ms']:.3f} ms ({r['ratio']:.2f}x)")
+
+    results['failures'] = failures
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+
+    if failures:
+        return 2
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
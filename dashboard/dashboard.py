@@ -1,32 +1,33 @@
 # caminho: dashboard/dashboard.py
 
-from flask import Blueprint, render_template, request, redirect, session, url_for, flash
-from datetime import datetime
+from flask import Blueprint, render_template, request, redirect, session, url_for, flash, Response, stream_with_context, jsonify
+from datetime import datetime, timedelta
+import io
 from db import get_db
-from db.models import (
-    fetch_latest_per_day,
-    fetch_all_balances,
-    fetch_transactions,
-    fetch_balance_on_date,
-    fetch_balance_by_id,
-    insert_balance,
-    update_balance,
-    delete_balance,
-    fetch_transaction_by_id,
-    insert_transaction,
-    update_transaction,
-    delete_transaction,
-    fetch_meta,
-    upsert_meta,
-    recalc_balance_for_date,
-    get_current_balance
-)
+from db.models import Balance, Goal, Transaction
+from db.dates import day_of, to_date
 from services.report import ReportService
 from services.forecast_engine import ForecastEngine
+from services.importer import ImportService, SUPPORTED_FORMATS
+from services.exporter import ExportService, EXPORT_KINDS, EXPORT_FORMATS, MIMETYPES
+from services.history import HistoryService
 from utils import login_required, format_time_difference
 
+TRANSACTION_TYPES = ('deposit', 'withdrawal')
+
 dashboard_bp = Blueprint('dashboard', __name__)
 
+def _forecast(balances, target):
+    """(data prevista dd/mm/aaaa, tempo restante) para atingir `target`"""
+    if balances[-1]['amount'] >= target:
+        return datetime.today().strftime("%d/%m/%Y"), "Meta já batida"
+    predicted, message = ForecastEngine().predict_goal_date(balances, target)
+    if not predicted:
+        return None, message
+    dt_pred = datetime.strptime(predicted, "%Y-%m-%d")
+    last_dt = datetime.strptime(balances[-1]['date'], "%Y-%m-%d")
+    return dt_pred.strftime("%d/%m/%Y"), format_time_difference(dt_pred, last_dt)
+
 @dashboard_bp.route('/')
 def index():
     if 'user_id' in session:
@@ -37,51 +38,27 @@ def index():
 @login_required
 def dashboard():
     user_id = session['user_id']
+    db = get_db()
 
-    # Sincronização diária automática - corrigida para evitar duplicatas
-    txs = fetch_transactions(user_id)
-    unique_dates = sorted({t['date'] for t in txs})
-    
-    for d in unique_dates:
-        if not fetch_balance_on_date(user_id, d):
-            # Busca o saldo anterior mais próximo
-            prev_balances = [b for b in fetch_latest_per_day(user_id) if b['date'] < d]
-            prev = prev_balances[-1] if prev_balances else None
-            base = prev['current_balance'] if prev else 0.0
-            
-            # Calcula depósitos e saques do dia
-            deps = sum(t['amount'] for t in txs if t['date'] == d and t['type'] == 'deposit')
-            wdr = sum(t['amount'] for t in txs if t['date'] == d and t['type'] == 'withdrawal')
-            insert_balance(user_id, d, round(base + deps - wdr, 2))
-    
-    # Recalcula todos os saldos para garantir consistência
-    balance_dates = sorted({b['date'] for b in fetch_all_balances(user_id)})
-    for d in balance_dates:
-        recalc_balance_for_date(user_id, d)
-
-    rows = fetch_latest_per_day(user_id)
+    # Os saldos diários já são mantidos pela projeção dos eventos a cada gravação
+    rows = Balance(db).get_balances_by_user(user_id)
     balances = ReportService.calculate_balances(rows)
     current_balance = balances[-1]['current_balance'] if balances else 0.0
     summary = ReportService.summary(balances, current_balance)
-    current_meta = fetch_meta(user_id)
+    goal_rows = Goal(db).get_goals_by_user(user_id)
+    # A primeira meta é a principal (resumo); todas aparecem na lista de metas
+    current_meta = goal_rows[0]['target_amount'] if goal_rows else None
+    goals = ForecastEngine().evaluate_goals(rows, goal_rows)
+    for g in goals:
+        for field in ('predicted_date', 'target_date'):
+            if g[field]:
+                g[field] = datetime.strptime(g[field][:10], "%Y-%m-%d").strftime("%d/%m/%Y")
     percent_meta = round(current_balance / current_meta * 100, 2) if current_meta and current_meta > 0 else 0.0
 
     # Previsão de meta
     predicted_date = time_remaining = None
     if current_meta and current_meta > 0 and len(rows) >= 2:
-        engine = ForecastEngine(rows)
-        if current_balance >= current_meta:
-            predicted_date = datetime.today().strftime("%d/%m/%Y")
-            time_remaining = "Meta já batida"
-        else:
-            try:
-                dt_pred = engine.predict_date(current_meta, horizon_days=365)
-                predicted_date = dt_pred.strftime("%d/%m/%Y")
-                last_dt = datetime.strptime(rows[-1]['date'], "%Y-%m-%d")
-                time_remaining = format_time_difference(dt_pred, last_dt)
-            except Exception as e:
-                predicted_date = "Erro na previsão"
-                time_remaining = "Dados insuficientes"
+        predicted_date, time_remaining = _forecast(rows, current_meta)
 
     # Dados para gráficos
     chart_dates       = [b['date']            for b in balances]
@@ -101,8 +78,7 @@ def dashboard():
     heat_matrix = [[None]*cols for _ in range(7)]
     for idx, b in enumerate(balances):
         try:
-            dt = datetime.strptime(b['date'], "%Y-%m-%d")
-            row = dt.weekday()
+            row = to_date(day_of(b)).weekday()
             col = idx // 7
             if col < cols:
                 heat_matrix[row][col] = b['profit']
@@ -112,12 +88,27 @@ def dashboard():
     flat = [abs(x) for row in heat_matrix for x in row if x is not None]
     heat_max = max(flat) if flat else 1.0
 
-    weekly_recommendation = ReportService.weekly_withdrawal_recommendation(balances)
+    recent = (datetime.today() - timedelta(days=30)).strftime("%Y-%m-%d")
+    weekly_recommendation, _ = ForecastEngine().get_weekly_recommendation(
+        Transaction(db).get_transactions_in_range(user_id, start=recent))
+
+    # As tabelas trazem só a página mais recente; o restante vem de /api/*
+    history = HistoryService.balance_page(db, user_id)
+    recent_transactions = HistoryService.transaction_page(db, user_id)
+
+    # Alertas gerados nas gravações (metas, limites, quedas) são entregues aqui
+    alerts = db.alerts.pending(user_id)
+    for notice in alerts:
+        flash(notice['message'], 'success' if notice['kind'] in ('goal_reached', 'above') else 'warning')
+    if alerts:
+        db.alerts.mark_delivered(user_id, [n['id'] for n in alerts])
 
     return render_template('dashboard.html',
         summary=summary,
-        display_history=list(reversed(balances)),
-        transactions=txs,
+        display_history=history['items'],
+        history_next=history['next'],
+        transactions=recent_transactions['items'],
+        transactions_next=recent_transactions['next'],
         chart_dates=chart_dates,
         chart_balances=chart_balances,
         chart_deposits=chart_deposits,
@@ -126,6 +117,7 @@ def dashboard():
         chart_mavg=chart_mavg,
         percent_meta=percent_meta,
         current_meta=current_meta,
+        goals=goals,
         predicted_date=predicted_date,
         time_remaining=time_remaining,
         heat_matrix=heat_matrix,
@@ -133,6 +125,13 @@ def dashboard():
         weekly_recommendation=weekly_recommendation
     )
 
+def _valid_date(date_str):
+    try:
+        datetime.strptime(date_str, "%Y-%m-%d")
+        return True
+    except ValueError:
+        return False
+
 @dashboard_bp.route('/add_balance', methods=['POST'])
 @login_required
 def add_balance():
@@ -143,9 +142,12 @@ def add_balance():
     except ValueError:
         flash("Valor inválido para saldo atual.", "danger")
         return redirect(url_for('dashboard.dashboard'))
+    if not _valid_date(date_str):
+        flash("Data deve estar no formato AAAA-MM-DD.", "danger")
+        return redirect(url_for('dashboard.dashboard'))
 
-    insert_balance(user_id, date_str, amount)
-    recalc_balance_for_date(user_id, date_str)
+    # A projeção recalcula os dias seguintes
+    Balance(get_db()).add_balance(user_id, date_str, amount)
     flash("Saldo diário adicionado com sucesso.", "success")
     return redirect(url_for('dashboard.dashboard'))
 
@@ -153,7 +155,8 @@ def add_balance():
 @login_required
 def edit_balance(balance_id):
     user_id = session['user_id']
-    bal = fetch_balance_by_id(balance_id, user_id)
+    db = get_db()
+    bal = Balance(db).get_balance_by_id(balance_id, user_id)
     if not bal:
         flash("Registro não encontrado.", "danger")
         return redirect(url_for('dashboard.dashboard'))
@@ -165,54 +168,58 @@ def edit_balance(balance_id):
         except ValueError:
             flash("Valor inválido para saldo atual.", "danger")
             return redirect(url_for('dashboard.dashboard'))
+        if not _valid_date(new_date):
+            flash("Data deve estar no formato AAAA-MM-DD.", "danger")
+            return redirect(url_for('dashboard.dashboard'))
 
-        update_balance(balance_id, date=new_date, current_balance=amount)
-        recalc_balance_for_date(user_id, new_date)
+        with db.write():
+            # Mudança de data: o saldo sai do dia antigo e entra no novo
+            if new_date != bal['date']:
+                Balance(db).delete_balance(balance_id, user_id)
+            Balance(db).add_balance(user_id, new_date, amount)
         flash("Saldo diário atualizado.", "success")
         return redirect(url_for('dashboard.dashboard'))
 
-    return render_template('edit_balance.html', balance=bal)
+    return render_template('edit_balance.html',
+                           balance={'id': bal['id'], 'date': bal['date'], 'current_balance': bal['amount']})
 
 @dashboard_bp.route('/delete_balance/<int:balance_id>', methods=['POST'])
 @login_required
 def delete_balance(balance_id):
     user_id = session['user_id']
-    bal = fetch_balance_by_id(balance_id, user_id)
-    if not bal:
+    if not Balance(get_db()).delete_balance(balance_id, user_id):
         flash("Registro não encontrado.", "danger")
         return redirect(url_for('dashboard.dashboard'))
-        
-    date_to_recalc = bal['date']
-    delete_balance(balance_id)
-    recalc_balance_for_date(user_id, date_to_recalc)
     flash("Saldo diário excluído.", "success")
     return redirect(url_for('dashboard.dashboard'))
 
-@dashboard_bp.route('/add_transaction', methods=['POST'])
-@login_required
-def add_transaction():
-    user_id  = session['user_id']
+def _transaction_form():
+    """(data, tipo, valor) do formulário, ou None após sinalizar o erro"""
     date_str = request.form['date']
     ttype    = request.form['type']
     try:
         amount = float(request.form['amount'])
-        if amount <= 0:
-            flash("Valor deve ser maior que zero.", "danger")
-            return redirect(url_for('dashboard.dashboard'))
     except ValueError:
         flash("Valor inválido.", "danger")
+        return None
+    if amount <= 0:
+        flash("Valor deve ser maior que zero.", "danger")
+        return None
+    if ttype not in TRANSACTION_TYPES or not _valid_date(date_str):
+        flash("Transação inválida.", "danger")
+        return None
+    return date_str, ttype, amount
+
+@dashboard_bp.route('/add_transaction', methods=['POST'])
+@login_required
+def add_transaction():
+    user_id = session['user_id']
+    form = _transaction_form()
+    if form is None:
         return redirect(url_for('dashboard.dashboard'))
 
-    insert_transaction(user_id, date_str, ttype, amount)
-    
-    # Garante que existe um registro de saldo para a data
-    if not fetch_balance_on_date(user_id, date_str):
-        # Calcula saldo base a partir do dia anterior
-        prev_balances = [b for b in fetch_latest_per_day(user_id) if b['date'] < date_str]
-        base_balance = prev_balances[-1]['current_balance'] if prev_balances else 0.0
-        insert_balance(user_id, date_str, base_balance)
-    
-    recalc_balance_for_date(user_id, date_str)
+    # O evento da transação cria ou atualiza o saldo do dia e dos seguintes
+    Transaction(get_db()).add_transaction(user_id, *form)
     flash("Transação adicionada com sucesso.", "success")
     return redirect(url_for('dashboard.dashboard'))
 
@@ -220,32 +227,19 @@ def add_transaction():
 @login_required
 def edit_transaction(trans_id):
     user_id = session['user_id']
-    tx = fetch_transaction_by_id(trans_id, user_id)
+    transactions = Transaction(get_db())
+    tx = transactions.get_transaction_by_id(trans_id, user_id)
     if not tx:
         flash("Transação não encontrada.", "danger")
         return redirect(url_for('dashboard.dashboard'))
     if request.method == 'POST':
-        old_date = tx['date']
-        new_date = request.form['date']
-        ttype    = request.form['type']
-        try:
-            amount = float(request.form['amount'])
-            if amount <= 0:
-                flash("Valor deve ser maior que zero.", "danger")
-                return redirect(url_for('dashboard.dashboard'))
-        except ValueError:
-            flash("Valor inválido.", "danger")
+        form = _transaction_form()
+        if form is None:
             return redirect(url_for('dashboard.dashboard'))
 
-        update_transaction(trans_id, new_date, ttype, amount)
-        
-        # Recalcula saldos para ambas as datas (antiga e nova)
-        recalc_balance_for_date(user_id, old_date)
-        if not fetch_balance_on_date(user_id, new_date):
-            prev_balances = [b for b in fetch_latest_per_day(user_id) if b['date'] < new_date]
-            base_balance = prev_balances[-1]['current_balance'] if prev_balances else 0.0
-            insert_balance(user_id, new_date, base_balance)
-        recalc_balance_for_date(user_id, new_date)
+        # Saldos das datas antiga e nova são recalculados pelo evento
+        transactions.update_transaction(trans_id, user_id, *form,
+                                        description=tx.get('description', ''))
         flash("Transação atualizada com sucesso.", "success")
         return redirect(url_for('dashboard.dashboard'))
 
@@ -255,17 +249,115 @@ def edit_transaction(trans_id):
 @login_required
 def delete_transaction(trans_id):
     user_id = session['user_id']
-    tx = fetch_transaction_by_id(trans_id, user_id)
-    if not tx:
+    if not Transaction(get_db()).delete_transaction(trans_id, user_id):
         flash("Transação não encontrada.", "danger")
         return redirect(url_for('dashboard.dashboard'))
-        
-    date_to_recalc = tx['date']
-    delete_transaction(trans_id)
-    recalc_balance_for_date(user_id, date_to_recalc)
     flash("Transação excluída.", "success")
     return redirect(url_for('dashboard.dashboard'))
 
+@dashboard_bp.route('/import', methods=['POST'])
+@login_required
+def import_data():
+    user_id = session['user_id']
+    upload = request.files.get('file')
+    if not upload or not upload.filename:
+        flash("Selecione um arquivo CSV ou NDJSON.", "danger")
+        return redirect(url_for('dashboard.dashboard'))
+
+    fmt = request.form.get('format') or ImportService.detect_format(upload.filename)
+    if fmt not in SUPPORTED_FORMATS:
+        flash("Formato de arquivo não suportado.", "danger")
+        return redirect(url_for('dashboard.dashboard'))
+
+    # Lê o upload como texto em streaming, linha a linha
+    stream = io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline='')
+    result = ImportService.import_stream(get_db(), user_id, stream, fmt,
+                                         strict=bool(request.form.get('strict')))
+
+    if result['error_count']:
+        first_errors = "; ".join(f"linha {n}: {msg}" for n, msg in result['errors'][:5])
+        flash(f"{result['error_count']} linha(s) com erro: {first_errors}", "warning")
+    if request.form.get('strict') and result['error_count']:
+        flash("Importação cancelada. Nenhum registro foi gravado.", "danger")
+    else:
+        flash(f"Importação concluída: {result['balances']} saldo(s) e "
+              f"{result['transactions']} transação(ões).", "success")
+    return redirect(url_for('dashboard.dashboard'))
+
+@dashboard_bp.route('/export')
+@login_required
+def export_data():
+    user_id = session['user_id']
+    kind = request.args.get('kind', 'all')
+    fmt  = request.args.get('format', 'csv')
+    if kind not in EXPORT_KINDS or fmt not in EXPORT_FORMATS:
+        flash("Exportação inválida.", "danger")
+        return redirect(url_for('dashboard.dashboard'))
+
+    start = request.args.get('start') or None
+    end = request.args.get('end') or None
+    try:
+        for d in (start, end):
+            if d:
+                datetime.strptime(d, "%Y-%m-%d")
+    except ValueError:
+        flash("Datas do período devem estar no formato AAAA-MM-DD.", "danger")
+        return redirect(url_for('dashboard.dashboard'))
+
+    chunks = ExportService.stream(get_db(), user_id, kind, fmt, start, end)
+    filename = f"{session.get('username', 'banca')}_{kind}.{fmt}"
+    return Response(stream_with_context(chunks), mimetype=MIMETYPES[fmt],
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
+def _json_page(builder, edit_endpoint, delete_endpoint, id_arg):
+    """Resposta JSON de uma página do histórico, com as URLs de cada linha"""
+    try:
+        page = builder(get_db(), session['user_id'], request.args.get('after'),
+                       request.args.get('limit'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    for item in page['items']:
+        item['edit_url'] = url_for(edit_endpoint, **{id_arg: item['id']})
+        item['delete_url'] = url_for(delete_endpoint, **{id_arg: item['id']})
+    return jsonify(page)
+
+@dashboard_bp.route('/api/history')
+@login_required
+def history_page():
+    return _json_page(HistoryService.balance_page,
+                      'dashboard.edit_balance', 'dashboard.delete_balance', 'balance_id')
+
+@dashboard_bp.route('/api/transactions')
+@login_required
+def transactions_page():
+    return _json_page(HistoryService.transaction_page,
+                      'dashboard.edit_transaction', 'dashboard.delete_transaction', 'trans_id')
+
+@dashboard_bp.route('/check_daily')
+@login_required
+def check_daily():
+    date_str = request.args.get('date', '')
+    try:
+        datetime.strptime(date_str, "%Y-%m-%d")
+    except ValueError:
+        return jsonify({'error': "Data deve estar no formato AAAA-MM-DD."}), 400
+    return jsonify({'exists': Balance(get_db()).has_balance_on(session['user_id'], date_str)})
+
+@dashboard_bp.route('/api/occupied_dates')
+@login_required
+def occupied_dates():
+    db = get_db()
+    user_id = session['user_id']
+    # O ETag é o hash das máscaras (mantidas em cache por partição)
+    occupied = HistoryService.occupied_dates(db, user_id)
+    version = occupied['version']
+    if request.if_none_match.contains(version):
+        return Response(status=304, headers={'ETag': f'"{version}"', 'Cache-Control': 'no-cache'})
+    response = jsonify(occupied)
+    response.set_etag(version)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
 @dashboard_bp.route('/update_meta', methods=['POST'])
 @login_required
 def update_meta():
@@ -276,10 +368,39 @@ def update_meta():
         flash("Meta inválida.", "danger")
         return redirect(url_for('dashboard.dashboard'))
 
-    upsert_meta(user_id, target)
+    Goal(get_db()).set_goal(user_id, target)
     flash("Meta atualizada com sucesso.", "success")
     return redirect(url_for('dashboard.dashboard'))
 
+@dashboard_bp.route('/add_goal', methods=['POST'])
+@login_required
+def add_goal():
+    user_id = session['user_id']
+    target_date = request.form.get('target_date') or None
+    try:
+        target = float(request.form['target_amount'])
+    except (ValueError, KeyError):
+        flash("Valor da meta inválido.", "danger")
+        return redirect(url_for('dashboard.dashboard'))
+    if target <= 0 or (target_date and not _valid_date(target_date)):
+        flash("Meta inválida.", "danger")
+        return redirect(url_for('dashboard.dashboard'))
+
+    if Goal(get_db()).add_goal(user_id, target, request.form.get('description', '').strip(), target_date):
+        flash("Meta adicionada com sucesso.", "success")
+    else:
+        flash("Erro ao adicionar meta.", "danger")
+    return redirect(url_for('dashboard.dashboard'))
+
+@dashboard_bp.route('/delete_goal/<int:goal_id>', methods=['POST'])
+@login_required
+def delete_goal(goal_id):
+    if Goal(get_db()).delete_goal(session['user_id'], goal_id):
+        flash("Meta excluída.", "success")
+    else:
+        flash("Meta não encontrada.", "danger")
+    return redirect(url_for('dashboard.dashboard'))
+
 @dashboard_bp.route('/predict', methods=['POST'])
 @login_required
 def predict():
@@ -293,35 +414,23 @@ def predict():
         flash("Valor da meta inválido.", "danger")
         return redirect(url_for('dashboard.dashboard'))
 
-    rows = fetch_latest_per_day(user_id)
+    rows = Balance(get_db()).get_balances_by_user(user_id)
     if len(rows) < 2:
         flash("Necessário ter pelo menos 2 registros para previsão.", "warning")
         return redirect(url_for('dashboard.dashboard'))
 
-    try:
-        curr = get_current_balance(user_id)
-        if curr >= target_value:
-            dt_pred = datetime.today()
-            flash(f"Previsão: meta já batida em {dt_pred.strftime('%d/%m/%Y')}", "success")
-        else:
-            engine = ForecastEngine(rows)
-            dt_pred = engine.predict_date(target_value, horizon_days=365)
-            last_dt = datetime.strptime(rows[-1]['date'], "%Y-%m-%d")
-            delta = format_time_difference(dt_pred, last_dt)
-            flash(f"Previsão: meta de {target_value:.2f} será atingida em {dt_pred.strftime('%d/%m/%Y')} ({delta})", "info")
-    except Exception as e:
-        flash("Erro ao calcular previsão. Verifique se há dados suficientes e consistentes.", "danger")
-
+    predicted, delta = _forecast(rows, target_value)
+    if predicted is None:
+        flash(f"Não foi possível prever a meta: {delta}.", "warning")
+    elif rows[-1]['amount'] >= target_value:
+        flash(f"Previsão: meta já batida em {predicted}", "success")
+    else:
+        flash(f"Previsão: meta de {target_value:.2f} será atingida em {predicted} ({delta})", "info")
     return redirect(url_for('dashboard.dashboard'))
 
 @dashboard_bp.route('/reset', methods=['POST'])
 @login_required
 def reset():
-    user_id = session['user_id']
-    db = get_db()
-    db.execute("DELETE FROM daily_balances WHERE user_id=?", (user_id,))
-    db.execute("DELETE FROM transactions    WHERE user_id=?", (user_id,))
-    db.execute("DELETE FROM user_meta       WHERE user_id=?", (user_id,))
-    db.commit()
+    get_db().delete_user_data(session['user_id'])
     flash("Banca resetada com sucesso.", "success")
     return redirect(url_for('dashboard.dashboard'))
@@ -1,15 +1,37 @@
 # JSON-based database initialization
 # This module provides database functionality without SQLite dependencies
 
+import threading
+
+# One shared Database per file, so in-memory indexes survive across requests
+_instances = {}
+_instances_lock = threading.Lock()
+# With init_app, each request reads from a single snapshot of the data
+_pin_requests = False
+
 def init_app(app=None):
     """Initialize database for the application"""
-    # No initialization needed for JSON-based storage
-    pass
+    global _pin_requests
+    if app is None:
+        return
+    _pin_requests = True
+
+    @app.teardown_request
+    def _release_snapshot(exc=None):
+        for db in list(_instances.values()):
+            db.unpin()
 
-def get_db():
-    """Get database instance - compatibility function"""
+def get_db(db_path='data.json'):
+    """Get the shared database instance, reloading it if the file changed on disk"""
     from .models import Database
-    return Database()
+    with _instances_lock:
+        db = _instances.get(db_path)
+        if db is None:
+            db = _instances[db_path] = Database(db_path)
+    db.reload_if_changed()
+    if _pin_requests:
+        db.pin()
+    return db
 
 def close_db(e=None):
     """Close database connection - compatibility function"""
@@ -0,0 +1,150 @@
+"""
+Fachada assíncrona (asyncio) para o Database e os modelos
+As chamadas bloqueantes rodam em executores: leituras em um pool de threads,
+sobre o snapshot publicado (sem esperar gravações em andamento), e
+gravações em uma fila única atendida por um só escritor. O escritor agrupa as gravações enfileiradas em um lote
+(Database.batch), gravando o arquivo uma única vez por rodada; uma gravação
+que falha é desfeita sem afetar as outras do lote.
+
+    adb = await AsyncDatabase.open('data.json')
+    user = await adb.users.get_user_by_username('ana')
+    await adb.balances.add_balance(user['id'], '2024-01-10', 1500.0)
+    await adb.close()
+"""
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from .models import Balance, Database, Goal, Transaction, User
+
+# Métodos que alteram dados (inclusive restaurando meses arquivados) e por
+# isso passam pela fila do escritor
+WRITE_METHODS = {
+    User: {'create_user', 'update_password'},
+    Balance: {'add_balance', 'delete_balance', 'sync_balance_from_transactions',
+              'bulk_upsert', 'recalculate_balances'},
+    Transaction: {'add_transaction', 'update_transaction', 'delete_transaction',
+                  'bulk_add'},
+    Goal: {'add_goal', 'set_goal', 'update_goal', 'delete_goal'}
+}
+
+
+class AsyncModel:
+    """Expõe os métodos de um modelo como corrotinas"""
+
+    def __init__(self, adb: 'AsyncDatabase', model_cls):
+        self._adb = adb
+        self._model = model_cls(adb.db)
+        self._writes = WRITE_METHODS.get(model_cls, set())
+
+    def __getattr__(self, name: str):
+        method = getattr(self._model, name)
+        if not callable(method):
+            return method
+        runner = self._adb.write if name in self._writes else self._adb.read
+
+        async def call(*args, **kwargs):
+            return await runner(method, *args, **kwargs)
+        call.__name__ = name
+        return call
+
+
+class AsyncDatabase:
+    def __init__(self, db: Database, max_readers: Optional[int] = None):
+        self.db = db
+        self._read_executor = ThreadPoolExecutor(max_workers=max_readers, thread_name_prefix='db-read')
+        self._write_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='db-write')
+        self._queue: Optional[asyncio.Queue] = None
+        self._writer_task: Optional[asyncio.Task] = None
+
+        self.users = AsyncModel(self, User)
+        self.balances = AsyncModel(self, Balance)
+        self.transactions = AsyncModel(self, Transaction)
+        self.goals = AsyncModel(self, Goal)
+
+    @classmethod
+    async def open(cls, db_path: str = 'data.json', **kwargs) -> 'AsyncDatabase':
+        """Carrega o arquivo fora do event loop e inicia o escritor"""
+        loop = asyncio.get_running_loop()
+        db = await loop.run_in_executor(None, functools.partial(Database, db_path))
+        adb = cls(db, **kwargs)
+        await adb.start()
+        return adb
+
+    async def start(self):
+        if self._writer_task is None:
+            self._queue = asyncio.Queue()
+            self._writer_task = asyncio.create_task(self._writer_loop())
+
+    async def close(self):
+        """Conclui as gravações pendentes e libera os executores"""
+        if self._writer_task is not None:
+            await self._queue.join()
+            self._writer_task.cancel()
+            try:
+                await self._writer_task
+            except asyncio.CancelledError:
+                pass
+            self._writer_task = None
+        self._read_executor.shutdown(wait=True)
+        self._write_executor.shutdown(wait=True)
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def read(self, func: Callable, *args, **kwargs) -> Any:
+        """Executa uma leitura no pool; leituras não esperam pelo escritor"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._read_executor,
+                                          functools.partial(func, *args, **kwargs))
+
+    async def write(self, func: Callable, *args, **kwargs) -> Any:
+        """Enfileira uma gravação e aguarda o resultado"""
+        if self._queue is None:
+            await self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((functools.partial(func, *args, **kwargs), future))
+        return await future
+
+    def _run_batch(self, jobs):
+        """Executa as gravações da rodada em um único lote (uma gravação em disco)
+
+        Cada gravação roda em um savepoint: se ela falhar, só as alterações
+        dela são descartadas e as demais do lote são gravadas normalmente.
+        """
+        results = []
+        with self.db.batch():
+            for job, _ in jobs:
+                try:
+                    with self.db.savepoint():
+                        result = job()
+                except Exception as e:
+                    results.append((False, e))
+                else:
+                    results.append((True, result))
+        return results
+
+    async def _writer_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            jobs = [await self._queue.get()]
+            while not self._queue.empty():
+                jobs.append(self._queue.get_nowait())
+
+            try:
+                results = await loop.run_in_executor(self._write_executor, self._run_batch, jobs)
+            except Exception as e:
+                results = [(False, e)] * len(jobs)
+
+            for (_, future), (ok, value) in zip(jobs, results):
+                if not future.done():
+                    if ok:
+                        future.set_result(value)
+                    else:
+                        future.set_exception(value)
+                self._queue.task_done()
@@ -0,0 +1,155 @@
+"""
+Alertas de saldo avaliados na gravação
+Sempre que a projeção de saldos muda o saldo mais recente de um usuário, as
+regras são conferidas apenas contra essa mudança (saldo anterior -> novo
+saldo), dentro da mesma transação de escrita. Não é preciso varrer todos os
+usuários periodicamente para descobrir quem atingiu a meta.
+
+Regras (tabela 'alert_rules'):
+- 'above': saldo passou a ficar acima do valor;
+- 'below': saldo passou a ficar abaixo do valor;
+- 'drawdown': queda, em %, a partir do maior saldo observado ('peak').
+Além delas, cada meta do usuário gera um alerta quando o saldo a alcança.
+
+Os alertas disparam só ao cruzar o limite e vão para a tabela 'outbox' com
+'delivered_at' vazio até serem marcados como entregues.
+"""
+from datetime import datetime
+from typing import Dict, List, Optional
+
+RULE_KINDS = ('above', 'below', 'drawdown')
+
+
+def _money(value: float) -> str:
+    return "R$ {:,.2f}".format(value).replace(",", "v").replace(".", ",").replace("v", ".")
+
+
+def _drawdown(peak: float, amount: float) -> float:
+    """Queda percentual em relação ao pico"""
+    return (peak - amount) / peak * 100 if peak > 0 else 0.0
+
+
+class AlertEngine:
+    def __init__(self, db):
+        self.db = db
+
+    # ------------------------------------------------------------------
+    # Regras
+    # ------------------------------------------------------------------
+
+    def add_rule(self, user_id: int, kind: str, value: float) -> Optional[Dict]:
+        """Cadastra uma regra; o pico de 'drawdown' parte do saldo atual"""
+        from .models import Balance
+
+        try:
+            if kind not in RULE_KINDS:
+                raise ValueError(f"Tipo de alerta desconhecido: {kind}")
+            value = float(value)
+            if kind == 'drawdown' and not 0 < value <= 100:
+                raise ValueError("A queda máxima deve estar entre 0 e 100%")
+            with self.db.write() as tx:
+                rule = {
+                    'id': self.db._get_next_id('alert_rules'),
+                    'user_id': user_id,
+                    'kind': kind,
+                    'value': value,
+                    'created_at': datetime.now().isoformat()
+                }
+                if kind == 'drawdown':
+                    last = Balance(self.db).get_last_balances(user_id, 1)
+                    rule['peak'] = last[0]['amount'] if last else 0.0
+                return tx.insert('alert_rules', rule)
+        except (ValueError, TypeError):
+            return None
+
+    def get_rules(self, user_id: int) -> List[Dict]:
+        return list(self.db.snapshot().rows('alert_rules', user_id))
+
+    def delete_rule(self, user_id: int, rule_id: int) -> bool:
+        with self.db.write() as tx:
+            for rule in tx.rows('alert_rules', user_id):
+                if rule['id'] == rule_id:
+                    return tx.delete('alert_rules', rule)
+        return False
+
+    # ------------------------------------------------------------------
+    # Avaliação
+    # ------------------------------------------------------------------
+
+    def evaluate(self, tx, user_id: int, before: Optional[float], after: Optional[float],
+                 date_str: Optional[str] = None) -> List[Dict]:
+        """Confere metas e regras contra a mudança do saldo mais recente
+
+        Chamado pela projeção de saldos dentro da transação de escrita.
+        Retorna os alertas colocados na outbox.
+        """
+        if after is None or before == after:
+            return []
+        notices = []
+
+        def crossed_up(limit: float) -> bool:
+            return (before is None or before < limit) and after >= limit
+
+        for goal in tx.rows('goals', user_id):
+            if crossed_up(goal['target_amount']):
+                label = goal.get('description') or 'Meta'
+                notices.append({
+                    'kind': 'goal_reached',
+                    'goal_id': goal['id'],
+                    'message': f"{label} de {_money(goal['target_amount'])} atingida: "
+                               f"saldo de {_money(after)}"
+                })
+
+        for rule in tx.rows('alert_rules', user_id):
+            kind, value = rule['kind'], rule['value']
+            if kind == 'above' and (before is None or before <= value) and after > value:
+                message = f"Saldo de {_money(after)} acima de {_money(value)}"
+            elif kind == 'below' and (before is None or before >= value) and after < value:
+                message = f"Saldo de {_money(after)} abaixo de {_money(value)}"
+            elif kind == 'drawdown':
+                peak = rule.get('peak') or 0.0
+                previous = _drawdown(peak, before) if before is not None else 0.0
+                new_peak = max(peak, after)
+                if new_peak != peak:
+                    tx.update('alert_rules', rule, peak=new_peak)
+                current = _drawdown(new_peak, after)
+                if not previous < value <= current:
+                    continue
+                message = (f"Queda de {current:.1f}% desde o pico de {_money(new_peak)} "
+                           f"(limite de {value:g}%)")
+            else:
+                continue
+            notices.append({'kind': kind, 'rule_id': rule['id'], 'message': message})
+
+        now = datetime.now().isoformat()
+        for notice in notices:
+            notice.update(id=self.db._get_next_id('outbox'), user_id=user_id, date=date_str,
+                          amount=after, created_at=now, delivered_at=None)
+            tx.insert('outbox', notice)
+        return notices
+
+    # ------------------------------------------------------------------
+    # Outbox
+    # ------------------------------------------------------------------
+
+    def pending(self, user_id: int) -> List[Dict]:
+        """Alertas ainda não entregues, do mais antigo para o mais recente"""
+        return [n for n in self.db.snapshot().rows('outbox', user_id) if not n.get('delivered_at')]
+
+    def mark_delivered(self, user_id: int, ids: Optional[List[int]] = None) -> int:
+        """Marca alertas como entregues (todos os pendentes, sem ids)"""
+        wanted = set(ids) if ids is not None else None
+        delivered = 0
+        with self.db.write() as tx:
+            now = datetime.now().isoformat()
+            for notice in tx.rows('outbox', user_id):
+                if notice.get('delivered_at') or (wanted is not None and notice['id'] not in wanted):
+                    continue
+                tx.update('outbox', notice, delivered_at=now)
+                delivered += 1
+        return delivered
+
+    def drop_user(self, user_id: int):
+        with self.db.write() as tx:
+            tx.drop_user_rows('alert_rules', user_id)
+            tx.drop_user_rows('outbox', user_id)
@@ -0,0 +1,395 @@
+"""
+Arquivamento de períodos fechados
+Move saldos e transações de meses antigos para segmentos somente leitura em
+disco (um arquivo JSON compacto por usuário e mês). Para
+cada mês arquivado fica em memória apenas um resumo (rollup) com contagens,
+saldo de abertura/fechamento e totais de depósitos e saques.
+
+As consultas leem os segmentos sob demanda (com cache) e qualquer edição em
+um mês arquivado o devolve primeiro para os dados ativos.
+
+A compactação também arquiva os eventos já cobertos pelo checkpoint retido
+(só ele é necessário para reconstruir o estado), em segmentos
+events-<primeiro seq>-<último seq>.seg no diretório do usuário.
+"""
+import os
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from services.metrics import metrics
+
+from . import codec
+from .dates import add_day_ordinals
+from .money import cents_of, from_cents
+from .records import wrap
+
+ARCHIVED_TABLES = ('balances', 'transactions')
+EVENTS_PREFIX = 'events-'
+SEGMENT_CACHE_SIZE = 32
+
+
+def month_of(date_str: str) -> str:
+    """Mês (YYYY-MM) de uma data YYYY-MM-DD ou YYYY-MM-DD HH:MM:SS"""
+    return date_str[:7]
+
+
+def day_masks(dates: Iterable[str]) -> Dict[str, int]:
+    """Dias ocupados por mês como máscara de bits (bit 0 = dia 1)"""
+    masks: Dict[str, int] = {}
+    for date_str in dates:
+        month = month_of(date_str)
+        masks[month] = masks.get(month, 0) | 1 << (int(date_str[8:10]) - 1)
+    return masks
+
+
+def cutoff_for_months(keep_months: int, today: Optional[date] = None) -> str:
+    """Primeiro dia do mês que fica ativo mantendo os últimos N meses"""
+    today = today or date.today()
+    index = today.year * 12 + today.month - 1 - keep_months
+    return date(index // 12, index % 12 + 1, 1).isoformat()
+
+
+class ArchiveStore:
+    def __init__(self, db):
+        self.db = db
+        self.root = f"{db.db_path}.archive"
+        self._cache: "OrderedDict[tuple, Dict]" = OrderedDict()
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+    # ------------------------------------------------------------------
+    # Rollups
+    # ------------------------------------------------------------------
+
+    def _rollups(self, user_id: int) -> Dict[str, Dict]:
+        """mês -> rollup do usuário, na versão visível para a thread"""
+        return {r['month']: r for r in self.db.snapshot().rows('rollups', user_id)}
+
+    def reset(self):
+        """Descarta o cache de segmentos (ex.: após recarregar os dados)"""
+        with self._lock:
+            self._cache.clear()
+
+    def has_archive(self, user_id: int) -> bool:
+        return bool(self.db.snapshot().rows('rollups', user_id))
+
+    def archived_months(self, user_id: int) -> List[str]:
+        return sorted(self._rollups(user_id))
+
+    def is_archived(self, user_id: int, date_str: str) -> bool:
+        month = month_of(date_str)
+        return any(r['month'] == month for r in self.db.snapshot().rows('rollups', user_id))
+
+    def balance_days(self, user_id: int) -> Dict[str, int]:
+        """Máscara de dias com saldo de cada mês arquivado
+
+        Vem do rollup; rollups antigos, sem o campo, leem o segmento.
+        """
+        masks = {}
+        for rollup in self.db.snapshot().rows('rollups', user_id):
+            mask = rollup.get('balance_days')
+            if mask is None:
+                segment = self.read_segment(user_id, rollup['month'])
+                mask = day_masks(b['date'] for b in segment['balances']).get(rollup['month'], 0)
+            masks[rollup['month']] = mask
+        return masks
+
+    def get_rollups(self, user_id: int) -> List[Dict]:
+        """Resumos mensais dos períodos arquivados, em ordem"""
+        return sorted(self.db.snapshot().rows('rollups', user_id), key=lambda r: r['month'])
+
+    # ------------------------------------------------------------------
+    # Segmentos
+    # ------------------------------------------------------------------
+
+    def segment_path(self, user_id: int, month: str) -> str:
+        return os.path.join(self.root, str(user_id), f"{month}.seg")
+
+    def read_segment(self, user_id: int, month: str) -> Dict[str, List[Dict]]:
+        """Lê um segmento arquivado (somente leitura, com cache LRU)"""
+        with self._lock:
+            return self._read_segment(user_id, month)
+
+    def _read_segment(self, user_id: int, month: str) -> Dict[str, List[Dict]]:
+        key = (user_id, month)
+        if key in self._cache:
+            self.hits += 1
+            metrics.inc('cache_requests_total', cache='archive_segments', result='hit')
+            self._cache.move_to_end(key)
+            return self._cache[key]
+
+        self.misses += 1
+        metrics.inc('cache_requests_total', cache='archive_segments', result='miss')
+        path = self.segment_path(user_id, month)
+        if os.path.exists(path):
+            with metrics.timer('storage_operation_seconds', op='segment_load'):
+                with open(path, 'rb') as f:
+                    raw = f.read()
+                segment = codec.loads(raw)
+            metrics.inc('storage_bytes_total', len(raw), op='read', format='segment')
+        else:
+            segment = {}
+        for table in ARCHIVED_TABLES:
+            rows = segment.setdefault(table, [])
+            add_day_ordinals(rows)
+            # Mesmo tipo de registro das partições ativas
+            segment[table] = [wrap(table, row) for row in rows]
+
+        self._cache[key] = segment
+        if len(self._cache) > SEGMENT_CACHE_SIZE:
+            self._cache.popitem(last=False)
+        return segment
+
+    def _write_segment(self, user_id: int, month: str, segment: Dict[str, List[Dict]]):
+        self._write_file(self.segment_path(user_id, month), segment)
+        with self._lock:
+            self._cache.pop((user_id, month), None)
+
+    @staticmethod
+    def _write_file(path: str, segment: Dict[str, List[Dict]]):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        raw = codec.dumps(segment, compact=True)
+        with open(tmp_path, 'wb') as f:
+            f.write(raw)
+        metrics.inc('storage_bytes_total', len(raw), op='write', format='segment')
+        if os.path.exists(path):
+            os.chmod(path, 0o644)
+        os.replace(tmp_path, path)
+        os.chmod(path, 0o444)
+
+    def _remove_segment(self, user_id: int, month: str):
+        self._remove_file(self.segment_path(user_id, month))
+
+    @staticmethod
+    def _remove_file(path: str):
+        if os.path.exists(path):
+            os.chmod(path, 0o644)
+            os.remove(path)
+
+    def iter_rows(self, table: str, user_id: int, start: Optional[str] = None,
+                  end: Optional[str] = None) -> Iterator[Dict]:
+        """Registros arquivados do usuário cujos meses tocam o intervalo"""
+        first = month_of(start) if start else None
+        last = month_of(end) if end else None
+        for month in self.archived_months(user_id):
+            if (first and month < first) or (last and month > last):
+                continue
+            yield from self.read_segment(user_id, month)[table]
+
+    def event_segments(self, user_id: int) -> List[str]:
+        """Segmentos de eventos arquivados do usuário, em ordem de seq"""
+        directory = os.path.join(self.root, str(user_id))
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            return []
+        return [os.path.join(directory, name) for name in sorted(names)
+                if name.startswith(EVENTS_PREFIX) and name.endswith('.seg')]
+
+    def archived_events(self, user_id: int) -> Iterator[Dict]:
+        """Eventos arquivados do usuário, em ordem de seq (sem cache)"""
+        last = 0
+        for path in self.event_segments(user_id):
+            with open(path, 'rb') as f:
+                events = codec.loads(f.read())['events']
+            # Uma compactação interrompida pode ter gravado o mesmo trecho duas vezes
+            for event in events:
+                if event['seq'] > last:
+                    last = event['seq']
+                    yield event
+
+    def find_row(self, table: str, user_id: int, row_id: int) -> Optional[str]:
+        """Mês arquivado que contém o registro, se houver"""
+        for month in self.archived_months(user_id):
+            if any(row['id'] == row_id for row in self.read_segment(user_id, month)[table]):
+                return month
+        return None
+
+    def previous_balance(self, user_id: int, date_str: str,
+                         after: Optional[str] = None) -> Optional[Dict]:
+        """Último saldo arquivado antes de date_str (e depois de `after`)
+
+        Usa os rollups para escolher o mês, lendo apenas um segmento.
+        """
+        best = None
+        for rollup in self.db.snapshot().rows('rollups', user_id):
+            last_date = rollup.get('last_balance_date')
+            if not last_date or last_date >= date_str or (after and last_date <= after):
+                continue
+            if best is None or last_date > best['last_balance_date']:
+                best = rollup
+        if best is None:
+            return None
+
+        candidates = [b for b in self.read_segment(user_id, best['month'])['balances']
+                      if b['date'] < date_str]
+        return max(candidates, key=lambda b: b['date']) if candidates else None
+
+    # ------------------------------------------------------------------
+    # Compactação e restauração
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _summarize(user_id: int, month: str, segment: Dict[str, List[Dict]]) -> Dict:
+        balances = sorted(segment['balances'], key=lambda b: b['date'])
+        transactions = segment['transactions']
+        return {
+            'user_id': user_id,
+            'month': month,
+            'balance_count': len(balances),
+            'transaction_count': len(transactions),
+            'first_balance_date': balances[0]['date'] if balances else None,
+            'last_balance_date': balances[-1]['date'] if balances else None,
+            'balance_days': day_masks(b['date'] for b in balances).get(month, 0),
+            'opening_balance': balances[0]['amount'] if balances else None,
+            'closing_balance': balances[-1]['amount'] if balances else None,
+            'deposits': from_cents(sum(cents_of(t) for t in transactions if t['type'] == 'deposit')),
+            'withdrawals': from_cents(sum(cents_of(t) for t in transactions if t['type'] == 'withdrawal')),
+            'archived_at': datetime.now().isoformat()
+        }
+
+    def _archive_events(self, tx, user_id: int) -> int:
+        """Move para um segmento os eventos até o seq do checkpoint retido"""
+        checkpoints = tx.rows('checkpoints', user_id)
+        if not checkpoints:
+            return 0
+        events = tx.rows('events', user_id)
+        covered = bisect_right([e['seq'] for e in events], checkpoints[-1]['seq'])
+        if not covered:
+            return 0
+        old = list(events[:covered])
+        name = f"{EVENTS_PREFIX}{old[0]['seq']:010d}-{old[-1]['seq']:010d}.seg"
+        self._write_file(os.path.join(self.root, str(user_id), name), {'events': old})
+        tx.set_rows('events', user_id, events[covered:])
+        return covered
+
+    def compact(self, before: str, user_id: Optional[int] = None) -> Dict[str, int]:
+        """Arquiva todos os meses anteriores ao mês de `before`
+
+        Os segmentos são gravados antes de a nova versão (sem os registros
+        arquivados) ser publicada, para que uma interrupção nunca perca
+        informação. Os eventos cobertos pelo checkpoint são arquivados
+        junto, qualquer que seja a data.
+        """
+        cutoff = month_of(before)
+        result = {'segments': 0, 'balances': 0, 'transactions': 0, 'events': 0}
+        with self.db.write() as tx:
+            if user_id is not None:
+                user_ids = [user_id]
+            else:
+                user_ids = sorted(set().union(*(tx.user_ids(t) for t in ARCHIVED_TABLES + ('events',))))
+
+            for uid in user_ids:
+                result['events'] += self._archive_events(tx, uid)
+                groups: Dict[str, Dict[str, List[Dict]]] = {}
+                remaining: Dict[str, List[Dict]] = {}
+                for table in ARCHIVED_TABLES:
+                    remaining[table] = []
+                    for row in tx.rows(table, uid):
+                        month = month_of(row['date'])
+                        if month < cutoff:
+                            groups.setdefault(month, {t: [] for t in ARCHIVED_TABLES})[table].append(row)
+                            result[table] += 1
+                        else:
+                            remaining[table].append(row)
+                if not groups:
+                    continue
+
+                rollups = self._rollups(uid)
+                for month, segment in groups.items():
+                    if month in rollups:
+                        # Mês já arquivado (ex.: compactação interrompida): mescla por id
+                        existing = self.read_segment(uid, month)
+                        for table in ARCHIVED_TABLES:
+                            ids = {row['id'] for row in segment[table]}
+                            segment[table] = [r for r in existing[table] if r['id'] not in ids] + segment[table]
+                    self._write_segment(uid, month, segment)
+                    rollups[month] = self._summarize(uid, month, segment)
+                    result['segments'] += 1
+
+                for table in ARCHIVED_TABLES:
+                    tx.set_rows(table, uid, remaining[table])
+                tx.set_rows('rollups', uid, [rollups[m] for m in sorted(rollups)])
+        return result
+
+    def restore(self, user_id: int, month: str) -> bool:
+        """Devolve um mês arquivado para os dados ativos"""
+        with self.db.write() as tx:
+            if month not in self._rollups(user_id):
+                return False
+
+            segment = self.read_segment(user_id, month)
+            for table in ARCHIVED_TABLES:
+                hot = tx.rows(table, user_id)
+                hot_ids = {row['id'] for row in hot}
+                restored = [row for row in segment[table] if row['id'] not in hot_ids]
+                if restored:
+                    tx.set_rows(table, user_id, list(hot) + restored)
+            tx.set_rows('rollups', user_id,
+                        [r for r in tx.rows('rollups', user_id) if r['month'] != month])
+
+            # O segmento só sai do disco depois que a nova versão foi gravada;
+            # o cache continua atendendo leitores presos à versão anterior
+            tx.after_commit(lambda: self._remove_segment(user_id, month))
+        return True
+
+    def restore_row(self, table: str, user_id: int, row_id: int) -> bool:
+        """Restaura o mês arquivado que contém o registro, se houver"""
+        if not self.has_archive(user_id):
+            return False
+        month = self.find_row(table, user_id, row_id)
+        return self.restore(user_id, month) if month else False
+
+    def drop_user(self, user_id: int) -> int:
+        """Remove todos os segmentos arquivados de um usuário"""
+        with self.db.write() as tx:
+            months = self.archived_months(user_id)
+            event_segments = self.event_segments(user_id)
+            tx.drop_user_rows('rollups', user_id)
+
+            def remove_files():
+                for month in months:
+                    self._remove_segment(user_id, month)
+                    with self._lock:
+                        self._cache.pop((user_id, month), None)
+                for path in event_segments:
+                    self._remove_file(path)
+            tx.after_commit(remove_files)
+        return len(months)
+
+    def restore_dates(self, user_id: int, dates: Iterable[str]) -> int:
+        """Restaura os meses arquivados que contêm alguma das datas"""
+        if not self.has_archive(user_id):
+            return 0
+        months = {month_of(d) for d in dates} & set(self._rollups(user_id))
+        if not months:
+            return 0
+        with self.db.write():
+            for month in sorted(months):
+                self.restore(user_id, month)
+        return len(months)
+
+
+if __name__ == '__main__':
+    import argparse
+    from .models import Database
+
+    parser = argparse.ArgumentParser(description="Arquiva meses fechados em segmentos somente leitura")
+    parser.add_argument('--db', default='data.json', help="arquivo de dados")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--before', help="arquiva meses anteriores a esta data (YYYY-MM-DD)")
+    group.add_argument('--keep-months', type=int, help="mantém ativos apenas os últimos N meses")
+    parser.add_argument('--user-id', type=int, help="compacta apenas este usuário")
+    args = parser.parse_args()
+
+    database = Database(args.db)
+    cutoff = args.before or cutoff_for_months(args.keep_months)
+    result = database.archive.compact(cutoff, args.user_id)
+    print(f"Arquivados {result['balances']} saldo(s) e {result['transactions']} transação(ões) "
+          f"em {result['segments']} segmento(s) anteriores a {month_of(cutoff)}; "
+          f"{result['events']} evento(s) cobertos pelo checkpoint")
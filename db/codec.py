@@ -0,0 +1,36 @@
+"""
+Codificação do arquivo de dados em disco
+O arquivo de dados (data.json) e os segmentos arquivados são JSON, usando
+orjson quando instalado. Se o orjson recusar algum valor (ex.: inteiro
+maior que 64 bits), a codificação cai para o módulo json da biblioteca
+padrão em vez de falhar.
+"""
+import json
+from typing import Dict
+
+from .records import json_default
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depende do ambiente
+    orjson = None
+
+
+def loads(raw: bytes) -> Dict:
+    """Decodifica o conteúdo do arquivo"""
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw.decode('utf-8'))
+
+
+def dumps(data: Dict, compact: bool = False) -> bytes:
+    """Codifica os dados; compact=True grava sem indentação (segmentos)"""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS if compact else orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS
+        try:
+            return orjson.dumps(data, default=json_default, option=option)
+        except orjson.JSONEncodeError:
+            pass
+    return json.dumps(data, indent=None if compact else 2, ensure_ascii=False,
+                      separators=(',', ':') if compact else None,
+                      default=json_default).encode('utf-8')
@@ -0,0 +1,43 @@
+"""
+Datas dos registros como ordinal de dia (date.toordinal)
+Saldos e transações guardam, além da data em texto ('date'), o campo 'day'
+calculado uma única vez na gravação (ou ao carregar dados antigos). Os
+serviços usam esse inteiro em vez de interpretar a data a cada leitura.
+Aceita datas 'YYYY-MM-DD' e 'YYYY-MM-DD HH:MM:SS' (só o dia é considerado).
+"""
+from datetime import date
+from typing import Dict, Iterable
+
+DATED_TABLES = ('balances', 'transactions')
+
+
+def day_ordinal(date_str: str) -> int:
+    """Ordinal do dia de uma data YYYY-MM-DD[ HH:MM:SS]"""
+    return date.fromisoformat(date_str[:10]).toordinal()
+
+
+def day_of(row: Dict) -> int:
+    """Ordinal do dia de um registro (calcula apenas se o campo faltar)"""
+    day = row.get('day')
+    return day if day is not None else day_ordinal(row['date'])
+
+
+def to_date(day: int) -> date:
+    return date.fromordinal(day)
+
+
+def add_day_ordinals(rows: Iterable[Dict]) -> int:
+    """Preenche 'day' nos registros que ainda não têm o campo
+
+    Só deve ser usado em registros recém-lidos, antes de publicados.
+    Datas inválidas ficam sem o campo. Retorna quantos foram preenchidos.
+    """
+    filled = 0
+    for row in rows:
+        if row.get('day') is None and isinstance(row.get('date'), str):
+            try:
+                row['day'] = day_ordinal(row['date'])
+            except ValueError:
+                continue
+            filled += 1
+    return filled
@@ -0,0 +1,536 @@
+"""
+Registro de eventos de saldos e transações (event sourcing)
+Cada alteração feita pelos modelos vira um evento imutável na sequência do
+usuário (tabela 'events'); edições e exclusões levam o estado anterior em
+'before'. A cada CHECKPOINT_INTERVAL eventos o estado diário completo é
+gravado em 'checkpoints', de modo que qualquer saldo é reconstruído
+reaplicando apenas os eventos posteriores ao último checkpoint.
+
+Regra de cálculo do saldo de um dia:
+- se há um saldo informado manualmente, ele prevalece;
+- senão, saldo do dia anterior + depósitos - saques do dia.
+Um dia existe enquanto tiver saldo manual ou alguma transação.
+
+A tabela 'balances' continua existindo como projeção do registro: depois de
+cada evento os dias afetados (e os seguintes, até o saldo deixar de mudar)
+são reescritos a partir do estado dos eventos. Quando a projeção alcança o
+último dia, a mudança do saldo atual passa pelas regras de alerta.
+
+O estado diário e os checkpoints guardam centavos inteiros (db/money.py):
+a propagação dos saldos é exata e só vira reais na projeção.
+"""
+import os
+import threading
+from bisect import bisect_left, bisect_right, insort
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+from itertools import chain
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .archive import month_of
+from .dates import day_ordinal
+from .money import cents_of, from_cents, to_cents
+
+CHECKPOINT_INTERVAL = int(os.environ.get('META_EVENT_CHECKPOINT_INTERVAL', 100))
+EVENT_TYPES = ('transaction_added', 'transaction_updated', 'transaction_deleted',
+               'balance_set', 'balance_deleted')
+STATE_CACHE_SIZE = 256
+# Chaves em WriteTransaction.scratch
+OWNED_STATES = 'events.owned_states'
+PENDING_PROJECTION = 'events.pending_projection'
+
+# Estado de um dia: [saldo manual, depósitos manuais, saques manuais,
+#                    depósitos, saques, quantidade de transações], em centavos
+MANUAL, MANUAL_DEPOSITS, MANUAL_WITHDRAWALS, DEPOSITS, WITHDRAWALS, COUNT = range(6)
+EMPTY_DAY = (None, 0, 0, 0, 0, 0)
+# Unidade dos checkpoints gravados; os antigos, sem 'unit', estão em reais
+CHECKPOINT_UNIT = 'cents'
+
+DayState = List
+
+
+def day_exists(state: Optional[DayState]) -> bool:
+    return state is not None and (state[MANUAL] is not None or state[COUNT] > 0)
+
+
+def day_amount(state: DayState, previous: int) -> int:
+    if state[MANUAL] is not None:
+        return state[MANUAL]
+    return previous + state[DEPOSITS] - state[WITHDRAWALS]
+
+
+def day_flows(state: DayState) -> Tuple[int, int]:
+    """Depósitos e saques exibidos no registro de saldo do dia"""
+    if state[MANUAL] is not None:
+        return state[MANUAL_DEPOSITS], state[MANUAL_WITHDRAWALS]
+    return state[DEPOSITS], state[WITHDRAWALS]
+
+
+def _add_transaction(state: DayState, transaction: Dict, sign: int):
+    state[COUNT] += sign
+    if transaction['type'] == 'deposit':
+        state[DEPOSITS] += sign * cents_of(transaction)
+    elif transaction['type'] == 'withdrawal':
+        state[WITHDRAWALS] += sign * cents_of(transaction)
+    if state[COUNT] <= 0:
+        state[COUNT], state[DEPOSITS], state[WITHDRAWALS] = 0, 0, 0
+
+
+def apply_event(days: Dict[str, DayState], base: Dict[str, DayState], event: Dict) -> List[str]:
+    """Aplica um evento sobre `days` (cópias por dia de `base`) e retorna as datas tocadas"""
+    def state(date_str: str) -> DayState:
+        current = days.get(date_str)
+        if current is None or current is base.get(date_str):
+            current = days[date_str] = list(base.get(date_str) or EMPTY_DAY)
+        return current
+
+    type_, data, before = event['type'], event.get('data') or {}, event.get('before') or {}
+    if type_ == 'transaction_added':
+        _add_transaction(state(data['date']), data, 1)
+        return [data['date']]
+    if type_ == 'transaction_updated':
+        _add_transaction(state(before['date']), before, -1)
+        _add_transaction(state(data['date']), data, 1)
+        return [before['date'], data['date']]
+    if type_ == 'transaction_deleted':
+        _add_transaction(state(before['date']), before, -1)
+        return [before['date']]
+    if type_ == 'balance_set':
+        day = state(data['date'])
+        day[MANUAL] = to_cents(data['amount'])
+        day[MANUAL_DEPOSITS] = to_cents(data.get('deposits', 0))
+        day[MANUAL_WITHDRAWALS] = to_cents(data.get('withdrawals', 0))
+        return [data['date']]
+    if type_ == 'balance_deleted':
+        day = state(before['date'])
+        day[MANUAL], day[MANUAL_DEPOSITS], day[MANUAL_WITHDRAWALS] = None, 0, 0
+        return [before['date']]
+    raise ValueError(f"Tipo de evento desconhecido: {type_}")
+
+
+def initial_days(transactions: Iterable[Dict], balances: Iterable[Dict]) -> Dict[str, DayState]:
+    """Estado diário a partir de registros anteriores ao registro de eventos
+
+    Esses dados não dizem se o saldo foi informado ou calculado: dias com
+    transações são tratados como calculados e os demais como saldo manual.
+    """
+    days: Dict[str, DayState] = {}
+    for t in transactions:
+        day = days.setdefault(t['date'], list(EMPTY_DAY))
+        _add_transaction(day, t, 1)
+    for b in balances:
+        day = days.setdefault(b['date'], list(EMPTY_DAY))
+        if b.get('manual', not day[COUNT]):
+            day[MANUAL] = cents_of(b)
+            day[MANUAL_DEPOSITS] = cents_of(b, 'deposits')
+            day[MANUAL_WITHDRAWALS] = cents_of(b, 'withdrawals')
+    return days
+
+
+def checkpoint_rows(checkpoint: Dict) -> List[List]:
+    """Linhas [data, *estado, saldo] do checkpoint em centavos"""
+    if checkpoint.get('unit') == CHECKPOINT_UNIT:
+        return checkpoint['days']
+    rows = []
+    for date_str, manual, *values, count, amount in checkpoint['days']:
+        rows.append([date_str, None if manual is None else to_cents(manual),
+                     *(to_cents(v) for v in values), count, to_cents(amount)])
+    return rows
+
+
+def state_rows(days: Dict[str, DayState], dates: Iterable[str]) -> List[List]:
+    """Linhas [data, *estado, saldo] em centavos dos dias existentes, na ordem de `dates`"""
+    rows, amount = [], 0
+    for date_str in dates:
+        day = days[date_str]
+        if not day_exists(day):
+            continue
+        amount = day_amount(day, amount)
+        rows.append([date_str, *day, amount])
+    return rows
+
+
+def balance_series(days: Dict[str, DayState], dates: Iterable[str]) -> List[Dict]:
+    """Saldos diários (em reais) calculados a partir do estado, na ordem de `dates`"""
+    result, amount = [], 0
+    for date_str in dates:
+        day = days[date_str]
+        if not day_exists(day):
+            continue
+        amount = day_amount(day, amount)
+        deposits, withdrawals = day_flows(day)
+        result.append({'date': date_str, 'amount': from_cents(amount), 'deposits': from_cents(deposits),
+                       'withdrawals': from_cents(withdrawals), 'manual': day[MANUAL] is not None})
+    return result
+
+
+def transaction_payload(transaction: Dict) -> Dict:
+    """Campos de uma transação guardados nos eventos"""
+    return {k: transaction.get(k) for k in ('id', 'date', 'type', 'amount', 'description')}
+
+
+class _State:
+    """Estado diário de um usuário (imutável depois de publicado)
+
+    `key` identifica a versão: (id do último evento, id do checkpoint). Ids
+    nunca são reutilizados, então uma transação desfeita invalida o cache.
+    """
+    __slots__ = ('key', 'days', 'dates')
+
+    def __init__(self, key: Tuple, days: Dict[str, DayState], dates: List[str]):
+        self.key = key
+        self.days = days
+        self.dates = dates
+
+
+class EventLog:
+    def __init__(self, db, interval: int = CHECKPOINT_INTERVAL):
+        self.db = db
+        self.interval = max(1, interval)
+        self._states: "OrderedDict[int, _State]" = OrderedDict()
+        self._parsed: "OrderedDict[int, Tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def reset(self):
+        """Descarta o estado em cache (ex.: após recarregar os dados)"""
+        with self._lock:
+            self._states.clear()
+            self._parsed.clear()
+
+    # ------------------------------------------------------------------
+    # Consulta
+    # ------------------------------------------------------------------
+
+    def events(self, user_id: int, after_seq: int = 0) -> List[Dict]:
+        """Eventos do usuário com seq > after_seq, em ordem"""
+        rows = self.db.snapshot().rows('events', user_id)
+        lo, hi = 0, len(rows)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if rows[mid]['seq'] <= after_seq:
+                lo = mid + 1
+            else:
+                hi = mid
+        return list(rows[lo:])
+
+    def last_seq(self, user_id: int) -> int:
+        rows = self.db.snapshot().rows('events', user_id)
+        if rows:
+            return rows[-1]['seq']
+        # Eventos arquivados: a sequência continua a partir do checkpoint
+        checkpoint = self.checkpoint(user_id)
+        return checkpoint['seq'] if checkpoint else 0
+
+    def checkpoint(self, user_id: int) -> Optional[Dict]:
+        """Último checkpoint do usuário"""
+        rows = self.db.snapshot().rows('checkpoints', user_id)
+        return rows[-1] if rows else None
+
+    def _parse_checkpoint(self, checkpoint: Optional[Dict]) -> Tuple[List[str], Dict[str, DayState], Dict[str, int]]:
+        """(datas, estado por dia, saldo por dia em centavos) de um checkpoint, com cache"""
+        if not checkpoint:
+            return [], {}, {}
+        with self._lock:
+            parsed = self._parsed.get(checkpoint['id'])
+            if parsed is not None:
+                self._parsed.move_to_end(checkpoint['id'])
+                return parsed
+        dates, days, amounts = [], {}, {}
+        for date_str, *state, amount in checkpoint_rows(checkpoint):
+            dates.append(date_str)
+            days[date_str] = state
+            amounts[date_str] = amount
+        parsed = (dates, days, amounts)
+        with self._lock:
+            self._parsed[checkpoint['id']] = parsed
+            if len(self._parsed) > STATE_CACHE_SIZE:
+                self._parsed.popitem(last=False)
+        return parsed
+
+    def _key(self, user_id: int) -> Tuple:
+        view = self.db.snapshot()
+        events = view.rows('events', user_id)
+        checkpoints = view.rows('checkpoints', user_id)
+        return (events[-1]['id'] if events else None,
+                checkpoints[-1]['id'] if checkpoints else None)
+
+    def version(self, user_id: int) -> str:
+        """Identifica a versão dos dados do usuário (muda a cada evento)"""
+        event_id, checkpoint_id = self._key(user_id)
+        return f"{event_id or 0}.{checkpoint_id or 0}"
+
+    def state(self, user_id: int) -> _State:
+        """Estado diário atual: checkpoint + eventos posteriores (com cache)"""
+        key = self._key(user_id)
+        with self._lock:
+            cached = self._states.get(user_id)
+            if cached is not None and cached.key == key:
+                self._states.move_to_end(user_id)
+                return cached
+
+        checkpoint = self.checkpoint(user_id)
+        dates, base, _ = self._parse_checkpoint(checkpoint)
+        days = dict(base)
+        for event in self.events(user_id, checkpoint['seq'] if checkpoint else 0):
+            apply_event(days, base, event)
+        state = _State(key, days, sorted(days) if len(days) != len(dates) else dates)
+        self._cache(user_id, state)
+        return state
+
+    def _cache(self, user_id: int, state: _State):
+        with self._lock:
+            self._states[user_id] = state
+            self._states.move_to_end(user_id)
+            if len(self._states) > STATE_CACHE_SIZE:
+                self._states.popitem(last=False)
+
+    def balance_on(self, user_id: int, date_str: str) -> Optional[float]:
+        """Saldo em uma data (último dia existente até ela), reaplicando só
+        os eventos posteriores ao checkpoint e os dias entre a primeira data
+        alterada e a data pedida"""
+        checkpoint = self.checkpoint(user_id)
+        if checkpoint is None:
+            # Usuário sem eventos: os registros de saldo ainda são a fonte
+            from .models import Balance
+            amounts = [b['amount'] for b in Balance(self.db).get_balances_by_user(user_id)
+                       if b['date'] <= date_str]
+            return amounts[-1] if amounts else None
+
+        dates, base, amounts = self._parse_checkpoint(checkpoint)
+        overlay: Dict[str, DayState] = {}
+        earliest = None
+        for event in self.events(user_id, checkpoint['seq'] if checkpoint else 0):
+            for touched in apply_event(overlay, base, event):
+                earliest = touched if earliest is None or touched < earliest else earliest
+
+        if earliest is None or earliest > date_str:
+            i = bisect_right(dates, date_str) - 1
+            return from_cents(amounts[dates[i]]) if i >= 0 else None
+
+        i = bisect_left(dates, earliest) - 1
+        found = i >= 0
+        amount = amounts[dates[i]] if found else 0
+        span = set(dates[i + 1:bisect_right(dates, date_str)])
+        span.update(d for d in overlay if earliest <= d <= date_str)
+        for d in sorted(span):
+            day = overlay.get(d, base.get(d))
+            if day_exists(day):
+                amount = day_amount(day, amount)
+                found = True
+        return from_cents(amount) if found else None
+
+    def daily_balances(self, user_id: int) -> List[Dict]:
+        """Saldos diários reconstruídos a partir do registro"""
+        state = self.state(user_id)
+        return balance_series(state.days, state.dates)
+
+    # ------------------------------------------------------------------
+    # Gravação
+    # ------------------------------------------------------------------
+
+    def _ensure_checkpoint(self, tx, user_id: int):
+        """Checkpoint inicial (seq 0) a partir dos registros já existentes
+
+        Deve ser chamado antes de alterar os registros do usuário.
+        """
+        if tx.rows('checkpoints', user_id):
+            return
+        archive = self.db.archive
+        days = initial_days(
+            chain(tx.rows('transactions', user_id), archive.iter_rows('transactions', user_id)),
+            chain(tx.rows('balances', user_id), archive.iter_rows('balances', user_id)))
+        self._write_checkpoint(tx, user_id, 0, days, sorted(days))
+
+    def _write_checkpoint(self, tx, user_id: int, seq: int, days: Dict[str, DayState], dates: List[str]):
+        self._store_checkpoint(tx, user_id, seq, state_rows(days, dates))
+
+    def _store_checkpoint(self, tx, user_id: int, seq: int, rows: List[List]):
+        tx.set_rows('checkpoints', user_id, [{
+            'id': self.db._get_next_id('checkpoints'),
+            'user_id': user_id,
+            'seq': seq,
+            'unit': CHECKPOINT_UNIT,
+            'days': rows,
+            'created_at': datetime.now().isoformat()
+        }])
+
+    def rebase(self, user_id: int, rows: List[List]) -> bool:
+        """Substitui o estado diário do usuário por `rows` (linhas de state_rows)
+
+        Usado depois de reconstruir os saldos a partir das transações: um
+        checkpoint no último evento passa a valer como estado, de modo que
+        os próximos eventos partem dos dados corrigidos. Usuários sem
+        registro de eventos não mudam. Retorna se o estado mudou.
+        """
+        with self.db.write() as tx:
+            if not tx.rows('checkpoints', user_id):
+                return False
+            state = self.state(user_id)
+            if state_rows(state.days, state.dates) == rows:
+                return False
+            self._store_checkpoint(tx, user_id, self.last_seq(user_id), rows)
+        return True
+
+    @contextmanager
+    def deferred_projection(self):
+        """Adia para o fim do bloco a projeção dos record() com project=True
+
+        Cada usuário é projetado uma única vez, do primeiro ao último dia
+        tocado no bloco. Leituras de saldo dentro do bloco só veem a
+        projeção depois de flush_projection().
+        """
+        with self.db.write() as tx:
+            if PENDING_PROJECTION in tx.scratch:
+                yield
+                return
+            tx.scratch[PENDING_PROJECTION] = {}
+            try:
+                yield
+                self.flush_projection()
+            finally:
+                tx.scratch.pop(PENDING_PROJECTION, None)
+
+    def flush_projection(self) -> int:
+        """Projeta agora os usuários com projeção adiada; retorna quantos"""
+        with self.db.write() as tx:
+            pending = tx.scratch.get(PENDING_PROJECTION)
+            if not pending:
+                return 0
+            spans = sorted(pending.items())
+            pending.clear()
+            for user_id, (start, until) in spans:
+                self.project(user_id, start, until=until)
+        return len(spans)
+
+    def record(self, user_id: int, type_: str, data: Optional[Dict] = None,
+               before: Optional[Dict] = None, project: bool = True) -> Dict:
+        """Acrescenta um evento e, por padrão, atualiza a projeção de saldos"""
+        if type_ not in EVENT_TYPES:
+            raise ValueError(f"Tipo de evento desconhecido: {type_}")
+        with self.db.write() as tx:
+            self._ensure_checkpoint(tx, user_id)
+            previous = self.state(user_id)
+            owned = tx.scratch.setdefault(OWNED_STATES, {})
+            event = {
+                'id': self.db._get_next_id('events'),
+                'user_id': user_id,
+                'seq': self.last_seq(user_id) + 1,
+                'type': type_,
+                'data': data,
+                'before': before,
+                'created_at': datetime.now().isoformat()
+            }
+            # O estado criado por um record() anterior desta mesma transação
+            # ainda não foi publicado: é alterado no lugar, copiando só os
+            # dias tocados. Nos demais casos o dict e as datas são copiados.
+            mine = owned.get(user_id) is previous
+            new_dates = {part['date'] for part in (data, before)
+                         if part and part['date'] not in previous.days}
+            days = previous.days if mine else dict(previous.days)
+            dates = previous.dates if mine else list(previous.dates)
+            touched = apply_event(days, days, event)
+            for d in new_dates:
+                insort(dates, d)
+            tx.insert('events', event)
+            if event['seq'] % self.interval == 0:
+                self._write_checkpoint(tx, user_id, event['seq'], days, dates)
+            state = owned[user_id] = _State(self._key(user_id), days, dates)
+            self._cache(user_id, state)
+            if project:
+                pending = tx.scratch.get(PENDING_PROJECTION)
+                if pending is None:
+                    self.project(user_id, min(touched), until=max(touched))
+                else:
+                    span = pending.get(user_id)
+                    pending[user_id] = (min(touched + [span[0]] if span else touched),
+                                        max(touched + [span[1]] if span else touched))
+        return event
+
+    def project(self, user_id: int, start: str, until: Optional[str] = None) -> int:
+        """Reescreve os saldos a partir de `start` com o estado dos eventos
+
+        Para no primeiro dia depois de `until` cujo registro já está correto
+        (daí em diante nada muda). Retorna quantos registros foram alterados.
+        """
+        from .models import Balance
+
+        until = until or start
+        changed = 0
+        with self.db.write() as tx:
+            self._ensure_checkpoint(tx, user_id)
+            state = self.state(user_id)
+            archive = self.db.archive
+            restored = set()
+
+            balances = Balance(self.db)
+            last = balances.get_last_balances(user_id, 1)
+            latest = last[0]['amount'] if last else None
+            previous = balances.get_previous_balance(user_id, start)
+            amount = cents_of(previous) if previous else 0
+            found = previous is not None
+            rows = {b['date']: b for b in tx.rows('balances', user_id) if b['date'] >= start}
+            span = sorted(set(state.dates[bisect_left(state.dates, start):]) | set(rows))
+            now = datetime.now().isoformat()
+
+            for date_str in span:
+                month = month_of(date_str)
+                if month not in restored and archive.is_archived(user_id, date_str):
+                    archive.restore(user_id, month)
+                    rows.update({b['date']: b for b in tx.rows('balances', user_id)
+                                 if month_of(b['date']) == month})
+                restored.add(month)
+
+                day = state.days.get(date_str)
+                row = rows.get(date_str)
+                if not day_exists(day):
+                    if row is not None:
+                        tx.delete('balances', row)
+                        changed += 1
+                    continue
+
+                amount = day_amount(day, amount)
+                found = True
+                deposits, withdrawals = day_flows(day)
+                manual = day[MANUAL] is not None
+                values = {'day': day_ordinal(date_str), 'amount': from_cents(amount),
+                          'deposits': from_cents(deposits), 'withdrawals': from_cents(withdrawals),
+                          'manual': manual}
+                if row is None:
+                    tx.insert('balances', {
+                        'id': self.db._get_next_id('balances'),
+                        'user_id': user_id,
+                        'date': date_str,
+                        **values,
+                        'created_at': now,
+                        'updated_at': now
+                    })
+                    changed += 1
+                elif any(row.get(k) != v for k, v in values.items()):
+                    tx.update('balances', row, **values, updated_at=now)
+                    changed += 1
+                elif date_str > until:
+                    break
+            else:
+                # A projeção chegou ao fim: o último dia calculado é o saldo atual
+                self.db.alerts.evaluate(tx, user_id, latest, from_cents(amount) if found else None,
+                                        span[-1] if span else start)
+        return changed
+
+    def rebuild(self, user_id: int) -> int:
+        """Reescreve toda a projeção de saldos do usuário a partir do registro"""
+        with self.db.write() as tx:
+            self._ensure_checkpoint(tx, user_id)
+            state = self.state(user_id)
+            if not state.dates and not tx.rows('balances', user_id):
+                return 0
+            first = min(state.dates[:1] + [b['date'] for b in tx.rows('balances', user_id)])
+            return self.project(user_id, first, until=state.dates[-1] if state.dates else first)
+
+    def drop_user(self, user_id: int):
+        """Remove o registro de eventos e os checkpoints do usuário"""
+        with self.db.write() as tx:
+            tx.drop_user_rows('events', user_id)
+            tx.drop_user_rows('checkpoints', user_id)
+        with self._lock:
+            self._states.pop(user_id, None)
@@ -0,0 +1,298 @@
+"""
+Verificação incremental de consistência entre transações e saldos
+Cada partição de 'balances' e 'transactions' tem um hash por mês: a soma
+(mod 2**64) dos hashes dos registros do mês, de modo que a ordem dos
+registros não importa. Os hashes são mantidos no caminho de escrita: ao
+publicar uma transação, refresh_hashes aplica a diferença das partições
+alteradas e grava o resultado na tabela 'month_hashes'. Uma verificação
+não precisa reler os registros para saber o que mudou.
+
+A tabela 'integrity' guarda, por usuário, o hash total, os hashes por mês e
+o último evento do estado verificado. Uma verificação compara esses valores
+com os atuais e só confere os meses cujos hashes mudaram ou que foram
+tocados por eventos posteriores; usuários sem mudança custam apenas a
+comparação do hash total. Alterações feitas fora da aplicação (ex.: edição
+do data.json) não passam pelo caminho de escrita: só a verificação com
+full=True, que recalcula os hashes a partir dos registros, as encontra.
+
+Os saldos esperados vêm do registro de eventos (db/events.py); para
+usuários sem eventos, das transações e saldos manuais. Saldos divergentes
+podem ser corrigidos reprojetando o intervalo afetado; divergências nas
+transações são apenas reportadas.
+"""
+import hashlib
+from datetime import datetime
+from itertools import chain
+from time import perf_counter
+from typing import Dict, Iterable, List, Optional, Set
+
+from .archive import month_of
+from .events import COUNT, DEPOSITS, WITHDRAWALS, balance_series, initial_days
+from .money import cents_of, from_cents, to_cents
+
+HASHED_FIELDS = {
+    'balances': ('date', 'amount', 'deposits', 'withdrawals', 'manual'),
+    'transactions': ('id', 'date', 'type', 'amount')
+}
+HASH_MODULUS = 2 ** 64
+HASHES_TABLE = 'month_hashes'
+MAX_REPORTED_ISSUES = 100
+
+
+def row_hash(row: Dict, fields) -> int:
+    content = repr(tuple(row.get(field) for field in fields)).encode('utf-8')
+    return int.from_bytes(hashlib.blake2b(content, digest_size=8).digest(), 'big')
+
+
+def month_hashes(rows: Iterable[Dict], fields) -> Dict[str, int]:
+    """Hash de cada mês da partição"""
+    hashes: Dict[str, int] = {}
+    for row in rows:
+        month = month_of(row['date'])
+        hashes[month] = (hashes.get(month, 0) + row_hash(row, fields)) % HASH_MODULUS
+    return hashes
+
+
+def _encode(hashes: Dict[str, int]) -> Dict[str, str]:
+    return {month: f"{value:016x}" for month, value in sorted(hashes.items())}
+
+
+def _decode(hashes: Dict[str, str]) -> Dict[str, int]:
+    return {month: int(value, 16) for month, value in hashes.items()}
+
+
+def _apply_delta(hashes: Dict[str, int], base, rows, fields) -> Dict[str, int]:
+    """Hashes da partição depois da troca de `base` por `rows`
+
+    Registros publicados são imutáveis: os que mudaram são os que não estão
+    nas duas versões (comparação por identidade).
+    """
+    hashes = dict(hashes)
+    kept = {id(row) for row in rows}
+    old = {id(row) for row in base}
+    for row, sign in [(r, -1) for r in base if id(r) not in kept] + [(r, 1) for r in rows if id(r) not in old]:
+        month = month_of(row['date'])
+        value = (hashes.get(month, 0) + sign * row_hash(row, fields)) % HASH_MODULUS
+        if value:
+            hashes[month] = value
+        else:
+            hashes.pop(month, None)
+    return hashes
+
+
+def refresh_hashes(db, tx, user_ids: Optional[Set[int]] = None):
+    """Atualiza a tabela 'month_hashes' com as partições alteradas em `tx`
+
+    Chamado pelo Database ao publicar a transação. A diferença é sempre
+    aplicada sobre os hashes da versão base, então chamar de novo na mesma
+    transação não soma duas vezes.
+    """
+    pending: Dict[int, Set[str]] = {}
+    for table, user_id in tx.touched():
+        if table in HASHED_FIELDS and (user_ids is None or user_id in user_ids):
+            pending.setdefault(user_id, set()).add(table)
+    for user_id, tables in pending.items():
+        stored = tx.base.rows(HASHES_TABLE, user_id)
+        if stored:
+            hashes = {table: _decode(stored[0][table]) for table in HASHED_FIELDS}
+            for table in tables:
+                hashes[table] = _apply_delta(hashes[table], tx.base.rows(table, user_id),
+                                             tx.rows(table, user_id), HASHED_FIELDS[table])
+        else:
+            # Primeira gravação do usuário com hashes: calcula tudo uma vez
+            hashes = {table: month_hashes(tx.rows(table, user_id), fields)
+                      for table, fields in HASHED_FIELDS.items()}
+        current = tx.rows(HASHES_TABLE, user_id)
+        row_id = current[0]['id'] if current else db._get_next_id(HASHES_TABLE)
+        tx.set_rows(HASHES_TABLE, user_id, [{
+            'id': row_id, 'user_id': user_id,
+            **{table: _encode(values) for table, values in hashes.items()}
+        }] if any(hashes.values()) else [])
+
+
+def _event_dates(event: Dict) -> List[str]:
+    return [part['date'] for part in (event.get('data'), event.get('before')) if part and part.get('date')]
+
+
+class IntegrityVerifier:
+    def __init__(self, db):
+        self.db = db
+
+    def partition_hashes(self, table: str, user_id: int, fresh: bool = False) -> Dict[str, int]:
+        """Hashes por mês da partição; fresh=True recalcula a partir dos registros"""
+        view = self.db.snapshot()
+        stored = view.rows(HASHES_TABLE, user_id)
+        if stored and not fresh:
+            return _decode(stored[0][table])
+        fields = HASHED_FIELDS[table]
+        return view.partition_index('month_hashes', table, user_id,
+                                    lambda rows: month_hashes(rows, fields))
+
+    def user_hashes(self, user_id: int, fresh: bool = False) -> Dict[str, str]:
+        """Hash atual de cada mês ativo do usuário (saldos e transações)"""
+        balances = self.partition_hashes('balances', user_id, fresh)
+        transactions = self.partition_hashes('transactions', user_id, fresh)
+        return {month: f"{balances.get(month, 0):016x}{transactions.get(month, 0):016x}"
+                for month in sorted(set(balances) | set(transactions))}
+
+    def user_hash(self, user_id: int) -> str:
+        """Hash de todos os meses ativos do usuário"""
+        total = 0
+        for table in HASHED_FIELDS:
+            total = (total + sum(self.partition_hashes(table, user_id).values())) % HASH_MODULUS
+        return f"{total:016x}"
+
+    def _rewrite_hashes(self, tx, user_id: int):
+        """Regrava os hashes do usuário a partir dos registros (verificação completa)"""
+        hashes = {table: _encode(self.partition_hashes(table, user_id, fresh=True))
+                  for table in HASHED_FIELDS}
+        stored = tx.rows(HASHES_TABLE, user_id)
+        if stored and all(stored[0][table] == hashes[table] for table in HASHED_FIELDS):
+            return
+        row_id = stored[0]['id'] if stored else self.db._get_next_id(HASHES_TABLE)
+        tx.set_rows(HASHES_TABLE, user_id, [{'id': row_id, 'user_id': user_id, **hashes}])
+
+    def _dirty_months(self, user_id: int, current: Dict[str, str], stored: Optional[Dict]) -> Set[str]:
+        """Meses a conferir desde o último estado verificado"""
+        if not stored or stored['seq'] > self.db.events.last_seq(user_id):
+            return set(current)
+        months = {m for m in set(current) | set(stored['months'])
+                  if current.get(m) != stored['months'].get(m)}
+        events = self.db.events.events(user_id, stored['seq'])
+        if stored['seq'] < self.db.events.last_seq(user_id) and (
+                not events or events[0]['seq'] != stored['seq'] + 1):
+            # Eventos desde a última verificação já foram arquivados
+            return set(current)
+        for event in events:
+            months.update(month_of(d) for d in _event_dates(event))
+        return months
+
+    def _legacy_balances(self, user_id: int) -> List[Dict]:
+        """Saldos esperados de um usuário sem eventos: transações e saldos manuais"""
+        view, archive = self.db.snapshot(), self.db.archive
+        days = initial_days(
+            chain(view.rows('transactions', user_id), archive.iter_rows('transactions', user_id)),
+            chain(view.rows('balances', user_id), archive.iter_rows('balances', user_id)))
+        return balance_series(days, sorted(days))
+
+    def check_months(self, user_id: int, months: Set[str]) -> List[Dict]:
+        """Diferenças entre os registros ativos e o registro de eventos nos meses
+
+        Sem registro de eventos, os saldos são conferidos contra as
+        transações e não há totais de transações a comparar.
+        """
+        view = self.db.snapshot()
+        archive = self.db.archive
+        months = {m for m in months if not archive.is_archived(user_id, f"{m}-01")}
+        if not months:
+            return []
+        issues = []
+        legacy = not view.rows('checkpoints', user_id)
+
+        series = self._legacy_balances(user_id) if legacy else self.db.events.daily_balances(user_id)
+        expected = {b['date']: b for b in series if month_of(b['date']) in months}
+        found = {}
+        for row in view.rows('balances', user_id):
+            if month_of(row['date']) not in months:
+                continue
+            if row['date'] in found:
+                issues.append({'table': 'balances', 'date': row['date'], 'problem': 'duplicate'})
+                continue
+            found[row['date']] = row
+        for date_str in sorted(set(expected) | set(found)):
+            want, row = expected.get(date_str), found.get(date_str)
+            if row is None or want is None:
+                issues.append({'table': 'balances', 'date': date_str,
+                               'problem': 'missing' if row is None else 'unexpected'})
+            elif any(cents_of(row, k) != to_cents(want[k]) for k in ('amount', 'deposits', 'withdrawals')):
+                issues.append({'table': 'balances', 'date': date_str, 'problem': 'amount',
+                               'expected': want['amount'], 'found': row.get('amount')})
+
+        if legacy:
+            return issues
+
+        days = self.db.events.state(user_id).days
+        # Totais em centavos: a comparação com o estado dos eventos é exata
+        totals: Dict[str, List] = {}
+        for t in view.rows('transactions', user_id):
+            if month_of(t['date']) in months:
+                day = totals.setdefault(t['date'], [0, 0, 0])
+                if t['type'] == 'deposit':
+                    day[0] += cents_of(t)
+                elif t['type'] == 'withdrawal':
+                    day[1] += cents_of(t)
+                day[2] += 1
+        dates = set(totals) | {d for d in days if month_of(d) in months and days[d][COUNT]}
+        for date_str in sorted(dates):
+            state = days.get(date_str)
+            want = (state[DEPOSITS], state[WITHDRAWALS], state[COUNT]) if state else (0, 0, 0)
+            got = tuple(totals.get(date_str, (0, 0, 0)))
+            if got != want:
+                issues.append({'table': 'transactions', 'date': date_str, 'problem': 'totals',
+                               'expected': [from_cents(want[0]), from_cents(want[1]), want[2]],
+                               'found': [from_cents(got[0]), from_cents(got[1]), got[2]]})
+        return issues
+
+    def verify(self, user_ids: Optional[Iterable[int]] = None, repair: bool = False,
+               full: bool = False) -> Dict:
+        """Confere os meses alterados desde a última verificação
+
+        Com repair=True os saldos divergentes são reprojetados a partir dos
+        eventos (usuários sem eventos passam a ter um checkpoint inicial).
+        Com full=True os hashes são recalculados a partir dos registros e
+        todos os meses ativos são conferidos. O estado verificado só é
+        gravado para usuários sem divergências pendentes.
+        """
+        started = perf_counter()
+        if user_ids is None:
+            user_ids = [u['id'] for u in self.db.snapshot().users]
+        report = {'users': 0, 'legacy': 0, 'unchanged': 0, 'months_checked': 0,
+                  'issues': 0, 'repaired': 0, 'details': []}
+
+        with self.db.write() as tx:
+            for user_id in user_ids:
+                report['users'] += 1
+                legacy = not tx.rows('checkpoints', user_id)
+                report['legacy'] += legacy
+                if full:
+                    self._rewrite_hashes(tx, user_id)
+                stored_rows = tx.rows('integrity', user_id)
+                stored = stored_rows[0] if stored_rows else None
+                if (not full and stored and stored['hash'] == self.user_hash(user_id)
+                        and stored['seq'] == self.db.events.last_seq(user_id)):
+                    report['unchanged'] += 1
+                    continue
+                current = self.user_hashes(user_id)
+                months = set(current) if full else self._dirty_months(user_id, current, stored)
+                if legacy and months:
+                    # Saldos calculados dependem dos dias anteriores
+                    months |= {m for m in current if m >= min(months)}
+                if not months:
+                    report['unchanged'] += 1
+                    continue
+
+                report['months_checked'] += len(months)
+                issues = self.check_months(user_id, months)
+                if repair and any(i['table'] == 'balances' for i in issues):
+                    dates = [i['date'] for i in issues if i['table'] == 'balances']
+                    report['repaired'] += self.db.events.project(user_id, min(dates), until=max(dates))
+                    refresh_hashes(self.db, tx, {user_id})
+                    issues = self.check_months(user_id, months)
+                    current = self.user_hashes(user_id)
+
+                report['issues'] += len(issues)
+                for issue in issues[:max(0, MAX_REPORTED_ISSUES - len(report['details']))]:
+                    report['details'].append({'user_id': user_id, **issue})
+                if not issues:
+                    self._store(tx, user_id, stored, current)
+
+        report['seconds'] = round(perf_counter() - started, 3)
+        return report
+
+    def _store(self, tx, user_id: int, stored: Optional[Dict], months: Dict[str, str]):
+        values = {'seq': self.db.events.last_seq(user_id), 'hash': self.user_hash(user_id), 'months': months,
+                  'verified_at': datetime.now().isoformat()}
+        if stored:
+            tx.update('integrity', stored, **values)
+        else:
+            tx.insert('integrity', {'id': self.db._get_next_id('integrity'), 'user_id': user_id, **values})
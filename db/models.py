@@ -1,71 +1,383 @@
-import json
+import heapq
+import math
 import os
+import threading
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from itertools import islice
+from contextlib import contextmanager
 from datetime import datetime, date
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, Iterator, Sequence
+
+from services.metrics import metrics
+
+from . import codec
+from .dates import DATED_TABLES, add_day_ordinals, day_ordinal
+from .alerts import AlertEngine
+from .archive import ArchiveStore, day_masks, month_of
+from .events import EventLog, transaction_payload
+from .integrity import HASHES_TABLE, refresh_hashes
+from .money import round_money
+from .snapshot import Snapshot, WriteTransaction, normalize_username, row_key
+
+# Tamanho do cache de nomes de usuário inexistentes (logins com nome errado)
+MISSING_USERNAME_CACHE_SIZE = 1024
+# Registros por página nas consultas paginadas
+DEFAULT_PAGE_SIZE = 50
 
 class Database:
+    """Dados em memória publicados como snapshots imutáveis
+    
+    Leituras usam o snapshot corrente sem travas (ou o snapshot fixado na
+    thread por read()/pin()); gravações passam por write(), que serializa
+    os escritores, monta a nova versão em uma WriteTransaction e a publica
+    de forma atômica antes de gravar o arquivo.
+    """
+    
     def __init__(self, db_path: str = 'data.json'):
         self.db_path = db_path
-        self.data = self._load_data()
+        self._write_lock = threading.RLock()
+        self._local = threading.local()
+        self._snapshot = Snapshot.from_dict(self._load_data())
+        self.archive = ArchiveStore(self)
+        self.events = EventLog(self)
+        self.alerts = AlertEngine(self)
+        self._id_counters: Dict[str, int] = {}
+        self._missing_lock = threading.Lock()
+        self._missing_usernames: "OrderedDict[str, None]" = OrderedDict()
+        self._signature = self._file_signature()
+    
+    # ------------------------------------------------------------------
+    # Snapshots
+    # ------------------------------------------------------------------
+    
+    def snapshot(self):
+        """Versão visível para a thread atual
+        
+        Dentro de write() é o rascunho da transação; com um snapshot fixado
+        (read()/pin()) é a versão fixada; caso contrário, a última publicada.
+        """
+        local = self._local
+        tx = getattr(local, 'tx', None)
+        if tx is not None:
+            return tx
+        pinned = getattr(local, 'pinned', None)
+        return pinned if pinned is not None else self._snapshot
+    
+    @property
+    def version(self) -> int:
+        return self._snapshot.version
+    
+    @property
+    def data(self) -> Dict[str, Any]:
+        """Estrutura plana da versão visível (somente leitura)"""
+        view = self.snapshot()
+        if isinstance(view, WriteTransaction):
+            view = view.freeze()
+        return view.as_dict()
+    
+    @data.setter
+    def data(self, value: Dict[str, Any]):
+        with self._write_lock:
+            self._publish(Snapshot.from_dict(value, self._snapshot.version + 1))
+            self._id_counters.clear()
+            self.events.reset()
+    
+    def pin(self):
+        """Fixa a versão atual para as próximas leituras da thread"""
+        if getattr(self._local, 'pinned', None) is None:
+            self._local.pinned = self._snapshot
+        return self._local.pinned
+    
+    def unpin(self):
+        self._local.pinned = None
+    
+    @contextmanager
+    def read(self):
+        """Leituras consistentes: todo o bloco enxerga a mesma versão"""
+        owner = getattr(self._local, 'pinned', None) is None
+        snapshot = self.pin()
+        try:
+            yield snapshot
+        finally:
+            if owner:
+                self.unpin()
+    
+    @contextmanager
+    def write(self):
+        """Transação de escrita; chamadas aninhadas reutilizam a mesma
+        
+        Ao final da transação mais externa a nova versão é publicada e o
+        arquivo é gravado uma única vez. Se o bloco falhar, nada é publicado.
+        """
+        tx = getattr(self._local, 'tx', None)
+        if tx is not None:
+            yield tx
+            return
+        
+        with self._write_lock:
+            tx = self._local.tx = WriteTransaction(self._snapshot)
+            try:
+                yield tx
+            finally:
+                self._local.tx = None
+            saved = True
+            if tx.changed:
+                refresh_hashes(self, tx)
+                self._publish(tx.freeze())
+                saved = self._save_data()
+            # Callbacks apagam arquivos (ex.: segmentos restaurados) que só
+            # podem sair do disco depois que o data.json foi gravado
+            if saved:
+                for callback in tx._after_commit:
+                    callback()
+    
+    def batch(self):
+        """Agrupa várias operações em uma única versão e uma única gravação"""
+        return self.write()
+    
+    @contextmanager
+    def savepoint(self):
+        """Bloco de escrita que, se falhar, desfaz só as próprias alterações
+        
+        Dentro de um write()/batch() as demais operações da transação são
+        mantidas; a exceção continua propagando.
+        """
+        with self.write() as tx:
+            mark = tx.savepoint()
+            try:
+                yield tx
+            except BaseException:
+                tx.rollback(mark)
+                raise
+    
+    def _publish(self, snapshot: Snapshot):
+        self._snapshot = snapshot
+        # A thread que escreveu passa a enxergar a própria gravação
+        if getattr(self._local, 'pinned', None) is not None:
+            self._local.pinned = snapshot
+    
+    # ------------------------------------------------------------------
+    # Arquivo
+    # ------------------------------------------------------------------
+    
+    def _file_signature(self):
+        try:
+            st = os.stat(self.db_path)
+            return st.st_mtime_ns, st.st_size
+        except OSError:
+            return None
+    
+    def reload_if_changed(self) -> bool:
+        """Recarrega os dados se o arquivo foi alterado por outro processo"""
+        if self._file_signature() == self._signature:
+            return False
+        if getattr(self._local, 'tx', None) is not None:
+            return False
+        with self._write_lock:
+            # Outra thread pode ter gravado (ou recarregado) enquanto esperávamos
+            signature = self._file_signature()
+            if signature == self._signature:
+                return False
+            self._publish(Snapshot.from_dict(self._load_data(), self._snapshot.version + 1))
+            self.archive.reset()
+            self.events.reset()
+            self._id_counters.clear()
+            with self._missing_lock:
+                self._missing_usernames.clear()
+            self._signature = signature
+        return True
+    
+    def users_by_name(self) -> Dict[str, Dict]:
+        """Índice nome normalizado -> usuário (o primeiro cadastrado prevalece)"""
+        return self.snapshot().users_by_name()
+    
+    def users_by_id(self) -> Dict[int, Dict]:
+        """Índice id -> usuário"""
+        return self.snapshot().users_by_id()
     
     def _load_data(self) -> Dict:
         """Carrega dados do arquivo JSON ou cria estrutura inicial"""
         if os.path.exists(self.db_path):
             try:
-                with open(self.db_path, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except (json.JSONDecodeError, IOError):
-                pass
+                with metrics.timer('storage_operation_seconds', op='load'):
+                    with open(self.db_path, 'rb') as f:
+                        raw = f.read()
+                    data = codec.loads(raw)
+                metrics.inc('storage_operations_total', op='load')
+                metrics.inc('storage_bytes_total', len(raw), op='read', format='json')
+                # Dados gravados antes do campo 'day' recebem o ordinal uma única vez
+                for table in DATED_TABLES:
+                    if isinstance(data.get(table), list):
+                        add_day_ordinals(data[table])
+                return data
+            except (ValueError, IOError):
+                metrics.inc('storage_errors_total', op='load')
         
         # Estrutura inicial do banco de dados
         return {
             'users': [],
             'balances': [],
             'transactions': [],
-            'goals': []
+            'goals': [],
+            'rollups': [],
+            'events': [],
+            'checkpoints': [],
+            'alert_rules': [],
+            'outbox': [],
+            'integrity': [],
+            'month_hashes': []
         }
     
-    def _save_data(self):
-        """Salva dados no arquivo JSON"""
-        try:
-            with open(self.db_path, 'w', encoding='utf-8') as f:
-                json.dump(self.data, f, indent=2, ensure_ascii=False, default=str)
-        except IOError as e:
-            print(f"Erro ao salvar dados: {e}")
+    def _save_data(self) -> bool:
+        """Salva a última versão publicada no arquivo; False se a gravação falhou"""
+        if getattr(self._local, 'tx', None) is not None:
+            # Dentro de uma transação a gravação acontece no commit
+            return True
+        with self._write_lock:
+            try:
+                with metrics.timer('storage_operation_seconds', op='save'):
+                    raw = codec.dumps(self._snapshot.as_dict())
+                    # Grava em arquivo temporário e troca de forma atômica
+                    tmp_path = f"{self.db_path}.tmp"
+                    with open(tmp_path, 'wb') as f:
+                        f.write(raw)
+                    os.replace(tmp_path, self.db_path)
+                self._signature = self._file_signature()
+                metrics.inc('storage_operations_total', op='save')
+                metrics.inc('storage_bytes_total', len(raw), op='write', format='json')
+                return True
+            except (OSError, TypeError, ValueError) as e:
+                # Falha de disco ou valor não serializável: a versão publicada
+                # continua em memória e o arquivo anterior fica intacto
+                metrics.inc('storage_errors_total', op='save')
+                print(f"Erro ao salvar dados: {e}")
+                return False
     
     def _get_next_id(self, table: str) -> int:
         """Gera próximo ID para uma tabela"""
-        if not self.data[table]:
-            return 1
-        return max(item.get('id', 0) for item in self.data[table]) + 1
+        with self._write_lock:
+            if table not in self._id_counters:
+                self._id_counters[table] = max(
+                    (item.get('id', 0) for item in self.snapshot().iter_table(table)), default=0)
+            self._id_counters[table] += 1
+            return self._id_counters[table]
+    
+    def _forget_missing(self, key: str):
+        with self._missing_lock:
+            self._missing_usernames.pop(key, None)
+    
+    def delete_user_data(self, user_id: int):
+        """Remove saldos, transações, metas, eventos, alertas e arquivos arquivados do usuário"""
+        with self.write() as tx:
+            for table in ('balances', 'transactions', 'goals', 'integrity', HASHES_TABLE):
+                tx.drop_user_rows(table, user_id)
+            self.events.drop_user(user_id)
+            self.alerts.drop_user(user_id)
+            self.archive.drop_user(user_id)
+
+def iter_history(db: Database, table: str, user_id: int, start: Optional[str] = None,
+                 end: Optional[str] = None, after: Optional[Sequence] = None,
+                 newest_first: bool = False) -> Iterator[Dict]:
+    """Registros do usuário em ordem de (data, id), sob demanda
+    
+    Os dados ativos são recortados por busca binária no índice ordenado da
+    partição; meses arquivados só são lidos quando a iteração chega neles.
+    `after` é o cursor (data, id) do último registro da página anterior.
+    """
+    keys, rows = db.snapshot().sorted_index(table, user_id)
+    lo = bisect_left(keys, (start,)) if start else 0
+    hi = bisect_right(keys, (end, math.inf)) if end else len(keys)
+    if after is not None:
+        after = (after[0], after[1])
+        if newest_first:
+            hi = min(hi, bisect_left(keys, after))
+        else:
+            lo = max(lo, bisect_right(keys, after))
+    positions = range(hi - 1, lo - 1, -1) if newest_first else range(lo, hi)
+    hot = (rows[i] for i in positions)
+    if not db.archive.has_archive(user_id):
+        return hot
+    
+    first = month_of(start) if start else None
+    last = month_of(end) if end else None
+    if after is not None:
+        if newest_first:
+            last = min(last, month_of(after[0])) if last else month_of(after[0])
+        else:
+            first = max(first, month_of(after[0])) if first else month_of(after[0])
+    
+    def archived():
+        months = db.archive.archived_months(user_id)
+        for month in (reversed(months) if newest_first else months):
+            if (first and month < first) or (last and month > last):
+                continue
+            segment = [row for row in db.archive.read_segment(user_id, month)[table]
+                       if (not start or row['date'] >= start) and (not end or row['date'] <= end)]
+            if after is not None:
+                segment = [row for row in segment
+                           if (row_key(row) < after if newest_first else row_key(row) > after)]
+            yield from sorted(segment, key=row_key, reverse=newest_first)
+    
+    return heapq.merge(hot, archived(), key=row_key, reverse=newest_first)
 
 class User:
     def __init__(self, db: Database):
         self.db = db
     
-    def create_user(self, username: str, password: str) -> bool:
+    def create_user(self, username: str, password: str, email: Optional[str] = None) -> bool:
         """Cria um novo usuário"""
-        # Verifica se usuário já existe
-        if self.get_user_by_username(username):
-            return False
-        
-        user = {
-            'id': self.db._get_next_id('users'),
-            'username': username,
-            'password': password,  # Em produção, usar hash
-            'created_at': datetime.now().isoformat()
-        }
+        username = (username or '').strip()
+        key = normalize_username(username)
+        with self.db.write() as tx:
+            # Unicidade sem diferenciar maiúsculas/minúsculas
+            if not key or key in tx.users_by_name():
+                return False
+            
+            user = {
+                'id': self.db._get_next_id('users'),
+                'username': username,
+                'password': password,  # Em produção, usar hash
+                'created_at': datetime.now().isoformat()
+            }
+            if email:
+                user['email'] = email
+            tx.insert_user(user)
         
-        self.db.data['users'].append(user)
-        self.db._save_data()
+        self.db._forget_missing(key)
         return True
     
     def get_user_by_username(self, username: str) -> Optional[Dict]:
-        """Busca usuário por nome"""
-        for user in self.db.data['users']:
-            if user['username'] == username:
-                return user
-        return None
+        """Busca usuário por nome (sem diferenciar maiúsculas/minúsculas)"""
+        key = normalize_username(username)
+        missing = self.db._missing_usernames
+        with self.db._missing_lock:
+            if key in missing:
+                missing.move_to_end(key)
+                metrics.inc('cache_requests_total', cache='missing_usernames', result='hit')
+                return None
+        
+        user = self.db.users_by_name().get(key)
+        if user is None:
+            metrics.inc('cache_requests_total', cache='missing_usernames', result='miss')
+            with self.db._missing_lock:
+                missing[key] = None
+                if len(missing) > MISSING_USERNAME_CACHE_SIZE:
+                    missing.popitem(last=False)
+        return user
+    
+    def get_user_by_id(self, user_id: int) -> Optional[Dict]:
+        """Busca usuário por id"""
+        return self.db.users_by_id().get(user_id)
+    
+    def update_password(self, user_id: int, password: str) -> bool:
+        """Substitui o hash de senha do usuário"""
+        with self.db.write() as tx:
+            user = tx.users_by_id().get(user_id)
+            if not user:
+                return False
+            tx.update_user(user, password=password, updated_at=datetime.now().isoformat())
+        return True
     
     def validate_user(self, username: str, password: str) -> Optional[Dict]:
         """Valida credenciais do usuário"""
@@ -80,82 +392,142 @@ class Balance:
     
     def add_balance(self, user_id: int, date_str: str, amount: float, 
                    deposits: float = 0, withdrawals: float = 0) -> bool:
-        """Adiciona ou atualiza saldo diário"""
+        """Adiciona ou atualiza saldo diário (saldo informado manualmente)"""
         try:
-            # Verifica se já existe saldo para esta data
-            existing = self.get_balance_by_date(user_id, date_str)
-            
-            if existing:
-                # Atualiza saldo existente
-                existing['amount'] = float(amount)
-                existing['deposits'] = float(deposits)
-                existing['withdrawals'] = float(withdrawals)
-                existing['updated_at'] = datetime.now().isoformat()
-            else:
-                # Cria novo saldo
-                balance = {
-                    'id': self.db._get_next_id('balances'),
-                    'user_id': user_id,
-                    'date': date_str,
-                    'amount': float(amount),
-                    'deposits': float(deposits),
-                    'withdrawals': float(withdrawals),
-                    'created_at': datetime.now().isoformat(),
-                    'updated_at': datetime.now().isoformat()
-                }
-                self.db.data['balances'].append(balance)
-            
-            self.db._save_data()
+            data = {
+                'date': date_str,
+                'amount': round_money(amount),
+                'deposits': round_money(deposits),
+                'withdrawals': round_money(withdrawals)
+            }
+            with self.db.write():
+                # O registro do dia é reescrito pela projeção do evento
+                existing = self.get_balance_by_date(user_id, date_str)
+                self.db.events.record(user_id, 'balance_set', data, before=existing)
             return True
         except (ValueError, TypeError):
             return False
     
     def get_balance_by_date(self, user_id: int, date_str: str) -> Optional[Dict]:
         """Busca saldo por data"""
-        for balance in self.db.data['balances']:
-            if balance['user_id'] == user_id and balance['date'] == date_str:
+        # Meses arquivados são lidos no próprio segmento, sem restaurar
+        if self.db.archive.is_archived(user_id, date_str):
+            return next((b for b in self.db.archive.read_segment(user_id, month_of(date_str))['balances']
+                         if b['date'] == date_str), None)
+        
+        for balance in self.db.snapshot().rows('balances', user_id):
+            if balance['date'] == date_str:
                 return balance
         return None
     
+    def get_balance_by_id(self, balance_id: int, user_id: int) -> Optional[Dict]:
+        """Busca um saldo do usuário pelo id (inclusive em meses arquivados)"""
+        for balance in self.db.snapshot().rows('balances', user_id):
+            if balance['id'] == balance_id:
+                return balance
+        return next((b for b in self.db.archive.iter_rows('balances', user_id)
+                     if b['id'] == balance_id), None)
+    
+    def has_balance_on(self, user_id: int, date_str: str) -> bool:
+        """Existe saldo na data? Sem restaurar meses arquivados"""
+        if date_str in self.db.snapshot().date_set('balances', user_id):
+            return True
+        if not self.db.archive.is_archived(user_id, date_str):
+            return False
+        mask = self.db.archive.balance_days(user_id).get(month_of(date_str), 0)
+        return bool(mask >> (int(date_str[8:10]) - 1) & 1)
+    
+    def occupied_days(self, user_id: int) -> Dict[str, int]:
+        """Dias com saldo de cada mês (YYYY-MM -> máscara de bits, bit 0 = dia 1)"""
+        masks = dict(self.db.archive.balance_days(user_id)) if self.db.archive.has_archive(user_id) else {}
+        hot = self.db.snapshot().partition_index('day_masks', 'balances', user_id,
+                                                 lambda rows: day_masks(b['date'] for b in rows))
+        for month, mask in hot.items():
+            masks[month] = masks.get(month, 0) | mask
+        return masks
+    
     def get_balances_by_user(self, user_id: int) -> List[Dict]:
         """Busca todos os saldos de um usuário"""
-        balances = [b for b in self.db.data['balances'] if b['user_id'] == user_id]
-        return sorted(balances, key=lambda x: x['date'])
+        return list(iter_history(self.db, 'balances', user_id))
+    
+    def get_balances_in_range(self, user_id: int, start: Optional[str] = None,
+                              end: Optional[str] = None) -> List[Dict]:
+        """Saldos entre start e end (inclusive), em ordem de data"""
+        return list(iter_history(self.db, 'balances', user_id, start, end))
+    
+    def get_balances_page(self, user_id: int, after: Optional[Sequence] = None,
+                          limit: int = DEFAULT_PAGE_SIZE, newest_first: bool = False,
+                          start: Optional[str] = None, end: Optional[str] = None) -> List[Dict]:
+        """Página de saldos a partir do cursor (data, id) do último registro visto"""
+        return list(islice(iter_history(self.db, 'balances', user_id, start, end,
+                                        after, newest_first), limit))
+    
+    def get_last_balances(self, user_id: int, count: int) -> List[Dict]:
+        """Últimos `count` saldos, em ordem de data"""
+        return self.get_balances_page(user_id, limit=count, newest_first=True)[::-1]
     
     def delete_balance(self, balance_id: int, user_id: int) -> bool:
         """Remove um saldo"""
-        for i, balance in enumerate(self.db.data['balances']):
-            if balance['id'] == balance_id and balance['user_id'] == user_id:
-                del self.db.data['balances'][i]
-                self.db._save_data()
-                return True
+        with self.db.write() as tx:
+            for balance in tx.rows('balances', user_id):
+                if balance['id'] == balance_id:
+                    # Sem transações no dia o registro some; com transações
+                    # o saldo volta a ser calculado por elas
+                    self.db.events.record(user_id, 'balance_deleted', before=balance)
+                    return True
+            if self.db.archive.restore_row('balances', user_id, balance_id):
+                return self.delete_balance(balance_id, user_id)
         return False
     
     def sync_balance_from_transactions(self, user_id: int, date_str: str):
         """Sincroniza saldo baseado nas transações do dia"""
-        transactions = Transaction(self.db).get_transactions_by_date(user_id, date_str)
-        
-        total_deposits = sum(t['amount'] for t in transactions if t['type'] == 'deposit')
-        total_withdrawals = sum(t['amount'] for t in transactions if t['type'] == 'withdrawal')
-        
-        # Busca saldo anterior para calcular novo saldo
-        previous_balance = self.get_previous_balance(user_id, date_str)
-        base_amount = previous_balance['amount'] if previous_balance else 0
-        
-        new_amount = base_amount + total_deposits - total_withdrawals
+        self.db.events.project(user_id, date_str)
+    
+    def bulk_upsert(self, user_id: int, items: List[Dict]) -> int:
+        """Adiciona ou atualiza vários saldos diários de uma vez"""
+        if not items:
+            return 0
+        with self.db.write() as tx:
+            self.db.archive.restore_dates(user_id, [item['date'] for item in items])
+            by_date = {b['date']: b for b in tx.rows('balances', user_id)}
+            
+            # Um evento por item; a projeção é refeita uma única vez no final
+            for item in items:
+                self.db.events.record(user_id, 'balance_set', {
+                    'date': item['date'],
+                    'amount': round_money(item['amount']),
+                    'deposits': round_money(item.get('deposits', 0)),
+                    'withdrawals': round_money(item.get('withdrawals', 0))
+                }, before=by_date.get(item['date']), project=False)
+            dates = [item['date'] for item in items]
+            self.db.events.project(user_id, min(dates), until=max(dates))
+        return len(items)
+    
+    def recalculate_balances(self, user_id: int, dates) -> int:
+        """Recalcula os saldos de várias datas em uma única passagem
         
-        self.add_balance(user_id, date_str, new_amount, total_deposits, total_withdrawals)
+        Reescreve a projeção a partir da menor data, parando quando os
+        registros seguintes já estiverem corretos.
+        """
+        targets = set(dates)
+        if not targets:
+            return 0
+        self.db.events.project(user_id, min(targets), until=max(targets))
+        return len(targets)
     
     def get_previous_balance(self, user_id: int, date_str: str) -> Optional[Dict]:
         """Busca o saldo do dia anterior"""
-        balances = self.get_balances_by_user(user_id)
-        previous = None
+        # Busca binária no índice ordenado por (data, id) da partição
+        keys, rows = self.db.snapshot().sorted_index('balances', user_id)
+        position = bisect_left(keys, (date_str,))
+        previous = rows[position - 1] if position else None
         
-        for balance in balances:
-            if balance['date'] < date_str:
-                previous = balance
-            else:
-                break
+        # Meses arquivados são consultados pelos rollups, lendo no máximo um segmento
+        if self.db.archive.has_archive(user_id):
+            archived = self.db.archive.previous_balance(
+                user_id, date_str, after=previous['date'] if previous else None)
+            if archived:
+                return archived
         
         return previous
 
@@ -167,116 +539,223 @@ class Transaction:
                        amount: float, description: str = '') -> bool:
         """Adiciona uma nova transação"""
         try:
-            transaction = {
-                'id': self.db._get_next_id('transactions'),
-                'user_id': user_id,
-                'date': date_str,
-                'type': type_,  # 'deposit' ou 'withdrawal'
-                'amount': float(amount),
-                'description': description,
-                'created_at': datetime.now().isoformat()
-            }
-            
-            self.db.data['transactions'].append(transaction)
-            self.db._save_data()
-            
-            # Atualiza saldo automaticamente
-            Balance(self.db).sync_balance_from_transactions(user_id, date_str)
+            with self.db.write() as tx:
+                self.db.archive.restore_dates(user_id, [date_str])
+                transaction = {
+                    'id': self.db._get_next_id('transactions'),
+                    'user_id': user_id,
+                    'date': date_str,
+                    'day': day_ordinal(date_str),
+                    'type': type_,  # 'deposit' ou 'withdrawal'
+                    'amount': round_money(amount),
+                    'description': description,
+                    'created_at': datetime.now().isoformat()
+                }
+                
+                # O evento atualiza o saldo automaticamente (na mesma versão)
+                self.db.events.record(user_id, 'transaction_added', transaction_payload(transaction))
+                tx.insert('transactions', transaction)
             
             return True
         except (ValueError, TypeError):
             return False
     
+    def bulk_add(self, user_id: int, items: List[Dict]) -> List[str]:
+        """Adiciona várias transações sem sincronizar saldos
+        
+        Retorna as datas afetadas para que o chamador recalcule os saldos
+        uma única vez com Balance.recalculate_balances.
+        """
+        affected = set()
+        with self.db.write() as tx:
+            self.db.archive.restore_dates(user_id, [item['date'] for item in items])
+            now = datetime.now().isoformat()
+            
+            for item in items:
+                transaction = {
+                    'id': self.db._get_next_id('transactions'),
+                    'user_id': user_id,
+                    'date': item['date'],
+                    'day': day_ordinal(item['date']),
+                    'type': item['type'],
+                    'amount': round_money(item['amount']),
+                    'description': item.get('description', ''),
+                    'created_at': now
+                }
+                self.db.events.record(user_id, 'transaction_added', transaction_payload(transaction),
+                                      project=False)
+                tx.insert('transactions', transaction)
+                affected.add(item['date'])
+        return sorted(affected)
+    
     def get_transactions_by_user(self, user_id: int) -> List[Dict]:
         """Busca todas as transações de um usuário"""
-        transactions = [t for t in self.db.data['transactions'] if t['user_id'] == user_id]
+        transactions = list(self.db.snapshot().rows('transactions', user_id))
+        transactions.extend(self.db.archive.iter_rows('transactions', user_id))
         return sorted(transactions, key=lambda x: (x['date'], x['created_at']), reverse=True)
     
+    def get_transaction_by_id(self, transaction_id: int, user_id: int) -> Optional[Dict]:
+        """Busca uma transação do usuário pelo id (inclusive em meses arquivados)"""
+        for transaction in self.db.snapshot().rows('transactions', user_id):
+            if transaction['id'] == transaction_id:
+                return transaction
+        return next((t for t in self.db.archive.iter_rows('transactions', user_id)
+                     if t['id'] == transaction_id), None)
+    
+    def get_transactions_in_range(self, user_id: int, start: Optional[str] = None,
+                                  end: Optional[str] = None) -> List[Dict]:
+        """Transações entre start e end (inclusive), em ordem de (data, id)"""
+        return list(iter_history(self.db, 'transactions', user_id, start, end))
+    
+    def get_transactions_page(self, user_id: int, after: Optional[Sequence] = None,
+                              limit: int = DEFAULT_PAGE_SIZE, newest_first: bool = False,
+                              start: Optional[str] = None, end: Optional[str] = None) -> List[Dict]:
+        """Página de transações a partir do cursor (data, id) do último registro visto"""
+        return list(islice(iter_history(self.db, 'transactions', user_id, start, end,
+                                        after, newest_first), limit))
+    
+    def get_last_transactions(self, user_id: int, count: int) -> List[Dict]:
+        """Últimas `count` transações, da mais recente para a mais antiga"""
+        return self.get_transactions_page(user_id, limit=count, newest_first=True)
+    
     def get_transactions_by_date(self, user_id: int, date_str: str) -> List[Dict]:
         """Busca transações por data"""
-        return [t for t in self.db.data['transactions'] 
-                if t['user_id'] == user_id and t['date'] == date_str]
+        if self.db.archive.is_archived(user_id, date_str):
+            rows = self.db.archive.read_segment(user_id, month_of(date_str))['transactions']
+        else:
+            rows = self.db.snapshot().rows('transactions', user_id)
+        return [t for t in rows if t['date'] == date_str]
     
     def update_transaction(self, transaction_id: int, user_id: int, 
                           date_str: str, type_: str, amount: float, 
                           description: str = '') -> bool:
         """Atualiza uma transação"""
         try:
-            for transaction in self.db.data['transactions']:
-                if transaction['id'] == transaction_id and transaction['user_id'] == user_id:
-                    old_date = transaction['date']
-                    
-                    transaction['date'] = date_str
-                    transaction['type'] = type_
-                    transaction['amount'] = float(amount)
-                    transaction['description'] = description
-                    transaction['updated_at'] = datetime.now().isoformat()
-                    
-                    self.db._save_data()
-                    
-                    # Recalcula saldos das datas afetadas
-                    Balance(self.db).sync_balance_from_transactions(user_id, old_date)
-                    if old_date != date_str:
-                        Balance(self.db).sync_balance_from_transactions(user_id, date_str)
-                    
-                    return True
+            with self.db.write() as tx:
+                for transaction in tx.rows('transactions', user_id):
+                    if transaction['id'] == transaction_id:
+                        self.db.archive.restore_dates(user_id, [date_str])
+                        updated = {**transaction, 'date': date_str, 'day': day_ordinal(date_str),
+                                   'type': type_, 'amount': round_money(amount), 'description': description}
+                        
+                        # O evento recalcula os saldos das datas afetadas
+                        self.db.events.record(user_id, 'transaction_updated',
+                                              transaction_payload(updated),
+                                              before=transaction_payload(transaction))
+                        tx.update('transactions', transaction,
+                                  date=date_str,
+                                  day=updated['day'],
+                                  type=type_,
+                                  amount=round_money(amount),
+                                  description=description,
+                                  updated_at=datetime.now().isoformat())
+                        
+                        return True
+                if self.db.archive.restore_row('transactions', user_id, transaction_id):
+                    return self.update_transaction(transaction_id, user_id, date_str,
+                                                   type_, amount, description)
             return False
         except (ValueError, TypeError):
             return False
     
     def delete_transaction(self, transaction_id: int, user_id: int) -> bool:
         """Remove uma transação"""
-        for i, transaction in enumerate(self.db.data['transactions']):
-            if transaction['id'] == transaction_id and transaction['user_id'] == user_id:
-                date_str = transaction['date']
-                del self.db.data['transactions'][i]
-                self.db._save_data()
-                
-                # Recalcula saldo da data afetada
-                Balance(self.db).sync_balance_from_transactions(user_id, date_str)
-                
-                return True
+        with self.db.write() as tx:
+            for transaction in tx.rows('transactions', user_id):
+                if transaction['id'] == transaction_id:
+                    # O evento recalcula o saldo da data afetada
+                    self.db.events.record(user_id, 'transaction_deleted',
+                                          before=transaction_payload(transaction))
+                    tx.delete('transactions', transaction)
+                    
+                    return True
+            if self.db.archive.restore_row('transactions', user_id, transaction_id):
+                return self.delete_transaction(transaction_id, user_id)
         return False
 
 class Goal:
+    """Metas do usuário (várias por usuário, com descrição e data alvo opcionais)
+    
+    A primeira meta cadastrada é a principal: é ela que set_goal atualiza e
+    get_goal retorna.
+    """
     def __init__(self, db: Database):
         self.db = db
     
+    def add_goal(self, user_id: int, target_amount: float, description: str = '',
+                 target_date: Optional[str] = None) -> Optional[Dict]:
+        """Cadastra uma nova meta e a retorna"""
+        try:
+            if target_date:
+                day_ordinal(target_date)
+            now = datetime.now().isoformat()
+            with self.db.write() as tx:
+                return tx.insert('goals', {
+                    'id': self.db._get_next_id('goals'),
+                    'user_id': user_id,
+                    'description': description or '',
+                    'target_amount': round_money(target_amount),
+                    'target_date': target_date or None,
+                    'created_at': now,
+                    'updated_at': now
+                })
+        except (ValueError, TypeError):
+            return None
+    
     def set_goal(self, user_id: int, target_amount: float) -> bool:
-        """Define ou atualiza meta do usuário"""
+        """Define ou atualiza a meta principal do usuário"""
         try:
-            # Remove meta anterior se existir
-            self.db.data['goals'] = [g for g in self.db.data['goals'] if g['user_id'] != user_id]
-            
-            goal = {
-                'id': self.db._get_next_id('goals'),
-                'user_id': user_id,
-                'target_amount': float(target_amount),
-                'created_at': datetime.now().isoformat(),
-                'updated_at': datetime.now().isoformat()
-            }
-            
-            self.db.data['goals'].append(goal)
-            self.db._save_data()
+            with self.db.write() as tx:
+                goal = self.get_goal(user_id)
+                if goal:
+                    tx.update('goals', goal,
+                              target_amount=round_money(target_amount),
+                              updated_at=datetime.now().isoformat())
+                elif not self.add_goal(user_id, target_amount):
+                    return False
             return True
         except (ValueError, TypeError):
             return False
     
+    def update_goal(self, goal_id: int, user_id: int, **changes) -> bool:
+        """Altera valor, descrição ou data alvo de uma meta"""
+        allowed = {k: v for k, v in changes.items()
+                   if k in ('target_amount', 'description', 'target_date')}
+        try:
+            if 'target_amount' in allowed:
+                allowed['target_amount'] = round_money(allowed['target_amount'])
+            if allowed.get('target_date'):
+                day_ordinal(allowed['target_date'])
+            with self.db.write() as tx:
+                for goal in tx.rows('goals', user_id):
+                    if goal['id'] == goal_id:
+                        tx.update('goals', goal, **allowed, updated_at=datetime.now().isoformat())
+                        return True
+            return False
+        except (ValueError, TypeError):
+            return False
+    
     def get_goal(self, user_id: int) -> Optional[Dict]:
-        """Busca meta do usuário"""
-        for goal in self.db.data['goals']:
-            if goal['user_id'] == user_id:
-                return goal
-        return None
+        """Busca a meta principal do usuário"""
+        goals = self.db.snapshot().rows('goals', user_id)
+        return goals[0] if goals else None
     
-    def delete_goal(self, user_id: int) -> bool:
-        """Remove meta do usuário"""
-        initial_count = len(self.db.data['goals'])
-        self.db.data['goals'] = [g for g in self.db.data['goals'] if g['user_id'] != user_id]
-        
-        if len(self.db.data['goals']) < initial_count:
-            self.db._save_data()
-            return True
+    def get_goals_by_user(self, user_id: int) -> List[Dict]:
+        """Todas as metas do usuário, na ordem de cadastro"""
+        return list(self.db.snapshot().rows('goals', user_id))
+    
+    def delete_goal(self, user_id: int, goal_id: Optional[int] = None) -> bool:
+        """Remove uma meta (ou todas as metas do usuário, sem goal_id)"""
+        with self.db.write() as tx:
+            goals = tx.rows('goals', user_id)
+            if goal_id is None:
+                if not goals:
+                    return False
+                tx.drop_user_rows('goals', user_id)
+                return True
+            for goal in goals:
+                if goal['id'] == goal_id:
+                    return tx.delete('goals', goal)
         return False
 
 def init_db():
@@ -0,0 +1,61 @@
+"""
+Valores monetários em centavos inteiros
+Internamente os valores (saldo, depósitos, saques, transações, metas) são
+guardados como centavos inteiros: somas e a propagação dos saldos diários
+são exatas, sem resíduos de ponto flutuante. Na fronteira (registros lidos
+como mapping, arquivo de dados, JSON, templates) os valores continuam em
+reais, como float com no máximo duas casas: os modelos (db/models.py)
+passam todo valor recebido por to_cents (round_money), que também recusa
+textos inválidos e valores não finitos.
+"""
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+from typing import Mapping, Optional
+
+CENTS = 100
+# Abaixo disso o float multiplicado por 100 fica a bem menos de 0,01 do
+# valor decimal exato
+FAST_PATH_LIMIT = 1e12
+
+
+def to_cents(value) -> int:
+    """Centavos de um valor em reais (float, int ou texto numérico)
+
+    Arredonda meio centavo para cima a partir da representação decimal do
+    valor (0.125 -> 13, 1.005 -> 101), sem herdar o erro do float nem o
+    arredondamento para o par do round(). Valores inválidos ou não finitos
+    (inf, nan) levantam ValueError.
+    """
+    if isinstance(value, int):
+        return value * CENTS
+    if value.__class__ is float and -FAST_PATH_LIMIT < value < FAST_PATH_LIMIT:
+        # Caso comum (até duas casas): o produto já está colado a um inteiro
+        scaled = value * CENTS
+        cents = round(scaled)
+        if abs(scaled - cents) < 0.001:
+            return cents
+    try:
+        return int((Decimal(str(value).strip()) * CENTS).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+    except (InvalidOperation, ValueError, OverflowError):
+        raise ValueError(f"Valor monetário inválido: {value!r}")
+
+
+def from_cents(cents: Optional[int]) -> Optional[float]:
+    return cents / CENTS if cents is not None else None
+
+
+def cents_of(row: Mapping, field: str = 'amount') -> int:
+    """Centavos de um campo do registro (0 se ausente)
+
+    Registros compactos já guardam os centavos; dicts (ex.: linhas
+    arquivadas) são convertidos.
+    """
+    cents = getattr(row, f"{field}_cents", None)
+    if cents is not None:
+        return cents
+    value = row.get(field)
+    return to_cents(value) if value is not None else 0
+
+
+def round_money(value: float) -> float:
+    """Arredonda um valor em reais para centavos"""
+    return from_cents(to_cents(value))
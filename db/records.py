@@ -0,0 +1,242 @@
+"""
+Registros compactos das tabelas principais
+Usuários, saldos, transações e metas ficam em memória como objetos com
+__slots__ em vez de dicts: cada registro ocupa uma fração da memória de um
+dict com as mesmas chaves. Datas e tipos repetidos são internados, então
+os registros do mesmo dia compartilham a mesma string.
+
+Cada classe declara os campos em __slots__ e um __init__ com um parâmetro
+por campo, de modo que a construção a partir de um dict é um único
+cls(**row).
+
+Valores monetários ficam em centavos inteiros (atributo `<campo>_cents`,
+ver db/money.py); o campo em reais (row['amount'], row.amount) é derivado
+deles, então somas sobre os centavos são exatas.
+
+Os registros se comportam como mappings somente leitura (row['date'],
+row.get('manual'), {**row}, 'email' in row, row.date nos templates).
+Campos ausentes continuam ausentes, como em um dict, e chaves fora dos
+campos conhecidos ficam em um dict à parte. Registros publicados nunca são
+alterados: alterações criam um novo registro (WriteTransaction.update).
+"""
+from collections.abc import Mapping
+from sys import intern
+from typing import Any, Dict, Iterator, List
+
+from .money import CENTS, to_cents
+
+_MISSING = object()
+
+
+class Record:
+    __slots__ = ('_extra',)
+    _fields: tuple = ()
+    _field_set: frozenset = frozenset()
+
+    @classmethod
+    def from_mapping(cls, values: Mapping) -> 'Record':
+        try:
+            return cls(**values)
+        except TypeError:
+            # Chaves fora dos campos conhecidos (ou não textuais)
+            known = {k: v for k, v in values.items() if k in cls._field_set}
+            record = cls(**known)
+            record._extra = {k: v for k, v in values.items() if k not in cls._field_set}
+            return record
+
+    # ------------------------------------------------------------------
+    # Interface de mapping
+    # ------------------------------------------------------------------
+
+    def __getitem__(self, key: str) -> Any:
+        if key in self._field_set:
+            value = getattr(self, key, _MISSING)
+            if value is not _MISSING:
+                return value
+        elif self._extra is not None and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key in self._field_set:
+            return getattr(self, key, default)
+        return self._extra.get(key, default) if self._extra is not None else default
+
+    def __contains__(self, key) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def keys(self) -> List[str]:
+        keys = [f for f in self._fields if hasattr(self, f)]
+        if self._extra:
+            keys.extend(self._extra)
+        return keys
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.keys())
+
+    def __len__(self) -> int:
+        return len(self.keys())
+
+    def values(self) -> List[Any]:
+        return [self[key] for key in self.keys()]
+
+    def items(self) -> List[tuple]:
+        return [(key, self[key]) for key in self.keys()]
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {}
+        for field in self._fields:
+            value = getattr(self, field, _MISSING)
+            if value is not _MISSING:
+                data[field] = value
+        if self._extra:
+            data.update(self._extra)
+        return data
+
+    def replace(self, **changes) -> 'Record':
+        """Cópia com os campos alterados"""
+        return type(self).from_mapping({**self.to_dict(), **changes})
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (Record, dict)):
+            return self.to_dict() == dict(other.items())
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+    def __reduce__(self):
+        return _rebuild, (type(self), self.to_dict())
+
+
+Mapping.register(Record)
+
+
+def _rebuild(cls, values: Dict) -> Record:
+    return cls.from_mapping(values)
+
+
+def _cents(value):
+    return None if value is None else to_cents(value)
+
+
+def _money_field(field: str) -> property:
+    """Campo em reais derivado do slot em centavos; ausente se o slot estiver vazio"""
+    slot = f"{field}_cents"
+
+    def get(self):
+        value = getattr(self, slot)
+        return None if value is None else value / CENTS
+    return property(get)
+
+
+class UserRecord(Record):
+    __slots__ = ('id', 'username', 'password', 'email', 'created_at', 'updated_at')
+    _fields = __slots__
+    _field_set = frozenset(_fields)
+
+    def __init__(self, id=_MISSING, username=_MISSING, password=_MISSING, email=_MISSING,
+                 created_at=_MISSING, updated_at=_MISSING):
+        self._extra = None
+        if id is not _MISSING: self.id = id
+        if username is not _MISSING: self.username = username
+        if password is not _MISSING: self.password = password
+        if email is not _MISSING: self.email = email
+        if created_at is not _MISSING: self.created_at = created_at
+        if updated_at is not _MISSING: self.updated_at = updated_at
+
+
+class BalanceRecord(Record):
+    __slots__ = ('id', 'user_id', 'date', 'day', 'amount_cents', 'deposits_cents',
+                 'withdrawals_cents', 'manual', 'created_at', 'updated_at')
+    _fields = ('id', 'user_id', 'date', 'day', 'amount', 'deposits', 'withdrawals', 'manual',
+               'created_at', 'updated_at')
+    _field_set = frozenset(_fields)
+    amount = _money_field('amount')
+    deposits = _money_field('deposits')
+    withdrawals = _money_field('withdrawals')
+
+    def __init__(self, id=_MISSING, user_id=_MISSING, date=_MISSING, day=_MISSING,
+                 amount=_MISSING, deposits=_MISSING, withdrawals=_MISSING, manual=_MISSING,
+                 created_at=_MISSING, updated_at=_MISSING):
+        self._extra = None
+        if id is not _MISSING: self.id = id
+        if user_id is not _MISSING: self.user_id = user_id
+        if date is not _MISSING: self.date = intern(date) if date.__class__ is str else date
+        if day is not _MISSING: self.day = day
+        if amount is not _MISSING: self.amount_cents = _cents(amount)
+        if deposits is not _MISSING: self.deposits_cents = _cents(deposits)
+        if withdrawals is not _MISSING: self.withdrawals_cents = _cents(withdrawals)
+        if manual is not _MISSING: self.manual = manual
+        if created_at is not _MISSING: self.created_at = created_at
+        if updated_at is not _MISSING: self.updated_at = updated_at
+
+
+class TransactionRecord(Record):
+    __slots__ = ('id', 'user_id', 'date', 'day', 'type', 'amount_cents', 'description',
+                 'created_at', 'updated_at')
+    _fields = ('id', 'user_id', 'date', 'day', 'type', 'amount', 'description',
+               'created_at', 'updated_at')
+    _field_set = frozenset(_fields)
+    amount = _money_field('amount')
+
+    def __init__(self, id=_MISSING, user_id=_MISSING, date=_MISSING, day=_MISSING,
+                 type=_MISSING, amount=_MISSING, description=_MISSING,
+                 created_at=_MISSING, updated_at=_MISSING):
+        self._extra = None
+        if id is not _MISSING: self.id = id
+        if user_id is not _MISSING: self.user_id = user_id
+        if date is not _MISSING: self.date = intern(date) if date.__class__ is str else date
+        if day is not _MISSING: self.day = day
+        if type is not _MISSING: self.type = intern(type) if type.__class__ is str else type
+        if amount is not _MISSING: self.amount_cents = _cents(amount)
+        if description is not _MISSING: self.description = description
+        if created_at is not _MISSING: self.created_at = created_at
+        if updated_at is not _MISSING: self.updated_at = updated_at
+
+
+class GoalRecord(Record):
+    __slots__ = ('id', 'user_id', 'description', 'target_amount_cents', 'target_date',
+                 'created_at', 'updated_at')
+    _fields = ('id', 'user_id', 'description', 'target_amount', 'target_date',
+               'created_at', 'updated_at')
+    _field_set = frozenset(_fields)
+    target_amount = _money_field('target_amount')
+
+    def __init__(self, id=_MISSING, user_id=_MISSING, description=_MISSING,
+                 target_amount=_MISSING, target_date=_MISSING,
+                 created_at=_MISSING, updated_at=_MISSING):
+        self._extra = None
+        if id is not _MISSING: self.id = id
+        if user_id is not _MISSING: self.user_id = user_id
+        if description is not _MISSING: self.description = description
+        if target_amount is not _MISSING: self.target_amount_cents = _cents(target_amount)
+        if target_date is not _MISSING: self.target_date = target_date
+        if created_at is not _MISSING: self.created_at = created_at
+        if updated_at is not _MISSING: self.updated_at = updated_at
+
+
+RECORD_TYPES = {
+    'users': UserRecord,
+    'balances': BalanceRecord,
+    'transactions': TransactionRecord,
+    'goals': GoalRecord
+}
+
+
+def wrap(table: str, row: Mapping) -> Mapping:
+    """Registro compacto para as tabelas principais; demais ficam como dicts"""
+    cls = RECORD_TYPES.get(table)
+    if cls is None or type(row) is cls:
+        return row
+    return cls.from_mapping(row)
+
+
+def json_default(value: Any) -> Any:
+    """`default` para json.dumps: registros viram dicts, o resto vira texto"""
+    if isinstance(value, Record):
+        return value.to_dict()
+    return str(value)
+
@@ -0,0 +1,434 @@
+"""
+Versões imutáveis dos dados (copy-on-write)
+O Database publica um Snapshot por vez. Leitores usam o snapshot corrente
+sem travas; escritores montam uma WriteTransaction sobre a última versão,
+copiando apenas as partições (tabela, usuário) que alteram, e publicam o
+resultado com uma única atribuição de referência.
+
+As tabelas cujos registros têm 'user_id' ficam particionadas por usuário:
+tabela -> user_id -> tupla de registros. A tabela 'users' é uma tupla.
+Registros publicados nunca são alterados no lugar; alterações criam um
+novo registro. Usuários, saldos, transações e metas usam os registros
+compactos de db/records.py; as demais tabelas guardam dicts.
+
+Ao carregar o arquivo, as partições dessas tabelas guardam os dicts lidos
+e só viram registros compactos no primeiro acesso (LazyPartition): a
+carga não paga a conversão de usuários que não são consultados.
+
+Cada partição pode ter índices (ordenado por (data, id), conjunto de
+datas), calculados sob demanda e reaproveitados pelas versões seguintes
+enquanto a partição não mudar.
+"""
+import threading
+from typing import Any, Callable, Dict, FrozenSet, Iterator, List, Optional, Tuple
+
+from .records import RECORD_TYPES, wrap
+
+USERS = 'users'
+DEFAULT_TABLES = ('users', 'balances', 'transactions', 'goals', 'rollups', 'events', 'checkpoints',
+                  'alert_rules', 'outbox', 'integrity', 'month_hashes')
+
+Partitions = Dict[int, Tuple[Dict, ...]]
+# Índice ordenado de uma partição: (chaves (data, id), registros na mesma ordem)
+SortedIndex = Tuple[List[Tuple[str, int]], List[Dict]]
+
+
+def normalize_username(username: str) -> str:
+    """Forma canônica do nome de usuário para busca e unicidade"""
+    return (username or '').strip().casefold()
+
+
+def _is_table(value: Any) -> bool:
+    return isinstance(value, (list, tuple)) and all(isinstance(row, dict) for row in value)
+
+
+class LazyPartition:
+    """Registros de uma partição como lidos do arquivo, convertidos no primeiro acesso
+
+    O objeto passa de uma versão para a seguinte enquanto a partição não
+    muda, então a conversão acontece uma única vez e os registros mantêm a
+    identidade entre versões.
+    """
+    __slots__ = ('table', '_raw', '_rows')
+    _lock = threading.Lock()
+
+    def __init__(self, table: str, raw: List[Dict]):
+        self.table = table
+        self._raw = raw
+        self._rows: Optional[Tuple[Dict, ...]] = None
+
+    def rows(self) -> Tuple[Dict, ...]:
+        rows = self._rows
+        if rows is None:
+            with self._lock:
+                if self._rows is None:
+                    self._rows = tuple(wrap(self.table, row) for row in self._raw)
+                    self._raw = None
+                rows = self._rows
+        return rows
+
+
+def _materialize(partition) -> Tuple[Dict, ...]:
+    return partition.rows() if partition.__class__ is LazyPartition else partition
+
+
+def row_key(row: Dict) -> Tuple[str, int]:
+    """Chave de ordenação dos registros com data: (data, id)"""
+    return row['date'], row.get('id', 0)
+
+
+def build_sorted_index(rows) -> SortedIndex:
+    ordered = sorted(rows, key=row_key)
+    return [row_key(row) for row in ordered], ordered
+
+
+def build_date_set(rows) -> FrozenSet[str]:
+    return frozenset(row['date'] for row in rows)
+
+
+class Snapshot:
+    """Versão publicada e imutável dos dados"""
+
+    def __init__(self, version: int, users: Tuple[Dict, ...], tables: Dict[str, Partitions],
+                 extra: Dict[str, Any], order: Tuple[str, ...]):
+        self.version = version
+        self.users = users
+        self.tables = tables
+        self.extra = extra
+        self.order = order
+        self._derived: Dict[str, Any] = {}
+        self._indexes: Dict[Tuple[str, str, int], Any] = {}
+
+    @classmethod
+    def from_dict(cls, data: Dict, version: int = 0) -> 'Snapshot':
+        """Particiona a estrutura lida do arquivo"""
+        tables: Dict[str, Partitions] = {}
+        extra: Dict[str, Any] = {}
+        for name, value in data.items():
+            if name == USERS:
+                continue
+            if _is_table(value) and all('user_id' in row for row in value):
+                partitions: Dict[int, List[Dict]] = {}
+                for row in value:
+                    partitions.setdefault(row['user_id'], []).append(row)
+                if name in RECORD_TYPES:
+                    tables[name] = {uid: LazyPartition(name, rows) for uid, rows in partitions.items()}
+                else:
+                    tables[name] = {uid: tuple(rows) for uid, rows in partitions.items()}
+            else:
+                extra[name] = value
+        for name in DEFAULT_TABLES:
+            if name != USERS:
+                tables.setdefault(name, {})
+        order = tuple(dict.fromkeys(list(data) + list(DEFAULT_TABLES)))
+        users = tuple(wrap(USERS, user) for user in data.get(USERS, ()))
+        return cls(version, users, tables, extra, order)
+
+    # ------------------------------------------------------------------
+    # Leitura
+    # ------------------------------------------------------------------
+
+    def rows(self, table: str, user_id: int) -> Tuple[Dict, ...]:
+        """Registros de um usuário em uma tabela"""
+        return _materialize(self.tables.get(table, {}).get(user_id, ()))
+
+    def user_ids(self, table: str):
+        return self.tables.get(table, {}).keys()
+
+    def iter_table(self, table: str) -> Iterator[Dict]:
+        if table == USERS:
+            return iter(self.users)
+        return (row for rows in self.tables.get(table, {}).values() for row in _materialize(rows))
+
+    def partition_index(self, kind: str, table: str, user_id: int, builder: Callable) -> Any:
+        """Índice de uma partição, calculado uma vez enquanto ela não mudar"""
+        key = (kind, table, user_id)
+        index = self._indexes.get(key)
+        if index is None:
+            index = self._indexes[key] = builder(self.rows(table, user_id))
+        return index
+
+    def sorted_index(self, table: str, user_id: int) -> SortedIndex:
+        """Registros do usuário ordenados por (data, id), para busca binária"""
+        return self.partition_index('sorted', table, user_id, build_sorted_index)
+
+    def date_set(self, table: str, user_id: int) -> FrozenSet[str]:
+        """Datas dos registros do usuário, para consultas de existência em O(1)"""
+        return self.partition_index('dates', table, user_id, build_date_set)
+
+    def derived(self, key: str, builder: Callable[['Snapshot'], Any]) -> Any:
+        """Estrutura derivada (índice) calculada uma vez por versão"""
+        try:
+            return self._derived[key]
+        except KeyError:
+            value = self._derived[key] = builder(self)
+            return value
+
+    def users_by_name(self) -> Dict[str, Dict]:
+        """Índice nome normalizado -> usuário (o primeiro cadastrado prevalece)"""
+        def build(snapshot):
+            index: Dict[str, Dict] = {}
+            for user in snapshot.users:
+                index.setdefault(normalize_username(user['username']), user)
+            return index
+        return self.derived('users_by_name', build)
+
+    def users_by_id(self) -> Dict[int, Dict]:
+        return self.derived('users_by_id', lambda s: {user['id']: user for user in s.users})
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Estrutura plana (como no arquivo); somente leitura"""
+        def build(snapshot):
+            data: Dict[str, Any] = {}
+            for name in snapshot.order:
+                if name == USERS:
+                    data[name] = list(snapshot.users)
+                elif name in snapshot.tables:
+                    data[name] = list(snapshot.iter_table(name))
+                elif name in snapshot.extra:
+                    data[name] = snapshot.extra[name]
+            for name in snapshot.tables:
+                if name not in data:
+                    data[name] = list(snapshot.iter_table(name))
+            for name, value in snapshot.extra.items():
+                data.setdefault(name, value)
+            return data
+        return self.derived('as_dict', build)
+
+
+class WriteTransaction:
+    """Rascunho de uma nova versão; visível apenas para a thread que escreve"""
+
+    def __init__(self, base: Snapshot):
+        self.base = base
+        self.changed = False
+        self._tables: Dict[str, Dict[int, Any]] = {}
+        self._touched: set = set()
+        self._users: Optional[List[Dict]] = None
+        self._user_overlay: Dict[str, Dict] = {}
+        self._extra: Optional[Dict[str, Any]] = None
+        self._after_commit: List[Callable[[], None]] = []
+        # Dados auxiliares de quem escreve (ex.: estado de eventos em
+        # construção), descartados junto com a transação
+        self.scratch: Dict[str, Any] = {}
+        # Savepoints: partições alteradas depois do último savepoint guardam
+        # aqui o valor anterior (None enquanto não houver savepoint)
+        self._undo: Optional[List[Tuple]] = None
+        self._saved: set = set()
+
+    # ------------------------------------------------------------------
+    # Leitura (mesma interface do Snapshot)
+    # ------------------------------------------------------------------
+
+    @property
+    def version(self) -> int:
+        return self.base.version + 1
+
+    @property
+    def users(self):
+        return self._users if self._users is not None else self.base.users
+
+    @property
+    def extra(self) -> Dict[str, Any]:
+        return self._extra if self._extra is not None else self.base.extra
+
+    def _partitions(self, table: str) -> Dict[int, Any]:
+        partitions = self._tables.get(table)
+        return partitions if partitions is not None else self.base.tables.get(table, {})
+
+    def rows(self, table: str, user_id: int):
+        return _materialize(self._partitions(table).get(user_id, ()))
+
+    def user_ids(self, table: str):
+        return self._partitions(table).keys()
+
+    def iter_table(self, table: str) -> Iterator[Dict]:
+        if table == USERS:
+            return iter(self.users)
+        return (row for rows in self._partitions(table).values() for row in _materialize(rows))
+
+    def partition_index(self, kind: str, table: str, user_id: int, builder: Callable) -> Any:
+        if (table, user_id) in self._touched or user_id not in self._partitions(table):
+            return builder(self.rows(table, user_id))
+        return self.base.partition_index(kind, table, user_id, builder)
+
+    def sorted_index(self, table: str, user_id: int) -> SortedIndex:
+        return self.partition_index('sorted', table, user_id, build_sorted_index)
+
+    def date_set(self, table: str, user_id: int) -> FrozenSet[str]:
+        return self.partition_index('dates', table, user_id, build_date_set)
+
+    def users_by_name(self) -> Dict[str, Dict]:
+        if not self._user_overlay:
+            return self.base.users_by_name()
+        return {**self.base.users_by_name(), **self._user_overlay}
+
+    def users_by_id(self) -> Dict[int, Dict]:
+        if self._users is None:
+            return self.base.users_by_id()
+        return {user['id']: user for user in self._users}
+
+    # ------------------------------------------------------------------
+    # Escrita
+    # ------------------------------------------------------------------
+
+    def savepoint(self) -> Tuple:
+        """Marca o estado atual do rascunho para um rollback posterior"""
+        if self._undo is None:
+            self._undo = []
+        self._saved = set()
+        # scratch volta ao nível de cada entrada (dicts copiados, sem descer)
+        scratch = {k: (dict(v) if isinstance(v, dict) else v) for k, v in self.scratch.items()}
+        return (len(self._undo), self.changed, self._users, dict(self._user_overlay),
+                self._extra, len(self._after_commit), scratch)
+
+    def rollback(self, mark: Tuple) -> None:
+        """Desfaz tudo o que foi alterado desde o savepoint"""
+        size, self.changed, self._users, overlay, self._extra, callbacks, scratch = mark
+        for table, user_id, previous, touched in reversed(self._undo[size:]):
+            partitions = self._tables[table]
+            if previous is None:
+                partitions.pop(user_id, None)
+            else:
+                partitions[user_id] = previous
+            if touched:
+                self._touched.add((table, user_id))
+            else:
+                self._touched.discard((table, user_id))
+        del self._undo[size:]
+        self._user_overlay = overlay
+        del self._after_commit[callbacks:]
+        self.scratch.clear()
+        self.scratch.update(scratch)
+        # Os valores restaurados podem pertencer a savepoints anteriores
+        self._saved = set()
+
+    def _save(self, key) -> bool:
+        """Primeira alteração de `key` desde o último savepoint?"""
+        if self._undo is None or key in self._saved:
+            return False
+        self._saved.add(key)
+        return True
+
+    def _partition(self, table: str, user_id: int) -> List[Dict]:
+        """Partição mutável do usuário (copiada na primeira alteração)"""
+        partitions = self._tables.get(table)
+        if partitions is None:
+            partitions = self._tables[table] = dict(self.base.tables.get(table, {}))
+        key = (table, user_id)
+        if self._save(key):
+            previous = partitions.get(user_id)
+            self._undo.append((table, user_id, previous, key in self._touched))
+            if key in self._touched:
+                # A lista anterior fica com o savepoint; a alteração usa uma cópia
+                partitions[user_id] = list(previous)
+        if key not in self._touched:
+            partitions[user_id] = list(_materialize(partitions.get(user_id, ())))
+            self._touched.add(key)
+        self.changed = True
+        return partitions[user_id]
+
+    def insert(self, table: str, row: Dict) -> Dict:
+        """Acrescenta o registro e retorna a versão guardada"""
+        row = wrap(table, row)
+        self._partition(table, row['user_id']).append(row)
+        return row
+
+    def update(self, table: str, row: Dict, **changes) -> Dict:
+        """Substitui o registro por uma cópia alterada e a retorna"""
+        new_row = wrap(table, {**row, **changes})
+        rows = self._partition(table, row['user_id'])
+        for i, current in enumerate(rows):
+            if current is row:
+                rows[i] = new_row
+                return new_row
+        raise KeyError(f"Registro não encontrado em '{table}'")
+
+    def delete(self, table: str, row: Dict) -> bool:
+        rows = self._partition(table, row['user_id'])
+        for i, current in enumerate(rows):
+            if current is row:
+                del rows[i]
+                return True
+        return False
+
+    def set_rows(self, table: str, user_id: int, rows) -> None:
+        """Substitui todos os registros do usuário na tabela"""
+        partition = self._partition(table, user_id)
+        partition[:] = [wrap(table, row) for row in rows]
+
+    def touched(self) -> List[Tuple[str, int]]:
+        """Partições (tabela, usuário) alteradas nesta transação"""
+        return list(self._touched)
+
+    def drop_user_rows(self, table: str, user_id: int) -> None:
+        if user_id in self._partitions(table):
+            self._partition(table, user_id)
+            del self._tables[table][user_id]
+            self._touched.discard((table, user_id))
+
+    def _mutable_users(self) -> List[Dict]:
+        if self._users is None or self._save(USERS):
+            self._users = list(self.users)
+        return self._users
+
+    def insert_user(self, user: Dict) -> Dict:
+        self._mutable_users()
+        user = wrap(USERS, user)
+        self._users.append(user)
+        self._user_overlay.setdefault(normalize_username(user['username']), user)
+        self.changed = True
+        return user
+
+    def update_user(self, user: Dict, **changes) -> Dict:
+        self._mutable_users()
+        new_user = wrap(USERS, {**user, **changes})
+        for i, current in enumerate(self._users):
+            if current is user:
+                self._users[i] = new_user
+                break
+        else:
+            raise KeyError("Usuário não encontrado")
+        key = normalize_username(user['username'])
+        if self.users_by_name().get(key) is user:
+            self._user_overlay[key] = new_user
+        self.changed = True
+        return new_user
+
+    def set_extra(self, key: str, value: Any) -> None:
+        if self._extra is None or self._save('extra'):
+            self._extra = dict(self.extra)
+        self._extra[key] = value
+        self.changed = True
+
+    def after_commit(self, callback: Callable[[], None]) -> None:
+        """Executa o callback depois que a versão for publicada e gravada
+
+        Se a gravação falhar o callback não roda.
+        """
+        self._after_commit.append(callback)
+
+    def freeze(self) -> Snapshot:
+        """Gera o Snapshot imutável desta transação"""
+        tables = dict(self.base.tables)
+        for table, partitions in self._tables.items():
+            tables[table] = dict(partitions)
+        for table, user_id in self._touched:
+            if user_id in tables[table]:
+                tables[table][user_id] = tuple(tables[table][user_id])
+        users = tuple(self._users) if self._users is not None else self.base.users
+        order = tuple(dict.fromkeys(self.base.order + tuple(tables)))
+        snapshot = Snapshot(self.version, users, tables, self.extra, order)
+
+        # Índices das partições que não mudaram continuam válidos
+        snapshot._indexes.update({key: index for key, index in self.base._indexes.items()
+                                  if key[1:] not in self._touched and key[2] in tables.get(key[1], ())})
+
+        # Reaproveita o índice de nomes já calculado, aplicando as alterações
+        if self._users is None:
+            snapshot._derived.update({k: v for k, v in self.base._derived.items()
+                                      if k in ('users_by_name', 'users_by_id')})
+        elif 'users_by_name' in self.base._derived:
+            snapshot._derived['users_by_name'] = {**self.base._derived['users_by_name'],
+                                                  **self._user_overlay}
+        return snapshot
@@ -0,0 +1,233 @@
+"""
+Arquivos estáticos com nome por conteúdo, pré-compressão e cache longo
+Cada arquivo de static/ (inclusive as bibliotecas em static/vendor/) é
+copiado para static/dist/ com o hash do conteúdo no nome
+(script.3f2a9c1d04be.js), junto com as versões .gz e, com o módulo brotli
+instalado, .br. O manifest.json de static/dist/ liga o nome lógico ao nome
+com hash; os templates usam asset_url('script.js').
+
+A geração roda no deploy, uma vez, e não na subida da aplicação (vários
+workers gerando ao mesmo tempo apagariam os arquivos uns dos outros):
+
+    python app.py assets
+
+A aplicação só lê o manifest. Sem ele, asset_url aponta para /static.
+
+A rota /assets/<arquivo> entrega a variante comprimida aceita pelo
+navegador, com Cache-Control immutable de um ano: o nome muda sempre que o
+conteúdo muda, então o navegador nunca precisa revalidar.
+
+As bibliotecas de terceiros ficam versionadas em static/vendor/: Bootstrap
+5.3.0 (CSS e JS), Popper 2.11.8 e Chart.js 4.4.0 (build UMD). Sem
+manifest elas saem de /static/vendor; só se alguma faltar asset_url usa o
+endereço da CDN, e 'python app.py assets --vendor' baixa de novo as
+ausentes (requer rede).
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import threading
+from typing import Callable, Dict, Optional
+from urllib.request import urlopen
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - depende do ambiente
+    brotli = None
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STATIC_DIR = os.path.join(ROOT_DIR, 'static')
+BUILD_DIRNAME = 'dist'
+MANIFEST_NAME = 'manifest.json'
+HASH_LENGTH = 12
+# Arquivos menores não compensam a compressão
+MIN_COMPRESS_SIZE = 512
+COMPRESSIBLE = ('.js', '.css', '.svg', '.json', '.map', '.txt', '.html')
+CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# Variantes na ordem de preferência: (extensão, Content-Encoding)
+ENCODINGS = (('.br', 'br'), ('.gz', 'gzip'))
+
+VENDOR = {
+    'vendor/chart.js': 'https://cdn.jsdelivr.net/npm/chart.js@4.4.0/dist/chart.umd.js',
+    'vendor/bootstrap.min.css': 'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css',
+    'vendor/popper.min.js': 'https://cdn.jsdelivr.net/npm/@popperjs/core@2.11.8/dist/umd/popper.min.js',
+    'vendor/bootstrap.min.js': 'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.min.js'
+}
+
+
+def fingerprint(name: str, content: bytes) -> str:
+    """script.js -> script.<hash>.js"""
+    digest = hashlib.sha256(content).hexdigest()[:HASH_LENGTH]
+    base, ext = os.path.splitext(name)
+    return f"{base}.{digest}{ext}"
+
+
+def _write(path: str, content: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(content)
+    os.replace(tmp, path)
+
+
+def accepted_encodings(header: str) -> set:
+    """Codificações aceitas no Accept-Encoding; q=0 significa recusada"""
+    accepted = set()
+    for part in header.split(','):
+        name, *params = [p.strip() for p in part.split(';')]
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name and quality > 0:
+            accepted.add(name.lower())
+    return accepted
+
+
+class AssetService:
+    def __init__(self, static_dir: str = STATIC_DIR):
+        self.static_dir = static_dir
+        self.build_dir = os.path.join(static_dir, BUILD_DIRNAME)
+        self._manifest: Optional[Dict[str, str]] = None
+        self._lock = threading.Lock()
+
+    def sources(self) -> Dict[str, str]:
+        """Nome lógico (relativo a static/, com '/') -> caminho de cada arquivo"""
+        found = {}
+        for dirpath, dirnames, filenames in os.walk(self.static_dir):
+            if dirpath == self.static_dir and BUILD_DIRNAME in dirnames:
+                dirnames.remove(BUILD_DIRNAME)
+            for filename in filenames:
+                if filename.startswith('.'):
+                    continue
+                path = os.path.join(dirpath, filename)
+                found[os.path.relpath(path, self.static_dir).replace(os.sep, '/')] = path
+        return found
+
+    def build(self) -> Dict:
+        """Gera os arquivos com hash e suas variantes comprimidas
+
+        Só escreve o que ainda não existe; arquivos de versões anteriores
+        são removidos. Retorna o resumo da geração.
+        """
+        manifest, written = {}, 0
+        for name, path in sorted(self.sources().items()):
+            with open(path, 'rb') as f:
+                content = f.read()
+            hashed = manifest[name] = fingerprint(name, content)
+            target = os.path.join(self.build_dir, hashed)
+            if not os.path.exists(target):
+                _write(target, content)
+                written += 1
+            if len(content) < MIN_COMPRESS_SIZE or not name.endswith(COMPRESSIBLE):
+                continue
+            variants = {'.gz': lambda data: gzip.compress(data, compresslevel=9, mtime=0)}
+            if brotli is not None:
+                variants['.br'] = lambda data: brotli.compress(data, quality=11)
+            for ext, compress in variants.items():
+                if os.path.exists(target + ext):
+                    continue
+                compressed = compress(content)
+                # Variante maior que o original não é gravada (nem servida)
+                if len(compressed) < len(content):
+                    _write(target + ext, compressed)
+                    written += 1
+
+        _write(os.path.join(self.build_dir, MANIFEST_NAME),
+               json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'))
+        removed = self._remove_stale(set(manifest.values()))
+        with self._lock:
+            self._manifest = manifest
+        return {'assets': len(manifest), 'written': written, 'removed': removed,
+                'brotli': brotli is not None,
+                'missing_vendor': sorted(n for n in VENDOR if n not in manifest)}
+
+    def _remove_stale(self, current: set) -> int:
+        keep = {MANIFEST_NAME} | current | {f"{n}{ext}" for n in current for ext, _ in ENCODINGS}
+        removed = 0
+        for dirpath, _, filenames in os.walk(self.build_dir):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                if filename.endswith('.tmp'):
+                    continue
+                if os.path.relpath(path, self.build_dir).replace(os.sep, '/') not in keep:
+                    os.remove(path)
+                    removed += 1
+        return removed
+
+    def vendor(self, fetch: Optional[Callable[[str], bytes]] = None) -> Dict:
+        """Baixa as bibliotecas de terceiros que ainda não estão em static/vendor/"""
+        def download(url: str) -> bytes:
+            with urlopen(url, timeout=30) as response:
+                return response.read()
+
+        fetch = fetch or download
+        fetched = []
+        for name, url in VENDOR.items():
+            path = os.path.join(self.static_dir, *name.split('/'))
+            if not os.path.exists(path):
+                _write(path, fetch(url))
+                fetched.append(name)
+        return {'fetched': fetched}
+
+    @property
+    def manifest(self) -> Dict[str, str]:
+        with self._lock:
+            if self._manifest is None:
+                try:
+                    with open(os.path.join(self.build_dir, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+                        self._manifest = json.load(f)
+                except (OSError, ValueError):
+                    self._manifest = {}
+            return self._manifest
+
+    def url(self, name: str) -> str:
+        """Endereço de um arquivo estático (usado nos templates como asset_url)"""
+        from flask import url_for
+        hashed = self.manifest.get(name)
+        if hashed:
+            return url_for('assets', filename=hashed)
+        # Sem manifest (desenvolvimento, antes do build do deploy) a cópia
+        # versionada em static/vendor/ vale mais que a CDN
+        if name in VENDOR and not os.path.exists(os.path.join(self.static_dir, *name.split('/'))):
+            return VENDOR[name]
+        return url_for('static', filename=name)
+
+    def response(self, filename: str, accept_encoding: str):
+        """Resposta da rota /assets, com a variante comprimida aceita"""
+        from flask import abort, send_from_directory
+        if filename not in self.manifest.values():
+            abort(404)
+        accepted = accepted_encodings(accept_encoding)
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        served, encoding = filename, None
+        for ext, name in ENCODINGS:
+            if name in accepted and os.path.exists(os.path.join(self.build_dir, filename + ext)):
+                served, encoding = filename + ext, name
+                break
+        response = send_from_directory(self.build_dir, served, mimetype=mimetype)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.headers['Vary'] = 'Accept-Encoding'
+        response.headers['Cache-Control'] = CACHE_CONTROL
+        return response
+
+
+assets = AssetService()
+
+
+def register_assets(app, service: AssetService = assets):
+    """Registra a rota /assets e asset_url; não gera nada (ver 'assets')"""
+    from flask import request
+
+    def serve_asset(filename):
+        return service.response(filename, request.headers.get('Accept-Encoding', ''))
+
+    app.add_url_rule('/assets/<path:filename>', 'assets', serve_asset)
+    app.jinja_env.globals.update(asset_url=service.url)
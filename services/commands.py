@@ -0,0 +1,416 @@
+"""
+Comandos não interativos da CLI
+Cada comando recebe argumentos simples (dict) e devolve um resultado
+serializável em JSON. O modo em lote executa muitos comandos, lidos de um
+arquivo ou da entrada padrão, em uma única transação do Database: os dados
+são gravados uma única vez no final.
+
+Cada linha do lote é um objeto JSON ou uma linha no formato da CLI:
+
+    {"command": "add-transaction", "user": "ana", "type": "deposit", "amount": 50}
+    add-balance --user ana --date 2024-01-10 --amount 1500
+"""
+import argparse
+import json
+import shlex
+import sys
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from db.alerts import RULE_KINDS
+from db.dates import day_of, to_date
+from db.integrity import IntegrityVerifier
+from db.models import Balance, Database, Goal, Transaction, User
+from services.assets import assets
+from services.forecast_engine import ForecastEngine
+from services.importer import ImportService, TRANSACTION_TYPES
+from services.maintenance import RebuildService
+from services.report import ReportService
+
+MAX_REPORTED_ERRORS = 100
+# Comandos de lote cuja projeção de saldos fica para o fim do lote; antes
+# de qualquer outro comando a projeção pendente é aplicada
+DEFERRED_COMMANDS = ('add-balance', 'add-transaction')
+# Opções globais da CLI, ignoradas nas linhas do lote
+GLOBAL_OPTIONS = ('db', 'socket', 'no_daemon')
+
+
+class CommandError(ValueError):
+    """Comando inválido ou que não pôde ser aplicado"""
+
+
+class _AbortBatch(Exception):
+    """Interrompe um lote atômico (nada é gravado)"""
+
+
+class _Parser(argparse.ArgumentParser):
+    """ArgumentParser que reporta erros com exceção em vez de encerrar o processo"""
+
+    def error(self, message):
+        raise CommandError(message)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Parser dos subcomandos (usado pela CLI e pelas linhas do lote)"""
+    parser = _Parser(prog='app.py', description="Gerenciamento de banca esportiva (modo não interativo)")
+    parser.add_argument('--db', default='data.json', help="arquivo de dados")
+    parser.add_argument('--socket', help="socket do daemon (padrão: <db>.sock ou META_CLI_SOCKET)")
+    parser.add_argument('--no-daemon', action='store_true', help="não usa o daemon, mesmo se estiver rodando")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    def user_args(p):
+        p.add_argument('--user', help="nome do usuário")
+        p.add_argument('--user-id', type=int, help="id do usuário")
+
+    p = sub.add_parser('add-balance', help="adiciona ou atualiza o saldo de um dia")
+    user_args(p)
+    p.add_argument('--date', help="data (YYYY-MM-DD); padrão: hoje")
+    p.add_argument('--amount', required=True)
+    p.add_argument('--deposits', default=0)
+    p.add_argument('--withdrawals', default=0)
+
+    p = sub.add_parser('add-transaction', help="registra um depósito ou saque")
+    user_args(p)
+    p.add_argument('--date', help="data (YYYY-MM-DD); padrão: hoje")
+    p.add_argument('--type', required=True, choices=TRANSACTION_TYPES)
+    p.add_argument('--amount', required=True)
+    p.add_argument('--description', default='')
+
+    p = sub.add_parser('set-goal', help="define a meta principal do usuário")
+    user_args(p)
+    p.add_argument('--amount', required=True)
+
+    p = sub.add_parser('add-goal', help="cadastra mais uma meta")
+    user_args(p)
+    p.add_argument('--amount', required=True)
+    p.add_argument('--description', default='')
+    p.add_argument('--target-date', help="data alvo (YYYY-MM-DD)")
+
+    p = sub.add_parser('goals', help="progresso e previsão de todas as metas")
+    user_args(p)
+
+    p = sub.add_parser('add-alert', help="cadastra uma regra de alerta de saldo")
+    user_args(p)
+    p.add_argument('--kind', required=True, choices=RULE_KINDS,
+                   help="above/below: saldo acima/abaixo do valor; drawdown: queda em %% desde o pico")
+    p.add_argument('--value', required=True)
+
+    p = sub.add_parser('alerts', help="alertas pendentes do usuário")
+    user_args(p)
+    p.add_argument('--ack', action='store_true', help="marca os alertas listados como entregues")
+
+    p = sub.add_parser('forecast', help="tendência de saldo e previsão da meta")
+    user_args(p)
+    p.add_argument('--days', type=int, default=30, help="dias previstos (padrão: 30)")
+
+    p = sub.add_parser('report', help="relatório de performance e transações")
+    user_args(p)
+
+    p = sub.add_parser('rebuild', help="recalcula os saldos de todos os usuários em paralelo")
+    user_args(p)
+    p.add_argument('--workers', type=int, help="processos (padrão: número de CPUs; 1 com poucos usuários)")
+    p.add_argument('--progress', action='store_true', help="mostra o progresso por usuário no stderr")
+
+    p = sub.add_parser('verify', help="confere saldos e transações alterados desde a última verificação")
+    user_args(p)
+    p.add_argument('--repair', action='store_true', help="reprojeta os saldos divergentes")
+    p.add_argument('--full', action='store_true', help="recalcula os hashes e confere todos os meses (encontra edições feitas fora da aplicação)")
+
+    p = sub.add_parser('assets', help="gera os arquivos estáticos com hash e comprimidos (no deploy)")
+    p.add_argument('--vendor', action='store_true',
+                   help="baixa antes as bibliotecas de terceiros que faltam em static/vendor (requer rede)")
+
+    p = sub.add_parser('batch', help="executa vários comandos com uma única gravação")
+    p.add_argument('--file', default='-', help="arquivo com um comando por linha (padrão: stdin)")
+    p.add_argument('--user', help="usuário padrão das linhas que não indicam um")
+    p.add_argument('--atomic', action='store_true',
+                   help="qualquer erro cancela o lote inteiro sem gravar nada")
+
+    sub.add_parser('serve', help="inicia o daemon residente que atende os comandos por socket Unix")
+    return parser
+
+
+COMMANDS: Dict[str, Callable] = {}
+
+
+def command(name: str):
+    """Registra um método de CommandService como comando"""
+    def register(method):
+        COMMANDS[name] = method
+        return method
+    return register
+
+
+class CommandService:
+    def __init__(self, db: Database):
+        self.db = db
+        self.forecast_engine = ForecastEngine()
+        self._parser: Optional[argparse.ArgumentParser] = None
+
+    # ------------------------------------------------------------------
+    # Argumentos
+    # ------------------------------------------------------------------
+
+    def resolve_user(self, args: Dict) -> Dict:
+        users = User(self.db)
+        if args.get('user_id') is not None:
+            user = users.get_user_by_id(int(args['user_id']))
+        elif args.get('user'):
+            user = users.get_user_by_username(args['user'])
+        else:
+            raise CommandError("Informe --user ou --user-id")
+        if not user:
+            raise CommandError(f"Usuário não encontrado: {args.get('user') or args.get('user_id')}")
+        return user
+
+    @staticmethod
+    def _date(args: Dict) -> str:
+        value = args.get('date')
+        return ImportService.parse_date(value) if value else datetime.now().strftime('%Y-%m-%d')
+
+    @staticmethod
+    def _amount(args: Dict, field: str = 'amount', allow_empty: bool = False) -> float:
+        return ImportService.parse_amount(args.get(field), field, allow_empty)
+
+    def parse_line(self, line: str) -> Tuple[str, Dict]:
+        """Converte uma linha do lote (JSON ou formato da CLI) em (comando, argumentos)"""
+        if line.startswith('{'):
+            try:
+                args = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise CommandError(f"JSON inválido: {e.msg}")
+            if not isinstance(args, dict) or not args.get('command'):
+                raise CommandError("Linha JSON sem o campo 'command'")
+            return str(args.pop('command')), args
+
+        if self._parser is None:
+            self._parser = build_parser()
+        args = vars(self._parser.parse_args(shlex.split(line)))
+        for key in GLOBAL_OPTIONS:
+            args.pop(key, None)
+        return args.pop('command'), args
+
+    # ------------------------------------------------------------------
+    # Comandos
+    # ------------------------------------------------------------------
+
+    @command('add-balance')
+    def add_balance(self, args: Dict) -> Dict:
+        user = self.resolve_user(args)
+        date_str = self._date(args)
+        amount = self._amount(args)
+        if not Balance(self.db).add_balance(user['id'], date_str, amount,
+                                            self._amount(args, 'deposits', True),
+                                            self._amount(args, 'withdrawals', True)):
+            raise CommandError("Erro ao adicionar saldo")
+        return {'user_id': user['id'], 'date': date_str, 'amount': amount}
+
+    @command('add-transaction')
+    def add_transaction(self, args: Dict) -> Dict:
+        user = self.resolve_user(args)
+        type_ = str(args.get('type') or '').strip().lower()
+        if type_ not in TRANSACTION_TYPES:
+            raise CommandError(f"Tipo de transação inválido: '{type_}'")
+        amount = self._amount(args)
+        if amount <= 0:
+            raise CommandError("Valor da transação deve ser maior que zero")
+        date_str = self._date(args)
+        if not Transaction(self.db).add_transaction(user['id'], date_str, type_, amount,
+                                                    args.get('description') or ''):
+            raise CommandError("Erro ao registrar transação")
+        return {'user_id': user['id'], 'date': date_str, 'type': type_, 'amount': amount}
+
+    @command('set-goal')
+    def set_goal(self, args: Dict) -> Dict:
+        user = self.resolve_user(args)
+        amount = self._amount(args)
+        if amount <= 0:
+            raise CommandError("Valor da meta deve ser maior que zero")
+        if not Goal(self.db).set_goal(user['id'], amount):
+            raise CommandError("Erro ao definir meta")
+        return {'user_id': user['id'], 'target_amount': amount}
+
+    @command('add-goal')
+    def add_goal(self, args: Dict) -> Dict:
+        user = self.resolve_user(args)
+        amount = self._amount(args)
+        if amount <= 0:
+            raise CommandError("Valor da meta deve ser maior que zero")
+        target_date = args.get('target_date')
+        if target_date:
+            target_date = ImportService.parse_date(target_date)
+        goal = Goal(self.db).add_goal(user['id'], amount, args.get('description') or '', target_date)
+        if not goal:
+            raise CommandError("Erro ao cadastrar meta")
+        return goal
+
+    @command('goals')
+    def goals(self, args: Dict) -> Dict:
+        user = self.resolve_user(args)
+        goals = Goal(self.db).get_goals_by_user(user['id'])
+        balances = Balance(self.db).get_balances_by_user(user['id']) if goals else []
+        return {'user_id': user['id'],
+                'goals': self.forecast_engine.evaluate_goals(balances, goals)}
+
+    @command('add-alert')
+    def add_alert(self, args: Dict) -> Dict:
+        user = self.resolve_user(args)
+        kind = str(args.get('kind') or '').strip().lower()
+        if kind not in RULE_KINDS:
+            raise CommandError(f"Tipo de alerta inválido: '{kind}'")
+        rule = self.db.alerts.add_rule(user['id'], kind, self._amount(args, 'value'))
+        if not rule:
+            raise CommandError("Erro ao cadastrar alerta")
+        return rule
+
+    @command('alerts')
+    def alerts(self, args: Dict) -> Dict:
+        user = self.resolve_user(args)
+        pending = self.db.alerts.pending(user['id'])
+        if args.get('ack') and pending:
+            self.db.alerts.mark_delivered(user['id'], [n['id'] for n in pending])
+        return {'user_id': user['id'], 'alerts': pending}
+
+    @command('forecast')
+    def forecast(self, args: Dict) -> Dict:
+        user = self.resolve_user(args)
+        balances = Balance(self.db).get_balances_by_user(user['id'])
+        if len(balances) < 2:
+            raise CommandError("Dados insuficientes para previsão (mínimo 2 registros de saldo)")
+
+        days = int(args.get('days') or 30)
+        first_day, last_day = day_of(balances[0]), day_of(balances[-1])
+        x_values = [day_of(b) - first_day for b in balances]
+        trend = self.forecast_engine.predict_balance_trend(
+            x_values, [b['amount'] for b in balances], days_ahead=days)
+
+        result = {
+            'user_id': user['id'],
+            'slope': trend['slope'],
+            'intercept': trend['intercept'],
+            'r_squared': trend['r_squared'],
+            'predictions': [
+                {'date': to_date(last_day + i).isoformat(), 'amount': amount}
+                for i, amount in enumerate(trend['predictions'], 1)
+            ],
+            'goal': None,
+            'goals': []
+        }
+
+        # Todas as metas avaliadas com uma única regressão; 'goal' é a principal
+        goals = Goal(self.db).get_goals_by_user(user['id'])
+        if goals:
+            result['goals'] = self.forecast_engine.evaluate_goals(balances, goals)
+            primary = result['goals'][0]
+            result['goal'] = {'target_amount': primary['target_amount'],
+                              'date': primary['predicted_date'], 'message': primary['message']}
+        return result
+
+    @command('report')
+    def report(self, args: Dict) -> Dict:
+        user = self.resolve_user(args)
+        balances = Balance(self.db).get_balances_by_user(user['id'])
+        transactions = Transaction(self.db).get_transactions_by_user(user['id'])
+        return {
+            'user_id': user['id'],
+            'performance': ReportService.calculate_performance_from_data(balances, transactions),
+            'transactions': ReportService.calculate_transactions_summary(transactions),
+            'win_rate': ReportService.calculate_win_rate(balances),
+            'weekly': ReportService.get_weekly_stats(balances)
+        }
+
+    @command('rebuild')
+    def rebuild(self, args: Dict) -> Dict:
+        user_ids = None
+        if args.get('user') or args.get('user_id') is not None:
+            user_ids = [self.resolve_user(args)['id']]
+
+        def progress(done: int, total: int, timing: Dict):
+            print(f"[{done}/{total}] usuário {timing['user_id']}: {timing['days']} dias "
+                  f"em {timing['seconds'] * 1000:.1f} ms", file=sys.stderr, flush=True)
+
+        return RebuildService.rebuild_all(self.db, args.get('workers'), user_ids,
+                                          progress if args.get('progress') else None)
+
+    @command('verify')
+    def verify(self, args: Dict) -> Dict:
+        user_ids = None
+        if args.get('user') or args.get('user_id') is not None:
+            user_ids = [self.resolve_user(args)['id']]
+        return IntegrityVerifier(self.db).verify(user_ids, bool(args.get('repair')), bool(args.get('full')))
+
+    @command('assets')
+    def build_assets(self, args: Dict) -> Dict:
+        result = {}
+        if args.get('vendor'):
+            try:
+                result.update(assets.vendor())
+            except OSError as e:
+                raise CommandError(f"Falha ao baixar as bibliotecas: {e}")
+        result.update(assets.build())
+        return result
+
+    # ------------------------------------------------------------------
+    # Execução
+    # ------------------------------------------------------------------
+
+    def execute(self, name: str, args: Dict) -> Dict:
+        """Executa um comando e retorna o resultado"""
+        method = COMMANDS.get(name)
+        if method is None:
+            raise CommandError(f"Comando desconhecido: {name}")
+        return method(self, args)
+
+    def dispatch(self, name: str, args: Dict, lines: Optional[Iterable[str]] = None) -> Tuple[int, Dict]:
+        """Executa um subcomando da CLI e retorna (código de saída, saída JSON)"""
+        if name == 'batch':
+            output = self.run_batch(lines or [], args.get('atomic', False), args.get('user'))
+            return (1 if output['failed'] else 0), output
+        try:
+            return 0, self.execute(name, args)
+        except ValueError as e:
+            return 1, {'error': str(e)}
+
+    def run_batch(self, lines: Iterable[str], atomic: bool = False,
+                  default_user: Optional[str] = None) -> Dict:
+        """Executa um comando por linha em uma única transação
+
+        Linhas com erro são reportadas e desfeitas (cada uma roda em um
+        savepoint); com atomic=True o primeiro erro cancela o lote e nada é
+        gravado. Os saldos de
+        add-balance/add-transaction são projetados uma vez por usuário, no
+        fim do lote ou antes do próximo comando que os lê.
+        """
+        results: List[Dict] = []
+        errors: List[Dict] = []
+        summary = {'commands': 0, 'succeeded': 0, 'failed': 0, 'applied': True}
+
+        try:
+            with self.db.batch(), self.db.events.deferred_projection():
+                for line_no, line in enumerate(lines, 1):
+                    line = line.strip()
+                    if not line or line.startswith('#'):
+                        continue
+                    summary['commands'] += 1
+                    try:
+                        name, args = self.parse_line(line)
+                        if default_user and not args.get('user') and args.get('user_id') is None:
+                            args['user'] = default_user
+                        if name not in DEFERRED_COMMANDS:
+                            self.db.events.flush_projection()
+                        # Linha que falha no meio não deixa gravações parciais no lote
+                        with self.db.savepoint():
+                            result = self.execute(name, args)
+                        results.append({'line': line_no, 'command': name, 'result': result})
+                        summary['succeeded'] += 1
+                    except ValueError as e:
+                        summary['failed'] += 1
+                        if len(errors) < MAX_REPORTED_ERRORS:
+                            errors.append({'line': line_no, 'error': str(e)})
+                        if atomic:
+                            raise _AbortBatch()
+        except _AbortBatch:
+            summary['applied'] = False
+            summary['succeeded'] = 0
+
+        return {**summary, 'errors': errors, 'results': results if summary['applied'] else []}
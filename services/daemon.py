@@ -0,0 +1,140 @@
+"""
+Daemon residente da CLI
+Mantém o Database (com índices e caches) carregado e atende os subcomandos
+de app.py por um socket Unix, evitando reler o arquivo de dados a cada
+execução. Sem daemon rodando, a CLI executa os comandos diretamente.
+
+    python app.py serve                  # inicia o daemon para data.json
+    python app.py report --user ana      # usa o daemon, se estiver rodando
+
+Protocolo: uma linha JSON por requisição e uma linha JSON por resposta.
+O socket é criado com permissão 0600 (apenas o dono do processo).
+"""
+import json
+import os
+import signal
+import socket
+import socketserver
+import threading
+from typing import Dict, Iterable, Optional
+
+from db.models import Database
+from db.records import json_default
+from services.commands import CommandService
+
+CONNECT_TIMEOUT = 1.0
+# Código de resposta quando o daemon atende outro arquivo de dados
+STATUS_WRONG_DB = 3
+
+
+def available() -> bool:
+    """Sockets Unix existem nesta plataforma"""
+    return hasattr(socket, 'AF_UNIX')
+
+
+def default_socket_path(db_path: str) -> str:
+    return os.environ.get('META_CLI_SOCKET') or f"{os.path.abspath(db_path)}.sock"
+
+
+def _connect(socket_path: str, timeout: Optional[float] = CONNECT_TIMEOUT) -> socket.socket:
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(CONNECT_TIMEOUT)
+    try:
+        sock.connect(socket_path)
+    except OSError:
+        sock.close()
+        raise
+    sock.settimeout(timeout)
+    return sock
+
+
+def send_command(socket_path: str, db_path: str, command: str, args: Dict,
+                 lines: Optional[Iterable[str]] = None,
+                 timeout: Optional[float] = None) -> Optional[Dict]:
+    """Envia um comando ao daemon; None se não houver daemon para este arquivo"""
+    if not available() or not os.path.exists(socket_path):
+        return None
+    request = {'db': os.path.abspath(db_path), 'command': command, 'args': args}
+    if lines is not None:
+        request['lines'] = list(lines)
+    try:
+        with _connect(socket_path, timeout) as sock:
+            sock.sendall(json.dumps(request, ensure_ascii=False, default=json_default).encode('utf-8') + b'\n')
+            with sock.makefile('rb') as reader:
+                raw = reader.readline()
+    except OSError:
+        return None
+    if not raw:
+        return None
+    response = json.loads(raw)
+    if response.get('status') == STATUS_WRONG_DB:
+        return None
+    return response
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for raw in self.rfile:
+            try:
+                request = json.loads(raw)
+                if not isinstance(request, dict) or not request.get('command'):
+                    raise ValueError
+            except ValueError:
+                response = {'status': 2, 'output': {'error': "Requisição inválida"}}
+            else:
+                response = self.server.process(request)
+            self.wfile.write(json.dumps(response, ensure_ascii=False, default=json_default).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+
+class CommandDaemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, db_path: str = 'data.json', socket_path: Optional[str] = None):
+        self.db_path = os.path.abspath(db_path)
+        self.socket_path = socket_path or default_socket_path(db_path)
+        self.db = Database(db_path)
+        self.service = CommandService(self.db)
+        self._remove_stale_socket()
+        super().__init__(self.socket_path, _Handler)
+        os.chmod(self.socket_path, 0o600)
+
+    def _remove_stale_socket(self):
+        if not os.path.exists(self.socket_path):
+            return
+        try:
+            _connect(self.socket_path).close()
+        except OSError:
+            # Sobra de um daemon encerrado sem limpeza
+            os.remove(self.socket_path)
+        else:
+            raise RuntimeError(f"Já existe um daemon atendendo {self.socket_path}")
+
+    def process(self, request: Dict) -> Dict:
+        """Executa uma requisição sobre o Database residente"""
+        if request.get('db') != self.db_path:
+            return {'status': STATUS_WRONG_DB,
+                    'output': {'error': f"O daemon atende {self.db_path}"}}
+        if request['command'] == 'ping':
+            return {'status': 0, 'output': {'pid': os.getpid(), 'version': self.db.version}}
+
+        # Outro processo (ex.: a aplicação web) pode ter gravado o arquivo
+        self.db.reload_if_changed()
+        with self.db.read():
+            status, output = self.service.dispatch(request['command'], request.get('args') or {},
+                                                   request.get('lines'))
+        return {'status': status, 'output': output}
+
+    def serve(self):
+        """Atende até receber SIGINT/SIGTERM e remove o socket ao sair"""
+        def stop(signum, frame):
+            threading.Thread(target=self.shutdown, daemon=True).start()
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        try:
+            self.serve_forever()
+        finally:
+            self.server_close()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
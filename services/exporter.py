@@ -0,0 +1,118 @@
+"""
+Exportação do histórico de um usuário em CSV/NDJSON
+Os registros são gerados sob demanda (generators), em ordem de data, para que
+contas grandes possam ser transmitidas sem montar o resultado inteiro em memória.
+O layout das colunas é o mesmo aceito pelo ImportService.
+"""
+import csv
+import heapq
+import io
+import json
+from typing import Dict, Iterator, Optional
+
+from db.models import Database, iter_history
+
+EXPORT_KINDS = ('balances', 'transactions', 'all')
+EXPORT_FORMATS = ('csv', 'ndjson')
+CSV_COLUMNS = ['kind', 'id', 'date', 'type', 'amount', 'deposits', 'withdrawals', 'description']
+CHUNK_ROWS = 500
+
+MIMETYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson'
+}
+
+
+class ExportService:
+    @staticmethod
+    def iter_balances(db: Database, user_id: int, start: Optional[str] = None,
+                      end: Optional[str] = None) -> Iterator[Dict]:
+        """Saldos do usuário em ordem de data, um registro por vez"""
+        # iter_history recorta o índice já ordenado e intercala os meses
+        # arquivados com heapq.merge: nenhuma lista do período é montada
+        rows = iter_history(db, 'balances', user_id, start, end)
+        return ({
+            'kind': 'balance',
+            'id': b['id'],
+            'date': b['date'],
+            'amount': b['amount'],
+            'deposits': b.get('deposits', 0),
+            'withdrawals': b.get('withdrawals', 0)
+        } for b in rows)
+
+    @staticmethod
+    def iter_transactions(db: Database, user_id: int, start: Optional[str] = None,
+                          end: Optional[str] = None) -> Iterator[Dict]:
+        """Transações do usuário em ordem de data, um registro por vez"""
+        rows = iter_history(db, 'transactions', user_id, start, end)
+        return ({
+            'kind': 'transaction',
+            'id': t['id'],
+            'date': t['date'],
+            'type': t['type'],
+            'amount': t['amount'],
+            'description': t.get('description', '')
+        } for t in rows)
+
+    @classmethod
+    def iter_records(cls, db: Database, user_id: int, kind: str = 'all',
+                     start: Optional[str] = None, end: Optional[str] = None) -> Iterator[Dict]:
+        """Registros do tipo pedido; em 'all' intercala saldos e transações por data
+
+        A versão dos dados é fixada aqui (iter_history lê o índice da versão
+        atual na chamada), então a exportação é consistente mesmo que haja
+        gravações enquanto o conteúdo é transmitido.
+        """
+        if kind == 'balances':
+            return cls.iter_balances(db, user_id, start, end)
+        if kind == 'transactions':
+            return cls.iter_transactions(db, user_id, start, end)
+        if kind == 'all':
+            return heapq.merge(cls.iter_transactions(db, user_id, start, end),
+                               cls.iter_balances(db, user_id, start, end),
+                               key=lambda r: r['date'][:10])
+        raise ValueError(f"Tipo de exportação inválido: {kind}")
+
+    @staticmethod
+    def to_csv(records: Iterator[Dict]) -> Iterator[str]:
+        """Converte registros em blocos de texto CSV"""
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=CSV_COLUMNS, extrasaction='ignore')
+        writer.writeheader()
+        for i, record in enumerate(records, 1):
+            writer.writerow(record)
+            if i % CHUNK_ROWS == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+
+    @staticmethod
+    def to_ndjson(records: Iterator[Dict]) -> Iterator[str]:
+        """Converte registros em blocos de texto NDJSON"""
+        chunk = []
+        for record in records:
+            chunk.append(json.dumps(record, ensure_ascii=False, default=str))
+            if len(chunk) >= CHUNK_ROWS:
+                yield "\n".join(chunk) + "\n"
+                chunk = []
+        if chunk:
+            yield "\n".join(chunk) + "\n"
+
+    @classmethod
+    def stream(cls, db: Database, user_id: int, kind: str = 'all', fmt: str = 'csv',
+               start: Optional[str] = None, end: Optional[str] = None) -> Iterator[str]:
+        """Gera o conteúdo exportado no formato pedido"""
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Formato de exportação inválido: {fmt}")
+        records = cls.iter_records(db, user_id, kind, start, end)
+        return cls.to_csv(records) if fmt == 'csv' else cls.to_ndjson(records)
+
+    @classmethod
+    def export_file(cls, db: Database, user_id: int, path: str, kind: str = 'all',
+                    fmt: str = 'csv', start: Optional[str] = None, end: Optional[str] = None) -> None:
+        """Grava a exportação em disco, bloco a bloco"""
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            for chunk in cls.stream(db, user_id, kind, fmt, start, end):
+                f.write(chunk)
@@ -4,13 +4,17 @@ from sklearn.linear_model import LinearRegression
 from dateutil.relativedelta import relativedelta
 from typing import Tuple, Optional
 
+from db.dates import day_of
+from services.metrics import metrics
+
 class ForecastService:
     @staticmethod
+    @metrics.timed('forecast_seconds', method='predict_date')
     def predict_date(balances: list, target: float) -> Tuple[Optional[str], Optional[str]]:
         if target <= 0 or len(balances) < 2:
             return None, None
 
-        X = np.array([[datetime.strptime(b['date'], "%Y-%m-%d").toordinal()] for b in balances])
+        X = np.array([[day_of(b)] for b in balances])
         y = np.array([b['current_balance'] for b in balances])
         model = LinearRegression().fit(X, y)
         slope, intercept = model.coef_[0], model.intercept_
@@ -20,7 +24,7 @@ class ForecastService:
 
         ord_pred = int((target - intercept) / slope)
         dt_pred = datetime.fromordinal(ord_pred)
-        last_dt = datetime.strptime(balances[-1]['date'], "%Y-%m-%d")
+        last_dt = datetime.fromordinal(day_of(balances[-1]))
         delta = ForecastService._format_time_difference(dt_pred, last_dt)
         return dt_pred.strftime("%d/%m/%Y"), delta
 
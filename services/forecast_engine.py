@@ -2,12 +2,16 @@
 Serviço de previsão usando apenas bibliotecas padrão do Python
 Implementa regressão linear simples sem dependências externas
 """
-from datetime import datetime, timedelta
+from datetime import date
+
+from db.dates import day_of, to_date
+from services.metrics import metrics
 
 class ForecastEngine:
     def __init__(self):
         pass
     
+    @metrics.timed('forecast_seconds', method='predict_balance_trend')
     def predict_balance_trend(self, x_values, y_values, days_ahead=30):
         """Prevê tendência de saldo usando regressão linear"""
         if len(x_values) < 2:
@@ -71,49 +75,101 @@ class ForecastEngine:
         
         return max(0, 1 - (ss_res / ss_tot))
     
+    def fit_series(self, balances):
+        """Regressão da série de saldos (x = dias desde o primeiro registro)
+        
+        Retorna (primeiro dia, coeficiente angular, intercepto, R²); slope é
+        None quando não há dados suficientes para a regressão.
+        """
+        if len(balances) < 2:
+            return None, None, None, 0
+        start_day = day_of(balances[0])
+        x_values = [day_of(b) - start_day for b in balances]
+        amounts = [b['amount'] for b in balances]
+        slope, intercept = self.linear_regression(x_values, amounts)
+        if slope is None:
+            return start_day, None, None, 0
+        return start_day, slope, intercept, self.calculate_r_squared(x_values, amounts, slope, intercept)
+    
+    @staticmethod
+    def confidence_label(r_squared):
+        confidence = "Alta" if r_squared > 0.8 else "Média" if r_squared > 0.5 else "Baixa"
+        return f"Confiança: {confidence} (R²: {r_squared:.2f})"
+    
+    @metrics.timed('forecast_seconds', method='predict_goal_date')
     def predict_goal_date(self, balances, goal_amount):
         """Prevê quando a meta será alcançada"""
         if len(balances) < 2:
             return None, "Dados insuficientes para previsão"
         
         try:
-            # Converter datas para números (dias desde a primeira data)
-            dates = [datetime.strptime(b['date'], '%Y-%m-%d') for b in balances]
-            amounts = [b['amount'] for b in balances]
-            
-            start_date = dates[0]
-            x_values = [(date - start_date).days for date in dates]
-            
-            # Calcular regressão linear
-            slope, intercept = self.linear_regression(x_values, amounts)
+            start_day, slope, intercept, r_squared = self.fit_series(balances)
             
             if slope is None or slope <= 0:
                 return None, "Tendência não permite alcançar a meta"
             
             # Calcular quando a meta será alcançada
             days_to_goal = (goal_amount - intercept) / slope
-            goal_date = start_date + timedelta(days=int(days_to_goal))
-            
-            # Calcular R² para avaliar qualidade da previsão
-            r_squared = self.calculate_r_squared(x_values, amounts, slope, intercept)
-            
-            confidence = "Alta" if r_squared > 0.8 else "Média" if r_squared > 0.5 else "Baixa"
+            goal_date = to_date(start_day + int(days_to_goal))
             
-            return goal_date.strftime('%Y-%m-%d'), f"Confiança: {confidence} (R²: {r_squared:.2f})"
+            return goal_date.strftime('%Y-%m-%d'), self.confidence_label(r_squared)
             
         except Exception as e:
             return None, f"Erro na previsão: {str(e)}"
     
+    @metrics.timed('forecast_seconds', method='evaluate_goals')
+    def evaluate_goals(self, balances, goals):
+        """Progresso e data prevista de todas as metas com uma única regressão
+        
+        Equivale a chamar predict_goal_date para cada meta, mas a série de
+        saldos é percorrida uma vez só, independentemente do número de metas.
+        """
+        current = balances[-1]['amount'] if balances else 0
+        fit = self.fit_series(balances) if len(balances) >= 2 else (None, None, None, 0)
+        start_day, slope, intercept, r_squared = fit
+        
+        results = []
+        for goal in goals:
+            target = goal['target_amount']
+            result = {
+                'id': goal.get('id'),
+                'description': goal.get('description', ''),
+                'target_amount': target,
+                'target_date': goal.get('target_date'),
+                'progress': round(current / target * 100, 2) if target > 0 else 0,
+                'reached': current >= target,
+                'predicted_date': None,
+                'on_track': None
+            }
+            if result['reached']:
+                result['message'] = "Meta alcançada"
+            elif len(balances) < 2:
+                result['message'] = "Dados insuficientes para previsão"
+            elif slope is None or slope <= 0:
+                result['message'] = "Tendência não permite alcançar a meta"
+            else:
+                try:
+                    goal_date = to_date(start_day + int((target - intercept) / slope))
+                except (OverflowError, ValueError) as e:
+                    result['message'] = f"Erro na previsão: {str(e)}"
+                else:
+                    result['predicted_date'] = goal_date.isoformat()
+                    result['message'] = self.confidence_label(r_squared)
+                    if result['target_date']:
+                        result['on_track'] = result['predicted_date'] <= result['target_date'][:10]
+            results.append(result)
+        return results
+    
+    @metrics.timed('forecast_seconds', method='weekly_recommendation')
     def get_weekly_recommendation(self, transactions):
         """Recomenda valor de saque semanal baseado na média de lucro"""
         try:
             # Filtrar apenas depósitos dos últimos 30 dias
-            recent_date = datetime.now() - timedelta(days=30)
+            recent_day = date.today().toordinal() - 30
             
             recent_deposits = [
                 t for t in transactions 
-                if t['type'] == 'deposit' and 
-                datetime.strptime(t['date'], '%Y-%m-%d %H:%M:%S') >= recent_date
+                if t['type'] == 'deposit' and day_of(t) >= recent_day
             ]
             
             if not recent_deposits:
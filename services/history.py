@@ -0,0 +1,112 @@
+"""
+Páginas do histórico de saldos e transações para o dashboard
+As tabelas são carregadas aos poucos, da mais recente para a mais antiga.
+Cada página traz o cursor da próxima ("AAAA-MM-DD:id" do último registro),
+usado pelas consultas paginadas dos modelos sem percorrer o histórico inteiro.
+O conjunto de dias com saldo vai para o navegador uma vez por versão do
+conjunto, para que o formulário de saldo verifique datas localmente.
+"""
+import hashlib
+import json
+from typing import Dict, List, Optional, Tuple
+
+from db.models import Balance, Database, Transaction
+from db.money import cents_of, from_cents
+
+PAGE_SIZE = 25
+MAX_PAGE_SIZE = 200
+
+
+class HistoryService:
+    @staticmethod
+    def cursor(row: Dict) -> str:
+        return f"{row['date']}:{row['id']}"
+
+    @staticmethod
+    def parse_cursor(value: Optional[str]) -> Optional[Tuple[str, int]]:
+        """Converte "AAAA-MM-DD:id" em (data, id)"""
+        if not value:
+            return None
+        date_str, sep, row_id = value.rpartition(':')
+        if not sep or not date_str:
+            raise ValueError(f"Cursor inválido: '{value}'")
+        try:
+            return date_str, int(row_id)
+        except ValueError:
+            raise ValueError(f"Cursor inválido: '{value}'")
+
+    @staticmethod
+    def page_size(value) -> int:
+        if value in (None, ''):
+            return PAGE_SIZE
+        try:
+            size = int(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"Tamanho de página inválido: '{value}'")
+        return max(1, min(size, MAX_PAGE_SIZE))
+
+    @classmethod
+    def _page(cls, rows: List[Dict], limit: int, items: List[Dict]) -> Dict:
+        return {
+            'items': items,
+            'next': cls.cursor(rows[limit - 1]) if len(rows) > limit else None
+        }
+
+    @classmethod
+    def balance_page(cls, db: Database, user_id: int, after: Optional[str] = None,
+                     limit=None) -> Dict:
+        """Página de saldos diários, do mais recente para o mais antigo
+
+        Busca um registro a mais: ele indica se há próxima página e serve de
+        saldo anterior para calcular o lucro do último dia da página.
+        """
+        limit = cls.page_size(limit)
+        rows = Balance(db).get_balances_page(user_id, cls.parse_cursor(after), limit + 1,
+                                             newest_first=True)
+        items = []
+        # Contas em centavos, como em ReportService.calculate_balances
+        for i, balance in enumerate(rows[:limit]):
+            previous = cents_of(rows[i + 1]) if i + 1 < len(rows) else None
+            cents = cents_of(balance)
+            deposits = cents_of(balance, 'deposits')
+            withdrawals = cents_of(balance, 'withdrawals')
+            profit = cents - previous - deposits + withdrawals if previous is not None else 0
+            items.append({
+                'id': balance['id'],
+                'date': balance['date'],
+                'current_balance': from_cents(cents),
+                'deposits': from_cents(deposits),
+                'withdrawals': from_cents(withdrawals),
+                'profit': from_cents(profit),
+                'win_percentage': round(profit / previous * 100, 2) if previous else 0.0
+            })
+        return cls._page(rows, limit, items)
+
+    @staticmethod
+    def occupied_dates(db: Database, user_id: int) -> Dict:
+        """Dias com saldo, por mês, como máscara de bits (bit 0 = dia 1)
+
+        `version` é o hash das próprias máscaras: muda sempre que o conjunto
+        muda, venha a alteração de onde vier (inclusive reconstruções e
+        reparos que não passam pelo registro de eventos), e permite ao
+        navegador manter o conjunto em cache e apenas revalidá-lo.
+        """
+        months = Balance(db).occupied_days(user_id)
+        digest = hashlib.blake2b(json.dumps(sorted(months.items())).encode('ascii'), digest_size=8)
+        return {'version': digest.hexdigest(), 'months': months}
+
+    @classmethod
+    def transaction_page(cls, db: Database, user_id: int, after: Optional[str] = None,
+                         limit=None) -> Dict:
+        """Página de transações, da mais recente para a mais antiga"""
+        limit = cls.page_size(limit)
+        rows = Transaction(db).get_transactions_page(user_id, cls.parse_cursor(after), limit + 1,
+                                                     newest_first=True)
+        items = [{
+            'id': t['id'],
+            'date': t['date'],
+            'type': t['type'],
+            'amount': t['amount'],
+            'description': t.get('description', '')
+        } for t in rows[:limit]]
+        return cls._page(rows, limit, items)
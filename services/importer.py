@@ -0,0 +1,176 @@
+"""
+Importação em lote de saldos e transações
+Lê arquivos CSV ou NDJSON linha a linha, valida cada registro e grava tudo
+em uma única operação, recalculando os saldos afetados apenas no final.
+"""
+import csv
+import json
+import math
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from db.models import Balance, Database, Transaction
+
+SUPPORTED_FORMATS = ('csv', 'ndjson')
+TRANSACTION_TYPES = ('deposit', 'withdrawal')
+DATE_FORMATS = ('%Y-%m-%d', '%Y-%m-%d %H:%M:%S', '%d/%m/%Y')
+MAX_REPORTED_ERRORS = 100
+
+
+class ImportValidationError(ValueError):
+    """Erro de validação de uma linha do arquivo importado"""
+
+
+class ImportService:
+    @staticmethod
+    def detect_format(filename: str, default: str = 'csv') -> str:
+        """Detecta o formato pelo nome do arquivo"""
+        name = (filename or '').lower()
+        if name.endswith(('.ndjson', '.jsonl', '.json')):
+            return 'ndjson'
+        if name.endswith('.csv'):
+            return 'csv'
+        return default
+
+    @staticmethod
+    def iter_rows(stream: Iterable[str], fmt: str) -> Iterator[Tuple[int, Dict]]:
+        """Percorre o arquivo linha a linha, sem carregá-lo inteiro"""
+        if fmt == 'csv':
+            reader = csv.DictReader(stream)
+            for row in reader:
+                yield reader.line_num, row
+        elif fmt == 'ndjson':
+            for line_no, line in enumerate(stream, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield line_no, {'__error__': f"JSON inválido: {e.msg}"}
+                    continue
+                yield line_no, row if isinstance(row, dict) else {'__error__': "Linha não é um objeto JSON"}
+        else:
+            raise ValueError(f"Formato não suportado: {fmt}")
+
+    @staticmethod
+    def parse_date(value) -> str:
+        """Normaliza a data para YYYY-MM-DD"""
+        value = str(value or '').strip()
+        for fmt in DATE_FORMATS:
+            try:
+                return datetime.strptime(value, fmt).strftime('%Y-%m-%d')
+            except ValueError:
+                continue
+        raise ImportValidationError(f"Data inválida: '{value}'")
+
+    @staticmethod
+    def parse_amount(value, field: str = 'amount', allow_empty: bool = False) -> float:
+        """Converte valores monetários aceitando vírgula decimal"""
+        if value is None or str(value).strip() == '':
+            if allow_empty:
+                return 0.0
+            raise ImportValidationError(f"Campo '{field}' é obrigatório")
+        try:
+            if isinstance(value, (int, float)):
+                amount = float(value)
+            else:
+                amount = float(str(value).strip().replace(',', '.'))
+        except (ValueError, OverflowError):
+            amount = math.nan
+        # nan, inf e 1e400 passam pelo float() mas não são valores monetários
+        if not math.isfinite(amount):
+            raise ImportValidationError(f"Valor inválido em '{field}': '{value}'")
+        return amount
+
+    @classmethod
+    def validate_row(cls, row: Dict) -> Tuple[str, Dict]:
+        """Valida uma linha e retorna (tipo do registro, dados normalizados)"""
+        if '__error__' in row:
+            raise ImportValidationError(row['__error__'])
+
+        kind = str(row.get('kind') or ('transaction' if row.get('type') else 'balance')).strip().lower()
+        date_str = cls.parse_date(row.get('date'))
+
+        if kind == 'transaction':
+            type_ = str(row.get('type') or '').strip().lower()
+            if type_ not in TRANSACTION_TYPES:
+                raise ImportValidationError(f"Tipo de transação inválido: '{type_}'")
+            amount = cls.parse_amount(row.get('amount'))
+            if amount <= 0:
+                raise ImportValidationError("Valor da transação deve ser maior que zero")
+            return kind, {
+                'date': date_str,
+                'type': type_,
+                'amount': amount,
+                'description': str(row.get('description') or '')
+            }
+
+        if kind == 'balance':
+            return kind, {
+                'date': date_str,
+                'amount': cls.parse_amount(row.get('amount')),
+                'deposits': cls.parse_amount(row.get('deposits'), 'deposits', allow_empty=True),
+                'withdrawals': cls.parse_amount(row.get('withdrawals'), 'withdrawals', allow_empty=True)
+            }
+
+        raise ImportValidationError(f"Tipo de registro desconhecido: '{kind}'")
+
+    @classmethod
+    def import_stream(cls, db: Database, user_id: int, stream: Iterable[str],
+                      fmt: str = 'csv', strict: bool = False) -> Dict:
+        """Importa um arquivo para o usuário em um único lote
+
+        Linhas inválidas são ignoradas e reportadas; com strict=True qualquer
+        erro cancela a importação sem gravar nada.
+        """
+        balances: Dict[str, Dict] = {}
+        transactions: List[Dict] = []
+        errors: List[Tuple[int, str]] = []
+        error_count = 0
+        rows_read = 0
+
+        for line_no, row in cls.iter_rows(stream, fmt):
+            rows_read += 1
+            try:
+                kind, item = cls.validate_row(row)
+            except ImportValidationError as e:
+                error_count += 1
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append((line_no, str(e)))
+                continue
+
+            if kind == 'transaction':
+                transactions.append(item)
+            else:
+                # A última linha de uma mesma data prevalece
+                balances[item['date']] = item
+
+        result = {
+            'rows': rows_read,
+            'balances': 0,
+            'transactions': 0,
+            'recalculated_dates': 0,
+            'error_count': error_count,
+            'errors': errors
+        }
+
+        if strict and error_count:
+            return result
+
+        with db.batch():
+            balance_model = Balance(db)
+            result['balances'] = balance_model.bulk_upsert(user_id, list(balances.values()))
+            affected = Transaction(db).bulk_add(user_id, transactions)
+            result['transactions'] = len(transactions)
+            result['recalculated_dates'] = balance_model.recalculate_balances(user_id, affected)
+
+        return result
+
+    @classmethod
+    def import_file(cls, db: Database, user_id: int, path: str,
+                    fmt: Optional[str] = None, strict: bool = False) -> Dict:
+        """Importa um arquivo do disco"""
+        fmt = fmt or cls.detect_format(path)
+        with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+            return cls.import_stream(db, user_id, f, fmt, strict)
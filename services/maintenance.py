@@ -0,0 +1,215 @@
+"""
+Reconstrução completa dos saldos de todos os usuários
+Depois de correções de dados ou migrações, os saldos diários de cada usuário
+são recalculados a partir das transações e dos saldos informados
+manualmente, que são a fonte da verdade (o registro de eventos não vê
+correções feitas direto nos registros). Para usuários com registro de
+eventos, o estado corrigido vira um novo checkpoint.
+
+Os processos recebem só tuplas compactas (data, centavos) e devolvem as
+linhas do estado diário; a comparação com os registros atuais e a gravação
+ficam no processo principal, em uma única transação. Com uma CPU ou poucos
+usuários o cálculo roda no próprio processo: a serialização custaria mais
+que o cálculo.
+
+    python app.py rebuild --workers 8 --progress
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from time import perf_counter
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from db.dates import day_ordinal
+from db.events import (COUNT, DEPOSITS, EMPTY_DAY, MANUAL, WITHDRAWALS, day_flows,
+                       state_rows)
+from db.models import Database
+from db.money import cents_of, from_cents
+
+# Lotes por processo: lotes menores equilibram melhor a carga e o progresso
+CHUNKS_PER_WORKER = 4
+# Abaixo disso o padrão é calcular no próprio processo
+PARALLEL_MIN_USERS = 200
+SLOWEST_REPORTED = 20
+BALANCE_FIELDS = ('day', 'amount', 'deposits', 'withdrawals', 'manual')
+
+# (user_id, transações (data, centavos; saques negativos),
+#  saldos manuais (data, saldo, depósitos, saques), em centavos)
+Payload = Tuple[int, List[Tuple[str, int]], List[Tuple[str, int, int, int]]]
+Progress = Callable[[int, int, Dict], None]
+
+
+def compute_series(payload: Payload) -> Tuple[int, List[List], float]:
+    """Estado diário de um usuário; retorna (user_id, linhas de state_rows, segundos)"""
+    user_id, transactions, manual = payload
+    started = perf_counter()
+    days: Dict[str, List] = {}
+    for date_str, cents in transactions:
+        day = days.get(date_str)
+        if day is None:
+            day = days[date_str] = list(EMPTY_DAY)
+        day[COUNT] += 1
+        if cents > 0:
+            day[DEPOSITS] += cents
+        elif cents < 0:
+            day[WITHDRAWALS] -= cents
+    for date_str, *values in manual:
+        day = days.get(date_str)
+        if day is None:
+            day = days[date_str] = list(EMPTY_DAY)
+        day[MANUAL:MANUAL + 3] = values
+    return user_id, state_rows(days, sorted(days)), perf_counter() - started
+
+
+def _compute_chunk(payloads: List[Payload]) -> List[Tuple[int, List[List], float]]:
+    return [compute_series(payload) for payload in payloads]
+
+
+class RebuildService:
+    @staticmethod
+    def payloads(db: Database, user_ids: Optional[Iterable[int]] = None) -> List[Payload]:
+        """Dados necessários para recalcular cada usuário (sem o Database)
+
+        Saldos sem o campo 'manual' (anteriores ao registro de eventos) são
+        manuais quando o dia não tem transações.
+        """
+        view = db.snapshot()
+        if user_ids is None:
+            user_ids = [u['id'] for u in view.users]
+        result = []
+        for user_id in user_ids:
+            transactions = list(view.rows('transactions', user_id))
+            balances = list(view.rows('balances', user_id))
+            if db.archive.has_archive(user_id):
+                transactions.extend(db.archive.iter_rows('transactions', user_id))
+                balances.extend(db.archive.iter_rows('balances', user_id))
+            signs = {'deposit': 1, 'withdrawal': -1}
+            compact = [(t['date'], signs.get(t['type'], 0) * cents_of(t)) for t in transactions]
+            dated = {date_str for date_str, _ in compact}
+            manual = [(b['date'], cents_of(b), cents_of(b, 'deposits'), cents_of(b, 'withdrawals'))
+                      for b in balances if b.get('manual', b['date'] not in dated)]
+            result.append((user_id, compact, manual))
+        return result
+
+    @staticmethod
+    def _chunks(payloads: List[Payload], count: int) -> List[List[Payload]]:
+        """Divide os usuários em `count` lotes com volume de dados parecido"""
+        def weight(payload: Payload) -> int:
+            return len(payload[1]) + len(payload[2]) + 1
+
+        chunks: List[List[Payload]] = [[] for _ in range(count)]
+        loads = [0] * count
+        for payload in sorted(payloads, key=weight, reverse=True):
+            i = loads.index(min(loads))
+            chunks[i].append(payload)
+            loads[i] += weight(payload)
+        return [chunk for chunk in chunks if chunk]
+
+    @staticmethod
+    def _merge(db: Database, tx, user_id: int, rows: List[List]) -> int:
+        """Aplica o estado calculado; retorna quantos registros de saldo mudaram"""
+        expected = {}
+        for date_str, *day, amount in rows:
+            deposits, withdrawals = day_flows(day)
+            expected[date_str] = {
+                'day': day_ordinal(date_str), 'amount': from_cents(amount),
+                'deposits': from_cents(deposits), 'withdrawals': from_cents(withdrawals),
+                'manual': day[MANUAL] is not None
+            }
+
+        def differs(row: Optional[Dict], values: Optional[Dict]) -> bool:
+            if row is None or values is None:
+                return row is not values
+            return any(row.get(k) != values[k] for k in BALANCE_FIELDS)
+
+        if db.archive.has_archive(user_id):
+            # Só os meses arquivados com diferença voltam para os dados ativos
+            archived = {b['date']: b for b in db.archive.iter_rows('balances', user_id)}
+            wrong = [d for d in set(archived) | set(expected)
+                     if (differs(archived[d], expected.get(d)) if d in archived
+                         else db.archive.is_archived(user_id, d))]
+            db.archive.restore_dates(user_id, wrong)
+
+        merged, changed, seen = [], 0, set()
+        now = datetime.now().isoformat()
+        for row in tx.rows('balances', user_id):
+            values = expected.get(row['date'])
+            if values is None or row['date'] in seen:
+                changed += 1
+                continue
+            seen.add(row['date'])
+            if differs(row, values):
+                row = {**row, **values, 'updated_at': now}
+                changed += 1
+            merged.append(row)
+        for date_str, values in expected.items():
+            if date_str in seen or db.archive.is_archived(user_id, date_str):
+                continue
+            merged.append({'id': db._get_next_id('balances'), 'user_id': user_id, 'date': date_str,
+                         **values, 'created_at': now, 'updated_at': now})
+            changed += 1
+        if changed:
+            tx.set_rows('balances', user_id, merged)
+        db.events.rebase(user_id, rows)
+        return changed
+
+    @classmethod
+    def rebuild_all(cls, db: Database, workers: Optional[int] = None,
+                    user_ids: Optional[Iterable[int]] = None,
+                    progress: Optional[Progress] = None) -> Dict:
+        """Recalcula os saldos de todos os usuários (ou de `user_ids`)
+
+        `progress(feitos, total, {'user_id', 'seconds', 'days'})` é chamado a
+        cada usuário calculado. Usuários alterados durante o cálculo são
+        recalculados dentro da transação. Sem `workers`, usa um processo por
+        CPU a partir de PARALLEL_MIN_USERS usuários. Retorna o resumo com os
+        usuários mais lentos.
+        """
+        started = perf_counter()
+        payloads = cls.payloads(db, user_ids)
+        versions = {payload[0]: db.events.version(payload[0]) for payload in payloads}
+        if workers is None:
+            cpus = os.cpu_count() or 1
+            workers = cpus if cpus > 1 and len(payloads) >= PARALLEL_MIN_USERS else 1
+        workers = max(1, min(workers, len(payloads) or 1))
+        results: List[Tuple[int, List[List], float]] = []
+
+        def collect(batch):
+            for result in batch:
+                results.append(result)
+                if progress:
+                    progress(len(results), len(payloads),
+                             {'user_id': result[0], 'seconds': result[2], 'days': len(result[1])})
+
+        if workers == 1:
+            collect(_compute_chunk(payloads))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(_compute_chunk, chunk)
+                           for chunk in cls._chunks(payloads, workers * CHUNKS_PER_WORKER)]
+                for future in as_completed(futures):
+                    collect(future.result())
+        computed = perf_counter() - started
+
+        timings, changed = [], 0
+        with db.write() as tx:
+            for user_id, rows, seconds in sorted(results, key=lambda r: r[0]):
+                merge_started = perf_counter()
+                if db.events.version(user_id) != versions[user_id]:
+                    _, rows, seconds = compute_series(cls.payloads(db, [user_id])[0])
+                user_changed = cls._merge(db, tx, user_id, rows)
+                changed += user_changed
+                timings.append({'user_id': user_id, 'days': len(rows), 'changed': user_changed,
+                                'compute_seconds': round(seconds, 6),
+                                'merge_seconds': round(perf_counter() - merge_started, 6)})
+
+        timings.sort(key=lambda t: t['compute_seconds'] + t['merge_seconds'], reverse=True)
+        return {
+            'users': len(results),
+            'workers': workers,
+            'changed': changed,
+            'users_changed': sum(1 for t in timings if t['changed']),
+            'compute_seconds': round(computed, 3),
+            'total_seconds': round(perf_counter() - started, 3),
+            'slowest': timings[:SLOWEST_REPORTED]
+        }
@@ -0,0 +1,246 @@
+"""
+Métricas de desempenho no formato texto do Prometheus
+Registra latência por rota, operações de leitura/gravação do armazenamento
+(com bytes), acertos de cache e tempo de cálculo de previsões e relatórios.
+
+Desligado por padrão: com META_METRICS=1 (ou metrics.enable()) os pontos
+instrumentados passam a registrar dados; desligado, cada ponto custa apenas
+a verificação de um atributo. Na aplicação Flask, utils.register_filters
+chama init_app, que expõe /metrics e, opcionalmente, o log de requisições
+lentas.
+"""
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+from typing import Dict, List, Optional, Tuple
+
+PREFIX = 'meta_'
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+logger = logging.getLogger('meta.metrics')
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, Histogram]] = {}
+        self._help: Dict[str, str] = {}
+        self._local = threading.local()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def describe(self, name: str, text: str):
+        self._help[name] = text
+
+    @staticmethod
+    def _key(labels: Dict[str, object]) -> LabelKey:
+        return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def inc(self, name: str, value: float = 1, **labels):
+        """Incrementa um contador"""
+        if not self.enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        """Registra uma observação (em segundos) em um histograma"""
+        if not self.enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram()
+            histogram.observe(value)
+
+    # ------------------------------------------------------------------
+    # Medição de tempo
+    # ------------------------------------------------------------------
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """Mede o bloco e o soma ao detalhamento da requisição corrente"""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.observe(name, elapsed, **labels)
+            self._record_breakdown(name, labels, elapsed)
+
+    def timed(self, name: str, **labels):
+        """Decorator equivalente a timer()"""
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with self.timer(name, **labels):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def _record_breakdown(self, name: str, labels: Dict, elapsed: float):
+        ops = getattr(self._local, 'ops', None)
+        if ops is not None:
+            label = ','.join(f"{k}={v}" for k, v in sorted(labels.items()))
+            ops.append((f"{name}{{{label}}}" if label else name, elapsed))
+
+    def begin_request(self):
+        self._local.ops = []
+        self._local.start = time.perf_counter()
+
+    def end_request(self) -> Tuple[float, List[Tuple[str, float]]]:
+        start = getattr(self._local, 'start', None)
+        ops = getattr(self._local, 'ops', None) or []
+        self._local.ops = None
+        self._local.start = None
+        elapsed = time.perf_counter() - start if start is not None else 0.0
+        return elapsed, ops
+
+    # ------------------------------------------------------------------
+    # Exposição
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+        pairs = list(key) + ([extra] if extra else [])
+        if not pairs:
+            return ''
+        escaped = (v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+        return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+    def _cache_ratios(self) -> Dict[LabelKey, float]:
+        """Taxa de acerto por cache, a partir de meta_cache_requests_total"""
+        totals: Dict[LabelKey, List[float]] = {}
+        for key, value in self._counters.get('cache_requests_total', {}).items():
+            labels = dict(key)
+            result = labels.pop('result', '')
+            entry = totals.setdefault(self._key(labels), [0.0, 0.0])
+            entry[0 if result == 'hit' else 1] += value
+        return {k: hits / (hits + misses) for k, (hits, misses) in totals.items() if hits + misses}
+
+    def render(self) -> str:
+        """Conteúdo do endpoint /metrics"""
+        lines: List[str] = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                full = PREFIX + name
+                if name in self._help:
+                    lines.append(f"# HELP {full} {self._help[name]}")
+                lines.append(f"# TYPE {full} counter")
+                for key, value in sorted(series.items()):
+                    number = int(value) if float(value).is_integer() else value
+                    lines.append(f"{full}{self._format_labels(key)} {number}")
+
+            ratios = self._cache_ratios()
+            if ratios:
+                lines.append(f"# TYPE {PREFIX}cache_hit_ratio gauge")
+                for key, ratio in sorted(ratios.items()):
+                    lines.append(f"{PREFIX}cache_hit_ratio{self._format_labels(key)} {ratio:.4f}")
+
+            for name, series in sorted(self._histograms.items()):
+                full = PREFIX + name
+                if name in self._help:
+                    lines.append(f"# HELP {full} {self._help[name]}")
+                lines.append(f"# TYPE {full} histogram")
+                for key, histogram in sorted(series.items()):
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        lines.append(f"{full}_bucket{self._format_labels(key, ('le', f'{bound:g}'))} {cumulative}")
+                    lines.append(f"{full}_bucket{self._format_labels(key, ('le', '+Inf'))} {histogram.count}")
+                    lines.append(f"{full}_sum{self._format_labels(key)} {histogram.sum:.6f}")
+                    lines.append(f"{full}_count{self._format_labels(key)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry(enabled=os.environ.get('META_METRICS', '').lower() in ('1', 'true', 'yes'))
+
+metrics.describe('http_request_duration_seconds', "Latência das requisições por rota")
+metrics.describe('storage_operation_seconds', "Duração de leituras e gravações do arquivo de dados")
+metrics.describe('storage_operations_total', "Quantidade de leituras e gravações do arquivo de dados")
+metrics.describe('storage_bytes_total', "Bytes lidos e gravados no arquivo de dados")
+metrics.describe('storage_errors_total', "Falhas de leitura ou gravação do arquivo de dados")
+metrics.describe('cache_requests_total', "Consultas a caches internos por resultado")
+metrics.describe('forecast_seconds', "Tempo de cálculo das previsões")
+metrics.describe('report_seconds', "Tempo de cálculo dos relatórios")
+
+
+def init_app(app, enabled: Optional[bool] = None, slow_request_ms: Optional[float] = None):
+    """Instala a medição de rotas e o endpoint /metrics no app Flask
+
+    Configuração (app.config ou variáveis de ambiente):
+    METRICS_ENABLED / META_METRICS e SLOW_REQUEST_MS / META_SLOW_REQUEST_MS.
+    """
+    from flask import Response, request
+
+    if enabled is None:
+        enabled = app.config.get('METRICS_ENABLED', metrics.enabled)
+    if not enabled:
+        return
+    metrics.enable()
+
+    if slow_request_ms is None:
+        slow_request_ms = app.config.get('SLOW_REQUEST_MS', os.environ.get('META_SLOW_REQUEST_MS'))
+    slow_threshold = float(slow_request_ms) / 1000 if slow_request_ms else None
+
+    @app.before_request
+    def _start_timer():
+        metrics.begin_request()
+
+    @app.after_request
+    def _record_request(response):
+        elapsed, ops = metrics.end_request()
+        endpoint = request.endpoint or 'unknown'
+        metrics.observe('http_request_duration_seconds', elapsed,
+                        endpoint=endpoint, method=request.method, status=response.status_code)
+        if slow_threshold is not None and elapsed >= slow_threshold:
+            breakdown = ', '.join(f"{name}={seconds * 1000:.1f}ms" for name, seconds in ops) or 'sem operações medidas'
+            logger.warning("Requisição lenta %s %s (%s): %.1fms [%s]",
+                           request.method, request.path, endpoint, elapsed * 1000, breakdown)
+        return response
+
+    def metrics_endpoint():
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+    app.add_url_rule('/metrics', 'metrics', metrics_endpoint)
@@ -0,0 +1,210 @@
+"""
+Serviço unificado de hash de senhas
+Gera e verifica hashes no mesmo formato do Werkzeug (pbkdf2 e scrypt), de
+modo que os hashes já gravados continuam válidos, e reconhece o SHA-256 sem
+sal usado pela versão CLI para migrá-lo no próximo login.
+
+O cálculo roda em um pool de threads limitado (o hashlib libera o GIL
+durante pbkdf2/scrypt), com limite de tarefas pendentes: picos de login
+esperam na fila do pool em vez de ocupar todos os workers da aplicação.
+
+Configuração por variáveis de ambiente:
+META_PASSWORD_METHOD (pbkdf2 ou scrypt), META_PBKDF2_ITERATIONS,
+META_SCRYPT_N, META_PASSWORD_WORKERS e META_PASSWORD_MAX_PENDING.
+"""
+import hashlib
+import hmac
+import os
+import secrets
+import string
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from services.metrics import metrics
+
+SALT_CHARS = string.ascii_letters + string.digits
+SALT_LENGTH = 16
+DEFAULT_PBKDF2_ITERATIONS = 600_000
+DEFAULT_SCRYPT = (2 ** 15, 8, 1)
+LEGACY_SHA256_LENGTH = 64
+
+metrics.describe('password_queue_seconds', "Tempo de espera na fila do pool de hash de senhas")
+metrics.describe('password_hash_seconds', "Tempo de cálculo de hash/verificação de senhas")
+metrics.describe('password_rejected_total', "Operações de senha recusadas com a fila do pool cheia")
+
+
+class PasswordServiceBusy(RuntimeError):
+    """Fila do pool de hash cheia; o chamador deve tentar novamente"""
+
+
+class PasswordHasher:
+    def __init__(self, method: str = 'pbkdf2', iterations: int = DEFAULT_PBKDF2_ITERATIONS,
+                 scrypt_n: int = DEFAULT_SCRYPT[0], scrypt_r: int = DEFAULT_SCRYPT[1],
+                 scrypt_p: int = DEFAULT_SCRYPT[2], max_workers: Optional[int] = None,
+                 max_pending: Optional[int] = None, acquire_timeout: float = 5.0):
+        if method not in ('pbkdf2', 'scrypt'):
+            raise ValueError(f"Método de hash não suportado: {method}")
+        self.method = method
+        self.iterations = iterations
+        self.scrypt_params = (scrypt_n, scrypt_r, scrypt_p)
+        self.max_workers = max_workers or max(1, (os.cpu_count() or 2) // 2)
+        self.max_pending = max_pending or self.max_workers * 8
+        self.acquire_timeout = acquire_timeout
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        self._dummy_hash: Optional[str] = None
+
+    @classmethod
+    def from_env(cls) -> 'PasswordHasher':
+        env = os.environ
+        return cls(
+            method=env.get('META_PASSWORD_METHOD', 'pbkdf2'),
+            iterations=int(env.get('META_PBKDF2_ITERATIONS', DEFAULT_PBKDF2_ITERATIONS)),
+            scrypt_n=int(env.get('META_SCRYPT_N', DEFAULT_SCRYPT[0])),
+            max_workers=int(env['META_PASSWORD_WORKERS']) if env.get('META_PASSWORD_WORKERS') else None,
+            max_pending=int(env['META_PASSWORD_MAX_PENDING']) if env.get('META_PASSWORD_MAX_PENDING') else None
+        )
+
+    # ------------------------------------------------------------------
+    # Formato dos hashes
+    # ------------------------------------------------------------------
+
+    @property
+    def current_method(self) -> str:
+        """Prefixo do hash com os parâmetros atuais (ex.: pbkdf2:sha256:600000)"""
+        if self.method == 'scrypt':
+            n, r, p = self.scrypt_params
+            return f"scrypt:{n}:{r}:{p}"
+        return f"pbkdf2:sha256:{self.iterations}"
+
+    @staticmethod
+    def _derive(method: str, salt: str, password: str) -> str:
+        name, *args = method.split(':')
+        if name == 'scrypt':
+            n, r, p = (int(a) for a in args) if args else DEFAULT_SCRYPT
+            return hashlib.scrypt(password.encode('utf-8'), salt=salt.encode('utf-8'),
+                                  n=n, r=r, p=p, maxmem=132 * n * r * p).hex()
+        if name == 'pbkdf2':
+            hash_name = args[0] if args else 'sha256'
+            iterations = int(args[1]) if len(args) > 1 else DEFAULT_PBKDF2_ITERATIONS
+            return hashlib.pbkdf2_hmac(hash_name, password.encode('utf-8'),
+                                       salt.encode('utf-8'), iterations).hex()
+        raise ValueError(f"Método de hash desconhecido: {name}")
+
+    @staticmethod
+    def _is_legacy(stored: str) -> bool:
+        return len(stored) == LEGACY_SHA256_LENGTH and '$' not in stored
+
+    def _hash_sync(self, password: str) -> str:
+        salt = ''.join(secrets.choice(SALT_CHARS) for _ in range(SALT_LENGTH))
+        method = self.current_method
+        return f"{method}${salt}${self._derive(method, salt, password)}"
+
+    def _verify_sync(self, stored: str, password: str) -> bool:
+        if not stored:
+            return False
+        if self._is_legacy(stored):
+            candidate = hashlib.sha256(password.encode('utf-8')).hexdigest()
+            return hmac.compare_digest(stored, candidate)
+        try:
+            method, salt, expected = stored.split('$', 2)
+            return hmac.compare_digest(self._derive(method, salt, password), expected)
+        except ValueError:
+            return False
+
+    def needs_rehash(self, stored: str) -> bool:
+        """Indica se o hash foi gerado com algoritmo ou custo diferentes dos atuais"""
+        if not stored or self._is_legacy(stored):
+            return True
+        return stored.split('$', 1)[0] != self.current_method
+
+    # ------------------------------------------------------------------
+    # Execução no pool
+    # ------------------------------------------------------------------
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                        thread_name_prefix='password-hash')
+        return self._executor
+
+    def _submit(self, op: str, func, *args) -> Future:
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            metrics.inc('password_rejected_total', op=op)
+            raise PasswordServiceBusy("Muitas operações de senha pendentes")
+        submitted = time.perf_counter()
+
+        def task():
+            started = time.perf_counter()
+            metrics.observe('password_queue_seconds', started - submitted, op=op)
+            try:
+                return func(*args)
+            finally:
+                metrics.observe('password_hash_seconds', time.perf_counter() - started,
+                                op=op, method=self.method)
+                self._slots.release()
+
+        try:
+            return self._get_executor().submit(task)
+        except RuntimeError:
+            self._slots.release()
+            raise
+
+    def hash_async(self, password: str) -> Future:
+        return self._submit('hash', self._hash_sync, password)
+
+    def verify_async(self, stored: str, password: str) -> Future:
+        return self._submit('verify', self._verify_sync, stored, password)
+
+    def hash(self, password: str) -> str:
+        """Gera o hash da senha no pool (bloqueia até o resultado)"""
+        return self.hash_async(password).result()
+
+    def verify(self, stored: str, password: str) -> bool:
+        """Verifica a senha no pool (bloqueia até o resultado)"""
+        return self.verify_async(stored, password).result()
+
+    def verify_and_update(self, stored: str, password: str) -> Tuple[bool, Optional[str]]:
+        """Verifica a senha e, se os parâmetros mudaram, devolve um novo hash"""
+        if not self.verify(stored, password):
+            return False, None
+        if self.needs_rehash(stored):
+            return True, self.hash(password)
+        return True, None
+
+    def verify_dummy(self, password: str) -> Tuple[bool, Optional[str]]:
+        """Verificação de custo igual ao de uma senha errada, para usuários inexistentes
+
+        Sem ela o login de um nome desconhecido responde bem mais rápido e
+        revela quais nomes existem. O hash fixo é gerado uma vez, com os
+        parâmetros atuais.
+        """
+        if self._dummy_hash is None:
+            self._dummy_hash = self.hash(secrets.token_hex(16))
+        self.verify(self._dummy_hash, password)
+        return False, None
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+hasher = PasswordHasher.from_env()
+
+
+def hash_password(password: str) -> str:
+    return hasher.hash(password)
+
+
+def verify_password(stored: Optional[str], password: str) -> Tuple[bool, Optional[str]]:
+    """Atalho para hasher.verify_and_update; sem hash (usuário inexistente)
+    faz uma verificação de mesmo custo e recusa"""
+    if stored is None:
+        return hasher.verify_dummy(password)
+    return hasher.verify_and_update(stored, password)
@@ -1,9 +1,13 @@
 """
 Serviço de relatórios e métricas
 Versão simplificada usando apenas bibliotecas padrão do Python
+Totais e variações são calculados em centavos inteiros (db/money.py)
 """
 from datetime import datetime, timedelta
 
+from db.money import cents_of, from_cents, to_cents
+from services.metrics import metrics
+
 class ReportService:
     def __init__(self):
         pass
@@ -29,6 +33,7 @@ class ReportService:
         }
     
     @staticmethod
+    @metrics.timed('report_seconds', method='calculate_performance_from_data')
     def calculate_performance_from_data(balances, transactions):
         """Calcula métricas de performance a partir dos dados"""
         if not balances:
@@ -42,7 +47,7 @@ class ReportService:
         
         initial_balance = balances[0]['amount']
         current_balance = balances[-1]['amount']
-        profit_loss = current_balance - initial_balance
+        profit_loss = from_cents(cents_of(balances[-1]) - cents_of(balances[0]))
         profit_percentage = (profit_loss / initial_balance * 100) if initial_balance > 0 else 0
         
         return {
@@ -54,10 +59,17 @@ class ReportService:
         }
     
     @staticmethod
+    @metrics.timed('report_seconds', method='calculate_transactions_summary')
     def calculate_transactions_summary(transactions):
         """Calcula resumo das transações"""
-        total_deposits = sum(t['amount'] for t in transactions if t['type'] == 'deposit')
-        total_withdrawals = sum(t['amount'] for t in transactions if t['type'] == 'withdrawal')
+        deposits, withdrawals = [], []
+        for t in transactions:
+            if t['type'] == 'deposit':
+                deposits.append(cents_of(t))
+            elif t['type'] == 'withdrawal':
+                withdrawals.append(cents_of(t))
+        total_deposits = from_cents(sum(deposits))
+        total_withdrawals = from_cents(sum(withdrawals))
         
         return {
             'total_deposits': total_deposits,
@@ -66,6 +78,7 @@ class ReportService:
         }
     
     @staticmethod
+    @metrics.timed('report_seconds', method='get_chart_data')
     def get_chart_data(balances, days=30):
         """Retorna dados formatados para gráficos"""
         if not balances:
@@ -86,6 +99,7 @@ class ReportService:
         return chart_data
     
     @staticmethod
+    @metrics.timed('report_seconds', method='calculate_win_rate')
     def calculate_win_rate(balances):
         """Calcula taxa de vitória baseada no crescimento diário"""
         if len(balances) < 2:
@@ -101,6 +115,7 @@ class ReportService:
         return round((winning_days / total_days * 100), 2) if total_days > 0 else 0
     
     @staticmethod
+    @metrics.timed('report_seconds', method='get_weekly_stats')
     def get_weekly_stats(balances):
         """Obtém estatísticas semanais"""
         if not balances:
@@ -112,16 +127,14 @@ class ReportService:
         
         # Calcular crescimento semanal (últimos 7 dias)
         if len(balances) >= 7:
-            week_start = balances[-7]['amount']
-            week_end = balances[-1]['amount']
-            weekly_growth = week_end - week_start
+            weekly_growth = from_cents(cents_of(balances[-1]) - cents_of(balances[-7]))
         else:
             weekly_growth = 0
         
         # Encontrar melhor e pior dia
         daily_changes = []
         for i in range(1, len(balances)):
-            change = balances[i]['amount'] - balances[i-1]['amount']
+            change = from_cents(cents_of(balances[i]) - cents_of(balances[i-1]))
             daily_changes.append({
                 'date': balances[i]['date'],
                 'change': change
@@ -137,4 +150,48 @@ class ReportService:
             'weekly_growth': round(weekly_growth, 2),
             'best_day': best_day,
             'worst_day': worst_day
-        }
\ No newline at end of file
+        }
+
+    @staticmethod
+    @metrics.timed('report_seconds', method='calculate_balances')
+    def calculate_balances(balances):
+        """Linhas diárias do dashboard: saldo, depósitos, saques, lucro e % do dia
+        
+        O lucro do dia desconta as transações: saldo - saldo anterior -
+        depósitos + saques (o primeiro dia não tem lucro).
+        """
+        rows = []
+        previous = None
+        for balance in balances:
+            cents = cents_of(balance)
+            deposits = cents_of(balance, 'deposits')
+            withdrawals = cents_of(balance, 'withdrawals')
+            profit = cents - previous - deposits + withdrawals if previous is not None else 0
+            rows.append({
+                'id': balance['id'],
+                'date': balance['date'],
+                'day': balance.get('day'),
+                'current_balance': from_cents(cents),
+                'deposits': from_cents(deposits),
+                'withdrawals': from_cents(withdrawals),
+                'profit': from_cents(profit),
+                'win_percentage': round(profit / previous * 100, 2) if previous else 0.0
+            })
+            previous = cents
+        return rows
+    
+    @staticmethod
+    def summary(rows, current_balance):
+        """Totais do período a partir das linhas de calculate_balances"""
+        deposits = sum(to_cents(r['deposits']) for r in rows)
+        withdrawals = sum(to_cents(r['withdrawals']) for r in rows)
+        profit = sum(to_cents(r['profit']) for r in rows)
+        # Capital próprio: saldo atual sem o lucro acumulado
+        invested = to_cents(current_balance) - profit
+        return {
+            'current_balance': current_balance,
+            'deposits': from_cents(deposits),
+            'withdrawals': from_cents(withdrawals),
+            'profit': from_cents(profit),
+            'win_percentage': round(profit / invested * 100, 2) if invested > 0 else 0.0
+        }
@@ -4,41 +4,171 @@ console.log("Script carregado.");
 
 document.addEventListener('DOMContentLoaded', () => {
   // Funcionalidade de validação de data para saldo diário
+  // Os dias com saldo ficam em cache local (máscara de bits por mês) e são
+  // revalidados pela versão dos dados uma vez por carregamento da página;
+  // a verificação de cada data é feita localmente, sem requisição.
   const dateInput = document.getElementById('add-balance-date');
   const addForm  = document.getElementById('form-add-balance');
   const addBtn   = addForm && addForm.querySelector('button[type="submit"]');
   const msgDiv   = document.getElementById('daily-exists-msg');
 
   if (dateInput && addBtn && msgDiv) {
+    const cacheKey = addForm.dataset.cacheKey;
+    let occupied = null;
+
+    const readCache = () => {
+      try {
+        return JSON.parse(localStorage.getItem(cacheKey));
+      } catch (e) {
+        return null;
+      }
+    };
+
+    const showExists = (exists) => {
+      addBtn.disabled = exists;
+      msgDiv.style.display = exists ? 'block' : 'none';
+      msgDiv.textContent = exists ? 'Já existe saldo para esta data.' : '';
+    };
+
+    const isOccupied = (value) => {
+      const mask = occupied.months[value.slice(0, 7)] || 0;
+      return ((mask >> (parseInt(value.slice(8, 10), 10) - 1)) & 1) === 1;
+    };
+
+    const cached = cacheKey && readCache();
+    const headers = cached && cached.version ? { 'If-None-Match': `"${cached.version}"` } : {};
+    fetch(addForm.dataset.occupiedUrl, { headers, cache: 'no-cache' })
+      .then(res => {
+        if (res.status === 304 && cached) {
+          return cached;
+        }
+        return res.ok ? res.json() : Promise.reject(res.status);
+      })
+      .then(data => {
+        occupied = data;
+        try {
+          localStorage.setItem(cacheKey, JSON.stringify(data));
+        } catch (e) {
+          // Sem localStorage o conjunto vale apenas para esta página
+        }
+        if (dateInput.value) {
+          showExists(isOccupied(dateInput.value));
+        }
+      })
+      .catch(() => { occupied = null; });
+
     dateInput.addEventListener('change', () => {
-      fetch(`/check_daily?date=${dateInput.value}`)
+      if (!dateInput.value) {
+        showExists(false);
+        return;
+      }
+      if (occupied) {
+        showExists(isOccupied(dateInput.value));
+        return;
+      }
+      // Conjunto ainda não carregado: consulta pontual ao servidor
+      fetch(`${addForm.dataset.checkUrl}?date=${encodeURIComponent(dateInput.value)}`)
         .then(res => res.json())
-        .then(data => {
-          if (data.exists) {
-            addBtn.disabled = true;
-            msgDiv.style.display = 'block';
-            msgDiv.textContent = 'Já existe saldo para esta data.';
-          } else {
-            addBtn.disabled = false;
-            msgDiv.style.display = 'none';
-            msgDiv.textContent = '';
-          }
-        })
-        .catch(() => {
-          addBtn.disabled = false;
-          msgDiv.style.display = 'none';
-        });
+        .then(data => showExists(Boolean(data.exists)))
+        .catch(() => showExists(false));
     });
   }
 
-  // Confirmação para ações destrutivas
-  const deleteButtons = document.querySelectorAll('button[type="submit"]');
-  deleteButtons.forEach(button => {
-    if (button.textContent.includes('Excluir') || button.textContent.includes('Zerar')) {
-      button.addEventListener('click', (e) => {
-        const action = button.textContent.includes('Zerar') ? 'zerar toda a banca' : 'excluir este item';
-        if (!confirm(`Tem certeza que deseja ${action}? Esta ação não pode ser desfeita.`)) {
-          e.preventDefault();
+  // Confirmação para ações destrutivas (também nas linhas carregadas depois)
+  document.addEventListener('click', (e) => {
+    const button = e.target.closest('button[type="submit"]');
+    if (!button || !(button.textContent.includes('Excluir') || button.textContent.includes('Zerar'))) {
+      return;
+    }
+    const action = button.textContent.includes('Zerar') ? 'zerar toda a banca' : 'excluir este item';
+    if (!confirm(`Tem certeza que deseja ${action}? Esta ação não pode ser desfeita.`)) {
+      e.preventDefault();
+    }
+  });
+
+  // Tabelas de histórico paginadas: a página inicial vem no HTML e as
+  // seguintes são buscadas em /api/* ao rolar até o fim ou clicar no botão
+  const currency = new Intl.NumberFormat('pt-BR', { style: 'currency', currency: 'BRL' });
+
+  const cell = (text) => {
+    const td = document.createElement('td');
+    td.textContent = text;
+    return td;
+  };
+
+  const actionsCell = (item) => {
+    const td = document.createElement('td');
+    const edit = document.createElement('a');
+    edit.href = item.edit_url;
+    edit.className = 'btn btn-sm btn-warning';
+    edit.textContent = 'Editar';
+    const form = document.createElement('form');
+    form.action = item.delete_url;
+    form.method = 'post';
+    form.style.display = 'inline';
+    const remove = document.createElement('button');
+    remove.type = 'submit';
+    remove.className = 'btn btn-sm btn-danger';
+    remove.textContent = 'Excluir';
+    form.appendChild(remove);
+    td.append(edit, ' ', form);
+    return td;
+  };
+
+  const rowRenderers = {
+    history: (item) => [
+      cell(item.date),
+      cell(currency.format(item.current_balance)),
+      cell(currency.format(item.deposits)),
+      cell(currency.format(item.profit)),
+      cell(currency.format(item.withdrawals)),
+      cell(`${item.win_percentage}%`),
+      actionsCell(item)
+    ],
+    transactions: (item) => [
+      cell(item.date),
+      cell(item.type === 'deposit' ? 'Depósito' : 'Saque'),
+      cell(currency.format(item.amount)),
+      actionsCell(item)
+    ]
+  };
+
+  document.querySelectorAll('tbody[data-url]').forEach(tbody => {
+    const container = tbody.closest('.lazy-table');
+    const button = container && container.querySelector('.load-more');
+    const render = rowRenderers[tbody.dataset.kind];
+    let loading = false;
+
+    const loadMore = () => {
+      const next = tbody.dataset.next;
+      if (!next || loading) {
+        return;
+      }
+      loading = true;
+      fetch(`${tbody.dataset.url}?after=${encodeURIComponent(next)}`)
+        .then(res => res.ok ? res.json() : Promise.reject(res.status))
+        .then(page => {
+          page.items.forEach(item => {
+            const tr = document.createElement('tr');
+            tr.append(...render(item));
+            tbody.appendChild(tr);
+          });
+          tbody.dataset.next = page.next || '';
+          if (!page.next && button) {
+            button.remove();
+          }
+        })
+        .catch(() => {})
+        .finally(() => { loading = false; });
+    };
+
+    if (button) {
+      button.addEventListener('click', loadMore);
+    }
+    if (container) {
+      container.addEventListener('scroll', () => {
+        if (container.scrollTop + container.clientHeight >= container.scrollHeight - 40) {
+          loadMore();
         }
       });
     }
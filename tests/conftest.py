@@ -0,0 +1,49 @@
+"""
+Aplicação de teste: blueprints do projeto sobre um data.json temporário
+"""
+import os
+
+import pytest
+
+import db
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    from flask import Flask
+    from auth.auth import auth_bp
+    from dashboard.dashboard import dashboard_bp
+    from utils import register_filters
+
+    # get_db() usa caminhos relativos e guarda uma instância por caminho
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(db, '_instances', {})
+
+    app = Flask('tests',
+                template_folder=os.path.join(ROOT_DIR, 'templates'),
+                static_folder=os.path.join(ROOT_DIR, 'static'))
+    app.config.update(SECRET_KEY='tests', TESTING=True)
+    app.register_blueprint(auth_bp)
+    app.register_blueprint(dashboard_bp)
+    register_filters(app)
+    db.init_app(app)
+    return app
+
+
+@pytest.fixture
+def user_id(app):
+    from db.models import User
+    users = User(db.get_db())
+    users.create_user('ana', 'segredo')
+    return users.get_user_by_username('ana')['id']
+
+
+@pytest.fixture
+def client(app, user_id):
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = user_id
+        sess['username'] = 'ana'
+    return client
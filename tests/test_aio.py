@@ -0,0 +1,48 @@
+import asyncio
+
+from db.aio import AsyncDatabase
+from db.models import Balance, Database
+
+
+def test_failed_job_in_batch_is_rolled_back(tmp_path):
+    path = str(tmp_path / 'data.json')
+
+    def partial_then_fail(db):
+        Balance(db).add_balance(1, '2024-01-02', 50)
+        raise RuntimeError("falha no meio da gravação")
+
+    async def scenario():
+        async with AsyncDatabase(Database(path)) as adb:
+            results = await asyncio.gather(
+                adb.balances.add_balance(1, '2024-01-01', 10),
+                adb.write(partial_then_fail, adb.db),
+                adb.balances.add_balance(1, '2024-01-03', 30),
+                return_exceptions=True)
+            return adb.db, results
+
+    db, results = asyncio.run(scenario())
+    assert results[0] is True and results[2] is True
+    assert isinstance(results[1], RuntimeError)
+    expected = [('2024-01-01', 10.0), ('2024-01-03', 30.0)]
+    assert [(b['date'], b['amount']) for b in Balance(db).get_balances_by_user(1)] == expected
+    assert [e['data']['date'] for e in db.events.events(1)] == ['2024-01-01', '2024-01-03']
+    reloaded = Database(path)
+    assert [(b['date'], b['amount']) for b in Balance(reloaded).get_balances_by_user(1)] == expected
+
+
+def test_savepoint_restores_users_and_extra(tmp_path):
+    db = Database(str(tmp_path / 'data.json'))
+    with db.write() as tx:
+        tx.set_extra('note', 'a')
+        tx.insert_user({'id': 1, 'username': 'ana', 'password': 'x'})
+        try:
+            with db.savepoint():
+                tx.set_extra('note', 'b')
+                tx.insert_user({'id': 2, 'username': 'bia', 'password': 'x'})
+                tx.update_user(tx.users[0], password='y')
+                raise ValueError
+        except ValueError:
+            pass
+    assert db.snapshot().as_dict()['note'] == 'a'
+    assert [(u['username'], u['password']) for u in db.snapshot().users] == [('ana', 'x')]
+    assert set(db.users_by_name()) == {'ana'}
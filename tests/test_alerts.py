@@ -0,0 +1,83 @@
+import db
+from db.models import Balance, Database, Goal, Transaction, User
+from services.commands import CommandService
+
+
+def _kinds(database, user_id=1):
+    return [n['kind'] for n in database.alerts.pending(user_id)]
+
+
+def test_goal_alert_fires_once_when_crossed(tmp_path):
+    database = Database(str(tmp_path / 'data.json'))
+    Goal(database).add_goal(1, 500, 'Reserva')
+    Balance(database).add_balance(1, '2024-01-01', 400)
+    assert _kinds(database) == []
+
+    Transaction(database).add_transaction(1, '2024-01-02', 'deposit', 150)
+    assert _kinds(database) == ['goal_reached']
+    assert 'Reserva' in database.alerts.pending(1)[0]['message']
+
+    # Continuar acima da meta não gera outro alerta
+    Transaction(database).add_transaction(1, '2024-01-03', 'deposit', 10)
+    assert _kinds(database) == ['goal_reached']
+
+
+def test_below_rule_only_on_crossing(tmp_path):
+    database = Database(str(tmp_path / 'data.json'))
+    Balance(database).add_balance(1, '2024-01-01', 300)
+    assert database.alerts.add_rule(1, 'below', 200)
+    Transaction(database).add_transaction(1, '2024-01-02', 'withdrawal', 50)
+    assert _kinds(database) == []
+
+    Transaction(database).add_transaction(1, '2024-01-03', 'withdrawal', 100)
+    Transaction(database).add_transaction(1, '2024-01-04', 'withdrawal', 10)
+    assert _kinds(database) == ['below']
+    assert database.alerts.pending(1)[0]['amount'] == 150.0
+
+
+def test_drawdown_tracks_peak(tmp_path):
+    database = Database(str(tmp_path / 'data.json'))
+    Balance(database).add_balance(1, '2024-01-01', 100)
+    assert database.alerts.add_rule(1, 'drawdown', 10)['peak'] == 100.0
+    Transaction(database).add_transaction(1, '2024-01-02', 'deposit', 100)
+    assert database.alerts.get_rules(1)[0]['peak'] == 200.0
+
+    Transaction(database).add_transaction(1, '2024-01-03', 'withdrawal', 15)
+    assert _kinds(database) == []
+    Transaction(database).add_transaction(1, '2024-01-04', 'withdrawal', 10)
+    assert _kinds(database) == ['drawdown']
+    assert 'pico de R$ 200,00' in database.alerts.pending(1)[0]['message']
+
+
+def test_invalid_rules_are_rejected(tmp_path):
+    database = Database(str(tmp_path / 'data.json'))
+    assert database.alerts.add_rule(1, 'sideways', 10) is None
+    assert database.alerts.add_rule(1, 'drawdown', 150) is None
+    assert database.alerts.get_rules(1) == []
+
+
+def test_outbox_dispatch_marks_delivered(tmp_path):
+    database = Database(str(tmp_path / 'data.json'))
+    User(database).create_user('ana', 'x')
+    database.alerts.add_rule(1, 'above', 100)
+    Balance(database).add_balance(1, '2024-01-01', 150)
+
+    service = CommandService(database)
+    first = service.execute('alerts', {'user': 'ana', 'ack': True})
+    assert [n['kind'] for n in first['alerts']] == ['above']
+    assert service.execute('alerts', {'user': 'ana'})['alerts'] == []
+
+    # A outbox entregue continua gravada e sobrevive à releitura
+    reloaded = Database(database.db_path)
+    assert reloaded.alerts.pending(1) == []
+    assert reloaded.snapshot().rows('outbox', 1)[0]['delivered_at']
+
+
+def test_dashboard_delivers_pending_alerts(client, user_id):
+    database = db.get_db()
+    database.alerts.add_rule(user_id, 'above', 100)
+    Balance(database).add_balance(user_id, '2024-01-01', 150)
+
+    page = client.get('/dashboard').get_data(as_text=True)
+    assert 'acima de R$ 100,00' in page
+    assert database.alerts.pending(user_id) == []
@@ -0,0 +1,102 @@
+import os
+
+from db.models import Balance, Database, Transaction, iter_history
+from db.records import RECORD_TYPES
+
+
+def _database(tmp_path):
+    database = Database(str(tmp_path / 'data.json'))
+    database.events.interval = 5
+    for month in range(1, 5):
+        day = f"2024-{month:02d}-10"
+        Balance(database).add_balance(1, day, 100 * month)
+        Transaction(database).add_transaction(1, day, 'deposit', 10)
+        Transaction(database).add_transaction(1, day, 'withdrawal', 4)
+    return database
+
+
+def test_compact_archives_events_covered_by_checkpoint(tmp_path):
+    database = _database(tmp_path)
+    expected = database.events.daily_balances(1)
+    last_seq = database.events.last_seq(1)
+    checkpoint_seq = database.events.checkpoint(1)['seq']
+    assert checkpoint_seq == 10
+
+    result = database.archive.compact('2024-03-01')
+    assert result['events'] == checkpoint_seq
+    assert [e['seq'] for e in database.events.events(1)] == list(range(checkpoint_seq + 1, last_seq + 1))
+    assert [e['seq'] for e in database.archive.archived_events(1)] == list(range(1, checkpoint_seq + 1))
+    assert database.events.daily_balances(1) == expected
+
+    # Recarregado do disco, o estado sai do checkpoint e dos eventos restantes
+    reloaded = Database(database.db_path)
+    assert reloaded.events.daily_balances(1) == expected
+    assert reloaded.archive.compact('2024-03-01')['events'] == 0
+
+
+def test_sequence_continues_after_all_events_are_archived(tmp_path):
+    database = _database(tmp_path)
+    for day in ('2024-04-11', '2024-04-12', '2024-04-13'):
+        Transaction(database).add_transaction(1, day, 'deposit', 1)
+    assert database.events.last_seq(1) == 15
+    database.archive.compact('2024-01-01')
+    assert database.events.events(1) == []
+    assert database.events.last_seq(1) == 15
+
+    Transaction(database).add_transaction(1, '2024-04-14', 'deposit', 1)
+    assert [e['seq'] for e in database.events.events(1)] == [16]
+    assert Balance(database).get_balance_by_date(1, '2024-04-14')['amount'] == 404.0
+
+
+def test_reads_do_not_restore_archived_months(tmp_path):
+    database = _database(tmp_path)
+    database.archive.compact('2024-03-01')
+    months = database.archive.archived_months(1)
+    assert months == ['2024-01', '2024-02']
+    version = database.version
+
+    assert Balance(database).get_balance_by_date(1, '2024-02-10')['amount'] == 200.0
+    assert Balance(database).get_balance_by_date(1, '2024-02-11') is None
+    assert len(Transaction(database).get_transactions_by_date(1, '2024-01-10')) == 2
+    assert database.archive.archived_months(1) == months
+    assert database.version == version
+
+    # Editar continua devolvendo o mês para os dados ativos
+    Balance(database).add_balance(1, '2024-02-10', 250)
+    assert database.archive.archived_months(1) == ['2024-01']
+
+
+def test_previous_balance_spans_hot_rows_and_archive(tmp_path):
+    database = _database(tmp_path)
+    balances = Balance(database)
+    assert balances.get_previous_balance(1, '2024-01-10') is None
+    assert balances.get_previous_balance(1, '2024-03-10')['date'] == '2024-02-10'
+    database.archive.compact('2024-03-01')
+    assert balances.get_previous_balance(1, '2024-03-10')['date'] == '2024-02-10'
+    assert balances.get_previous_balance(1, '2024-04-11')['date'] == '2024-04-10'
+    assert balances.get_previous_balance(1, '2024-01-11')['date'] == '2024-01-10'
+
+
+def test_iter_history_yields_records_from_archive(tmp_path):
+    database = _database(tmp_path)
+    database.archive.compact('2024-03-01')
+    for table in ('balances', 'transactions'):
+        rows = list(iter_history(database, table, 1))
+        assert {type(row) for row in rows} == {RECORD_TYPES[table]}
+        assert [row['date'][:7] for row in rows][0] == '2024-01'
+
+
+def test_failed_save_keeps_restored_segment(tmp_path, monkeypatch):
+    database = _database(tmp_path)
+    database.archive.compact('2024-03-01')
+    segment = database.archive.segment_path(1, '2024-01')
+    transaction_id = Transaction(database).get_transactions_by_date(1, '2024-01-10')[0]['id']
+
+    monkeypatch.setattr(database, '_save_data', lambda: False)
+    assert Transaction(database).update_transaction(transaction_id, 1, '2024-01-10', 'deposit', 12)
+    assert os.path.exists(segment)
+
+    # O arquivo ainda é o anterior: o mês continua arquivado e completo
+    reloaded = Database(database.db_path)
+    assert reloaded.archive.archived_months(1) == ['2024-01', '2024-02']
+    assert len(Transaction(reloaded).get_transactions_by_date(1, '2024-01-10')) == 2
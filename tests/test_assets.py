@@ -0,0 +1,67 @@
+import os
+
+from flask import Flask
+
+from services.assets import VENDOR, AssetService, accepted_encodings, fingerprint, register_assets
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _service(tmp_path):
+    static = tmp_path / 'static'
+    static.mkdir()
+    (static / 'script.js').write_text('console.log("ok");\n' * 64)
+    return AssetService(str(static))
+
+
+def test_startup_only_reads_the_manifest(tmp_path):
+    service = _service(tmp_path)
+    app = Flask('tests', static_folder=service.static_dir)
+    register_assets(app, service)
+    assert not os.path.exists(service.build_dir)
+    with app.test_request_context():
+        assert service.url('script.js') == '/static/script.js'
+
+
+def test_build_serves_hashed_and_compressed(tmp_path):
+    service = _service(tmp_path)
+    summary = service.build()
+    hashed = fingerprint('script.js', (tmp_path / 'static' / 'script.js').read_bytes())
+    assert service.manifest['script.js'] == hashed
+
+    app = Flask('tests', static_folder=service.static_dir)
+    register_assets(app, service)
+    response = app.test_client().get(f'/assets/{hashed}', headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'immutable' in response.headers['Cache-Control']
+    assert sorted(summary['missing_vendor']) == sorted(VENDOR)
+
+
+def test_vendor_libraries_are_versioned():
+    for name in VENDOR:
+        assert os.path.exists(os.path.join(ROOT_DIR, 'static', *name.split('/'))), name
+
+
+def test_vendor_served_locally_without_manifest(tmp_path):
+    service = _service(tmp_path)
+    vendor = tmp_path / 'static' / 'vendor'
+    vendor.mkdir()
+    (vendor / 'chart.js').write_text('/* chart */')
+    app = Flask('tests', static_folder=service.static_dir)
+    with app.test_request_context():
+        assert service.url('vendor/chart.js') == '/static/vendor/chart.js'
+        assert service.url('vendor/popper.min.js') == VENDOR['vendor/popper.min.js']
+
+
+def test_refused_encodings_are_not_served(tmp_path):
+    assert accepted_encodings('gzip;q=0, br') == {'br'}
+    assert accepted_encodings('gzip; q=0.5, br;q=0.0') == {'gzip'}
+
+    service = _service(tmp_path)
+    service.build()
+    hashed = service.manifest['script.js']
+    app = Flask('tests', static_folder=service.static_dir)
+    register_assets(app, service)
+    response = app.test_client().get(f'/assets/{hashed}', headers={'Accept-Encoding': 'gzip;q=0'})
+    assert 'Content-Encoding' not in response.headers
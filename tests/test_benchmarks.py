@@ -0,0 +1,28 @@
+import json
+
+from benchmarks import run
+
+ARGS = ['--users', '1', '--days', '10', '--repeat', '1', '--warmup', '0']
+
+
+def test_unavailable_scenario_fails_the_run(monkeypatch, capsys):
+    def unavailable(ctx):
+        raise run.ScenarioUnavailable("aplicação web indisponível")
+    monkeypatch.setitem(run.SCENARIOS, 'dashboard', unavailable)
+    assert run.main(ARGS + ['--scenario', 'dashboard']) == 2
+    assert 'dashboard              FALHOU' in capsys.readouterr().out
+
+
+def test_baseline_scenario_without_result_fails_the_run(tmp_path):
+    baseline = tmp_path / 'baseline.json'
+    baseline.write_text(json.dumps({'results': {
+        'report': {'median_ms': 1000.0},
+        'retired': {'median_ms': 1.0}
+    }}))
+    assert run.main(ARGS + ['--scenario', 'report', '--baseline', str(baseline)]) == 0
+    assert run.main(ARGS + ['--scenario', 'report', '--scenario', 'forecast',
+                            '--baseline', str(baseline)]) == 0
+
+    output = tmp_path / 'out.json'
+    assert run.main(ARGS + ['--baseline', str(baseline), '--output', str(output)]) == 2
+    assert json.loads(output.read_text())['failures'] == ['retired']
@@ -0,0 +1,69 @@
+from db.models import Balance, Database, User
+from services.commands import CommandService
+
+
+def _balances(db, user_id):
+    return [(b['date'], b['amount'], b['deposits'], b['withdrawals'])
+            for b in Balance(db).get_balances_by_user(user_id)]
+
+
+def test_batch_projects_back_dated_lines_once_per_user(tmp_path):
+    lines = ['add-balance --user ana --date 2024-01-10 --amount 100']
+    lines += [f'add-transaction --user ana --date 2024-01-{day:02d} --type deposit --amount {day}'
+              for day in (20, 5, 15, 12, 25, 3)]
+    lines += ['add-transaction --user ana --date 2024-01-15 --type withdrawal --amount 4']
+
+    batch_db = Database(str(tmp_path / 'batch.json'))
+    User(batch_db).create_user('ana', 'x')
+    summary = CommandService(batch_db).run_batch(lines)
+    assert summary['failed'] == 0
+
+    single_db = Database(str(tmp_path / 'single.json'))
+    User(single_db).create_user('ana', 'x')
+    service = CommandService(single_db)
+    for line in lines:
+        service.run_batch([line])
+
+    user_id = User(batch_db).get_user_by_username('ana')['id']
+    assert _balances(batch_db, user_id) == _balances(single_db, user_id)
+    assert _balances(batch_db, user_id)[-1] == ('2024-01-25', 168.0, 25.0, 0.0)
+    assert _balances(Database(str(tmp_path / 'batch.json')), user_id) == _balances(batch_db, user_id)
+
+
+def test_batch_flushes_projection_before_reading_commands(tmp_path):
+    db = Database(str(tmp_path / 'data.json'))
+    User(db).create_user('ana', 'x')
+    summary = CommandService(db).run_batch([
+        'add-balance --user ana --date 2024-01-01 --amount 10',
+        'add-transaction --user ana --date 2024-01-02 --type deposit --amount 5',
+        'report --user ana',
+    ])
+    assert summary['failed'] == 0
+    assert summary['results'][-1]['result']['performance']['current_balance'] == 15.0
+
+
+def test_failed_line_rolls_back_its_partial_writes(tmp_path, monkeypatch):
+    from db.models import Goal, Transaction
+    from services import commands
+
+    def half_done(service, args):
+        user_id = service.resolve_user(args)['id']
+        Goal(service.db).add_goal(user_id, 500)
+        Transaction(service.db).add_transaction(user_id, '2024-01-03', 'deposit', 99)
+        raise commands.CommandError("falhou no meio")
+
+    # set-goal passa a gravar parte do trabalho e falhar em seguida
+    monkeypatch.setitem(commands.COMMANDS, 'set-goal', half_done)
+
+    db = Database(str(tmp_path / 'data.json'))
+    User(db).create_user('ana', 'x')
+    summary = CommandService(db).run_batch([
+        'add-balance --user ana --date 2024-01-01 --amount 10',
+        'set-goal --user ana --amount 500',
+        'add-transaction --user ana --date 2024-01-02 --type deposit --amount 5',
+    ])
+    assert (summary['succeeded'], summary['failed']) == (2, 1)
+    assert Goal(db).get_goals_by_user(1) == []
+    assert [t['amount'] for t in Transaction(db).get_transactions_by_user(1)] == [5.0]
+    assert _balances(db, 1) == [('2024-01-01', 10.0, 0.0, 0.0), ('2024-01-02', 15.0, 5.0, 0.0)]
+    assert _balances(Database(db.db_path), 1) == _balances(db, 1)
@@ -0,0 +1,79 @@
+import os
+import shutil
+import socket
+import tempfile
+import threading
+
+import pytest
+
+from db.models import Balance, Database, User
+from services import daemon
+
+pytestmark = pytest.mark.skipif(not daemon.available(), reason="sem sockets Unix")
+
+
+@pytest.fixture
+def running(tmp_path):
+    # Caminhos de socket Unix têm limite de ~100 caracteres
+    directory = tempfile.mkdtemp(prefix='meta_')
+    db_path = str(tmp_path / 'data.json')
+    User(Database(db_path)).create_user('ana', 'x')
+    server = daemon.CommandDaemon(db_path, os.path.join(directory, 'cli.sock'))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    thread.join()
+    shutil.rmtree(directory, ignore_errors=True)
+
+
+def test_commands_run_on_the_resident_database(running):
+    ping = daemon.send_command(running.socket_path, running.db_path, 'ping', {})
+    assert ping['status'] == 0 and ping['output']['pid'] == os.getpid()
+    assert oct(os.stat(running.socket_path).st_mode & 0o777) == '0o600'
+
+    response = daemon.send_command(running.socket_path, running.db_path, 'add-balance',
+                                   {'user': 'ana', 'date': '2024-01-01', 'amount': '100'})
+    assert response['status'] == 0
+    # Gravado no arquivo, não só na memória do daemon
+    assert Balance(Database(running.db_path)).get_balance_by_date(1, '2024-01-01')['amount'] == 100.0
+
+    failed = daemon.send_command(running.socket_path, running.db_path, 'report', {'user': 'ninguem'})
+    assert failed['status'] == 1 and 'error' in failed['output']
+
+
+def test_batch_protocol_sends_lines(running):
+    response = daemon.send_command(running.socket_path, running.db_path, 'batch', {'user': 'ana'}, lines=[
+        'add-balance --date 2024-01-01 --amount 10',
+        'add-transaction --date 2024-01-02 --type deposit --amount 5',
+        'add-transaction --date 2024-01-02 --type bogus --amount 5',
+    ])
+    assert response['status'] == 1
+    assert response['output']['succeeded'] == 2 and response['output']['failed'] == 1
+    assert running.db.snapshot().rows('balances', 1)[-1]['amount'] == 15.0
+
+
+def test_other_database_falls_back_to_direct_execution(running, tmp_path):
+    assert daemon.send_command(running.socket_path, str(tmp_path / 'outro.json'), 'ping', {}) is None
+    assert daemon.send_command(str(tmp_path / 'nada.sock'), running.db_path, 'ping', {}) is None
+
+
+def test_invalid_request_gets_an_error_line(running):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(running.socket_path)
+        sock.sendall(b'{"args": {}}\nnot json\n')
+        with sock.makefile('rb') as reader:
+            assert b'"status": 2' in reader.readline()
+            assert b'"status": 2' in reader.readline()
+
+
+def test_second_daemon_refuses_live_socket_and_replaces_stale_one(running, tmp_path):
+    with pytest.raises(RuntimeError):
+        daemon.CommandDaemon(running.db_path, running.socket_path)
+
+    stale = os.path.join(os.path.dirname(running.socket_path), 'stale.sock')
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.bind(stale)
+    server = daemon.CommandDaemon(running.db_path, stale)
+    server.server_close()
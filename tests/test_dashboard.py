@@ -0,0 +1,128 @@
+import io
+
+import db
+from db.models import Balance, Goal, Transaction
+
+
+def test_dashboard_renders_empty(client):
+    response = client.get('/dashboard')
+    assert response.status_code == 200
+    assert 'Saldo Atual' in response.get_data(as_text=True)
+
+
+def test_dashboard_requires_login(app):
+    response = app.test_client().get('/dashboard')
+    assert response.status_code == 302
+    assert '/login' in response.headers['Location']
+
+
+def test_import_csv(client, user_id):
+    csv_data = (
+        "date,kind,type,amount,deposits,withdrawals\n"
+        "2024-01-01,balance,,100.00,,\n"
+        "2024-01-02,transaction,deposit,50.10,,\n"
+        "2024-01-03,transaction,withdrawal,20.00,,\n"
+        "2024-01-04,transaction,bogus,1,,\n"
+    )
+    response = client.post('/import', data={
+        'file': (io.BytesIO(csv_data.encode('utf-8')), 'extrato.csv'),
+        'format': 'csv'
+    }, content_type='multipart/form-data', follow_redirects=True)
+    assert response.status_code == 200
+    page = response.get_data(as_text=True)
+    assert 'Importação concluída: 1 saldo(s) e 2 transação(ões).' in page
+    assert '1 linha(s) com erro' in page
+
+    balances = Balance(db.get_db()).get_balances_by_user(user_id)
+    assert [(b['date'], b['amount']) for b in balances] == [
+        ('2024-01-01', 100.0), ('2024-01-02', 150.1), ('2024-01-03', 130.1)]
+    assert len(Transaction(db.get_db()).get_transactions_by_user(user_id)) == 2
+
+
+def test_import_strict_discards_everything(client, user_id):
+    csv_data = "date,type,amount\n2024-01-02,deposit,10\n2024-01-03,deposit,abc\n"
+    response = client.post('/import', data={
+        'file': (io.BytesIO(csv_data.encode('utf-8')), 'extrato.csv'),
+        'strict': '1'
+    }, content_type='multipart/form-data', follow_redirects=True)
+    assert 'Importação cancelada' in response.get_data(as_text=True)
+    assert Transaction(db.get_db()).get_transactions_by_user(user_id) == []
+
+
+def test_import_reports_non_finite_amount_as_row_error(client, user_id):
+    csv_data = ("date,type,amount\n2024-01-02,deposit,10\n2024-01-03,deposit,nan\n"
+                "2024-01-04,withdrawal,1e400\n")
+    response = client.post('/import', data={
+        'file': (io.BytesIO(csv_data.encode('utf-8')), 'extrato.csv')
+    }, content_type='multipart/form-data', follow_redirects=True)
+    assert response.status_code == 200
+    assert '2 linha(s) com erro' in response.get_data(as_text=True)
+    assert [t['amount'] for t in Transaction(db.get_db()).get_transactions_by_user(user_id)] == [10.0]
+
+
+def test_import_without_file(client):
+    response = client.post('/import', data={}, follow_redirects=True)
+    assert 'Selecione um arquivo' in response.get_data(as_text=True)
+
+
+def test_balance_and_transaction_forms(client, user_id):
+    client.post('/add_balance', data={'date': '2024-03-01', 'current_balance': '200'})
+    client.post('/add_transaction', data={'date': '2024-03-02', 'type': 'deposit', 'amount': '25.5'})
+    client.post('/add_transaction', data={'date': '2024-03-02', 'type': 'withdrawal', 'amount': '0'})
+    balances = Balance(db.get_db()).get_balances_by_user(user_id)
+    assert [(b['date'], b['amount']) for b in balances] == [('2024-03-01', 200.0), ('2024-03-02', 225.5)]
+
+    tx = Transaction(db.get_db()).get_transactions_by_user(user_id)[0]
+    assert client.get(f"/edit_transaction/{tx['id']}").status_code == 200
+    client.post(f"/edit_transaction/{tx['id']}", data={'date': '2024-03-02', 'type': 'deposit', 'amount': '30'})
+    assert Balance(db.get_db()).get_balance_by_date(user_id, '2024-03-02')['amount'] == 230.0
+
+    first = balances[0]
+    assert client.get(f"/edit_balance/{first['id']}").status_code == 200
+    client.post(f"/edit_balance/{first['id']}", data={'date': '2024-03-01', 'current_balance': '100'})
+    assert Balance(db.get_db()).get_balance_by_date(user_id, '2024-03-02')['amount'] == 130.0
+
+    client.post(f"/delete_transaction/{tx['id']}")
+    assert Transaction(db.get_db()).get_transactions_by_user(user_id) == []
+
+    page = client.get('/dashboard').get_data(as_text=True)
+    assert 'R$ 100,00' in page
+
+
+def test_meta_predict_and_reset(client, user_id):
+    for day, amount in (('2024-05-01', '100'), ('2024-05-02', '110'), ('2024-05-03', '120')):
+        client.post('/add_balance', data={'date': day, 'current_balance': amount})
+    client.post('/update_meta', data={'meta': '150'})
+    assert Goal(db.get_db()).get_goal(user_id)['target_amount'] == 150.0
+
+    page = client.get('/dashboard').get_data(as_text=True)
+    assert '80.0%' in page
+    assert '06/05/2024' in page
+
+    response = client.post('/predict', data={'target_value': '140'}, follow_redirects=True)
+    assert '05/05/2024' in response.get_data(as_text=True)
+
+    client.post('/reset')
+    assert Balance(db.get_db()).get_balances_by_user(user_id) == []
+    assert Goal(db.get_db()).get_goal(user_id) is None
+
+
+def test_dashboard_lists_every_goal(client, user_id):
+    database = db.get_db()
+    Balance(database).add_balance(user_id, '2024-01-01', 100)
+    Balance(database).add_balance(user_id, '2024-01-02', 200)
+    client.post('/add_goal', data={'description': 'Reserva', 'target_amount': '150'})
+    client.post('/add_goal', data={'description': 'Viagem', 'target_amount': '1000',
+                                   'target_date': '2024-01-03'})
+    assert client.post('/add_goal', data={'target_amount': 'abc'}).status_code == 302
+    goals = Goal(database).get_goals_by_user(user_id)
+    assert [g['description'] for g in goals] == ['Reserva', 'Viagem']
+
+    page = client.get('/dashboard').get_data(as_text=True)
+    assert 'Reserva' in page and 'Viagem' in page
+    assert 'Meta alcançada' in page
+    assert '03/01/2024' in page and 'Atrasada' in page
+
+    client.post(f"/delete_goal/{goals[0]['id']}")
+    page = client.get('/dashboard').get_data(as_text=True)
+    assert 'Reserva' not in page and 'Viagem' in page
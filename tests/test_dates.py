@@ -0,0 +1,58 @@
+import json
+from datetime import date, timedelta
+
+from db.dates import add_day_ordinals, day_of, day_ordinal, to_date
+from db.models import Balance, Database, Transaction
+from services.forecast_engine import ForecastEngine
+
+
+def test_day_ordinal_accepts_both_formats():
+    assert day_ordinal('2024-03-01') == date(2024, 3, 1).toordinal()
+    assert day_ordinal('2024-03-01 23:59:59') == day_ordinal('2024-03-01')
+    assert to_date(day_of({'date': '2024-03-01'})) == date(2024, 3, 1)
+    # O campo gravado prevalece sobre a data em texto
+    assert day_of({'date': '2024-03-01', 'day': 5}) == 5
+
+
+def test_add_day_ordinals_skips_filled_and_invalid():
+    rows = [{'date': '2024-01-02'}, {'date': '2024-01-03', 'day': 1}, {'date': 'ontem'}, {}]
+    assert add_day_ordinals(rows) == 1
+    assert rows[0]['day'] == day_ordinal('2024-01-02')
+    assert rows[1]['day'] == 1 and 'day' not in rows[2]
+
+
+def test_writes_store_day_and_invalid_dates_are_rejected(tmp_path):
+    database = Database(str(tmp_path / 'data.json'))
+    assert Balance(database).add_balance(1, '2024-01-10', 100)
+    assert Transaction(database).add_transaction(1, '2024-01-11', 'deposit', 5)
+    assert not Transaction(database).add_transaction(1, '2024-02-31', 'deposit', 5)
+    assert [t['day'] for t in Transaction(database).get_transactions_by_user(1)] == [day_ordinal('2024-01-11')]
+    assert Balance(database).get_balances_by_user(1)[0]['day'] == day_ordinal('2024-01-10')
+
+
+def test_legacy_file_gets_day_on_load(tmp_path):
+    path = tmp_path / 'data.json'
+    path.write_text(json.dumps({
+        'users': [],
+        'balances': [{'id': 1, 'user_id': 1, 'date': '2024-01-10', 'amount': 100.0,
+                      'deposits': 0.0, 'withdrawals': 0.0}],
+        'transactions': [{'id': 1, 'user_id': 1, 'date': '2024-01-10 08:30:00',
+                          'type': 'deposit', 'amount': 5.0}],
+    }))
+    database = Database(str(path))
+    assert database.snapshot().rows('balances', 1)[0]['day'] == day_ordinal('2024-01-10')
+    assert database.snapshot().rows('transactions', 1)[0]['day'] == day_ordinal('2024-01-10')
+
+
+def test_weekly_recommendation_reads_both_date_formats():
+    today = date.today()
+    transactions = [
+        {'type': 'deposit', 'amount': 100.0, 'date': (today - timedelta(days=2)).isoformat()},
+        {'type': 'deposit', 'amount': 50.0,
+         'date': (today - timedelta(days=3)).strftime('%Y-%m-%d %H:%M:%S')},
+        {'type': 'deposit', 'amount': 999.0, 'date': (today - timedelta(days=60)).isoformat()},
+        {'type': 'withdrawal', 'amount': 10.0, 'date': today.isoformat()},
+    ]
+    value, message = ForecastEngine().get_weekly_recommendation(transactions)
+    assert value == round(150.0 / 30 * 7 * 0.3, 2)
+    assert message == "Baseado em 2 depósitos"
@@ -0,0 +1,34 @@
+import db
+from db.models import Balance, Transaction
+from services.exporter import ExportService
+
+
+def _seed(user_id):
+    database = db.get_db()
+    for day in ('2024-01-10', '2024-02-10', '2024-03-10'):
+        Balance(database).add_balance(user_id, day, 100)
+        Transaction(database).add_transaction(user_id, day, 'deposit', 5)
+    database.archive.compact('2024-03-01', user_id)
+    return database
+
+
+def test_export_merges_archived_and_hot_rows_in_order(app, user_id):
+    database = _seed(user_id)
+    assert database.archive.archived_months(user_id) == ['2024-01', '2024-02']
+
+    records = ExportService.iter_records(database, user_id, 'all', start='2024-02-01')
+    assert iter(records) is records
+    assert [(r['kind'], r['date']) for r in records] == [
+        ('transaction', '2024-02-10'), ('balance', '2024-02-10'),
+        ('transaction', '2024-03-10'), ('balance', '2024-03-10')]
+    # Ler o arquivo não devolve os meses para os dados ativos
+    assert database.archive.archived_months(user_id) == ['2024-01', '2024-02']
+
+
+def test_export_route_streams_csv(client, user_id):
+    _seed(user_id)
+    response = client.get('/export?kind=balances&format=csv&end=2024-02-28')
+    assert response.status_code == 200
+    lines = response.get_data(as_text=True).splitlines()
+    assert lines[0] == 'kind,id,date,type,amount,deposits,withdrawals,description'
+    assert [line.split(',')[2] for line in lines[1:]] == ['2024-01-10', '2024-02-10']
@@ -0,0 +1,64 @@
+from db.models import Balance, Database, Goal, User
+from services.commands import CommandService
+from services.forecast_engine import ForecastEngine
+
+BALANCES = [{'date': f'2024-01-{day:02d}', 'amount': 100.0 + 10 * day + (day % 3)} for day in range(1, 21)]
+
+
+def test_evaluate_goals_matches_predict_goal_date():
+    engine = ForecastEngine()
+    goals = [{'id': 1, 'target_amount': 250.0},
+             {'id': 2, 'target_amount': 500.0, 'target_date': '2024-02-01'},
+             {'id': 3, 'target_amount': 1000.0, 'target_date': '2024-12-31'}]
+    results = engine.evaluate_goals(BALANCES, goals)
+
+    assert [r['id'] for r in results] == [1, 2, 3]
+    assert results[0]['reached'] and results[0]['predicted_date'] is None
+    for goal, result in zip(goals[1:], results[1:]):
+        assert (result['predicted_date'], result['message']) == \
+            engine.predict_goal_date(BALANCES, goal['target_amount'])
+    assert results[1]['on_track'] is False
+    assert results[2]['on_track'] is True
+    assert results[1]['progress'] == round(BALANCES[-1]['amount'] / 500 * 100, 2)
+
+
+def test_evaluate_goals_without_usable_trend():
+    engine = ForecastEngine()
+    goal = [{'id': 1, 'target_amount': 1000.0}]
+    assert engine.evaluate_goals(BALANCES[:1], goal)[0]['message'] == "Dados insuficientes para previsão"
+    falling = [{'date': b['date'], 'amount': 400.0 - 10 * i} for i, b in enumerate(BALANCES)]
+    assert engine.evaluate_goals(falling, goal)[0]['message'] == "Tendência não permite alcançar a meta"
+    assert engine.evaluate_goals([], goal)[0]['progress'] == 0
+
+
+def test_goal_model_keeps_several_goals(tmp_path):
+    goals = Goal(Database(str(tmp_path / 'data.json')))
+    assert goals.set_goal(1, 500)
+    second = goals.add_goal(1, 800, 'Viagem', '2024-06-30')
+    assert goals.add_goal(1, 900, 'Ruim', '2024-13-40') is None
+
+    # set_goal altera só a meta principal (a primeira cadastrada)
+    assert goals.set_goal(1, 600)
+    assert [g['target_amount'] for g in goals.get_goals_by_user(1)] == [600.0, 800.0]
+    assert goals.update_goal(second['id'], 1, description='Férias', target_amount='850.5')
+    assert goals.get_goals_by_user(1)[1]['description'] == 'Férias'
+
+    assert goals.delete_goal(1, second['id'])
+    assert goals.get_goal(1)['target_amount'] == 600.0
+    assert goals.delete_goal(1) and goals.get_goals_by_user(1) == []
+
+
+def test_goals_command_evaluates_all_goals(tmp_path):
+    db = Database(str(tmp_path / 'data.json'))
+    User(db).create_user('ana', 'x')
+    for row in BALANCES:
+        Balance(db).add_balance(1, row['date'], row['amount'])
+    service = CommandService(db)
+    service.execute('add-goal', {'user': 'ana', 'amount': '250'})
+    service.execute('add-goal', {'user': 'ana', 'amount': '500', 'description': 'Dobro',
+                                 'target_date': '01/02/2024'})
+
+    result = service.execute('goals', {'user': 'ana'})['goals']
+    assert [g['description'] for g in result] == ['', 'Dobro']
+    assert result[0]['reached'] and result[1]['target_date'] == '2024-02-01'
+    assert result[1]['predicted_date']
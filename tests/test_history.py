@@ -0,0 +1,110 @@
+from datetime import date, timedelta
+
+import db
+from db.models import Balance, Transaction
+
+
+def _seed(user_id, days=30):
+    database = db.get_db()
+    with database.batch():
+        for i in range(days):
+            day = (date(2024, 1, 1) + timedelta(days=i)).isoformat()
+            Balance(database).add_balance(user_id, day, 100 + i)
+            Transaction(database).add_transaction(user_id, day, 'deposit', 1, f"dep {i}")
+
+
+def test_history_pages_follow_cursor(client, user_id):
+    _seed(user_id)
+    first = client.get('/api/history?limit=10').get_json()
+    assert [item['date'] for item in first['items']][:2] == ['2024-01-30', '2024-01-29']
+    assert len(first['items']) == 10
+    assert first['next'] == f"2024-01-21:{first['items'][-1]['id']}"
+    # O último item da página usa o saldo da próxima como anterior
+    assert first['items'][-1]['current_balance'] == 120.0
+    last = first['items'][-1]
+    assert last['profit'] == round(120.0 - 119.0 - last['deposits'] + last['withdrawals'], 2)
+    assert first['items'][0]['edit_url'] == f"/edit_balance/{first['items'][0]['id']}"
+    assert first['items'][0]['delete_url'] == f"/delete_balance/{first['items'][0]['id']}"
+
+    dates = [item['date'] for item in first['items']]
+    cursor = first['next']
+    while cursor:
+        page = client.get('/api/history', query_string={'after': cursor, 'limit': 10}).get_json()
+        dates += [item['date'] for item in page['items']]
+        cursor = page['next']
+    assert dates == [(date(2024, 1, 30) - timedelta(days=i)).isoformat() for i in range(30)]
+
+
+def test_transactions_pages_follow_cursor(client, user_id):
+    _seed(user_id)
+    page = client.get('/api/transactions?limit=25').get_json()
+    assert len(page['items']) == 25
+    assert page['items'][0]['description'] == 'dep 29'
+    assert page['items'][0]['edit_url'] == f"/edit_transaction/{page['items'][0]['id']}"
+    rest = client.get('/api/transactions', query_string={'after': page['next']}).get_json()
+    assert [item['description'] for item in rest['items']] == [f"dep {i}" for i in range(4, -1, -1)]
+    assert rest['next'] is None
+
+
+def test_history_rejects_bad_arguments(client, user_id):
+    _seed(user_id, days=3)
+    response = client.get('/api/history?after=ontem')
+    assert response.status_code == 400
+    assert 'Cursor inválido' in response.get_json()['error']
+    assert client.get('/api/transactions?limit=x').status_code == 400
+    # Limite acima do máximo é reduzido, não recusado
+    assert len(client.get('/api/history?limit=5000').get_json()['items']) == 3
+
+
+def test_history_requires_login(app):
+    response = app.test_client().get('/api/history')
+    assert response.status_code == 302
+
+
+def test_check_daily(client, user_id):
+    Balance(db.get_db()).add_balance(user_id, '2024-02-01', 10)
+    assert client.get('/check_daily?date=2024-02-01').get_json() == {'exists': True}
+    assert client.get('/check_daily?date=2024-02-02').get_json() == {'exists': False}
+    response = client.get('/check_daily?date=02/01/2024')
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+
+def test_occupied_dates_revalidates_with_etag(client, user_id):
+    balances = Balance(db.get_db())
+    balances.add_balance(user_id, '2024-02-01', 10)
+    balances.add_balance(user_id, '2024-02-03', 12)
+    response = client.get('/api/occupied_dates')
+    assert response.status_code == 200
+    assert response.get_json()['months'] == {'2024-02': 0b101}
+    assert response.headers['Cache-Control'] == 'no-cache'
+    etag = response.headers['ETag']
+
+    assert client.get('/api/occupied_dates', headers={'If-None-Match': etag}).status_code == 304
+
+    balances.add_balance(user_id, '2024-03-31', 15)
+    response = client.get('/api/occupied_dates', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert response.get_json()['months'] == {'2024-02': 0b101, '2024-03': 1 << 30}
+
+
+def test_occupied_dates_etag_follows_data_without_events(client, user_id):
+    database = db.get_db()
+    # Dados anteriores ao registro de eventos: a versão de eventos fica parada
+    with database.write() as tx:
+        tx.set_rows('balances', user_id, [{'id': 1, 'user_id': user_id, 'date': '2024-02-01',
+                                           'day': 738917, 'amount': 10.0,
+                                           'deposits': 0.0, 'withdrawals': 0.0}])
+    version = database.events.version(user_id)
+    etag = client.get('/api/occupied_dates').headers['ETag']
+
+    # Reparo/reconstrução que grava saldos sem passar por eventos
+    with database.write() as tx:
+        rows = list(tx.rows('balances', user_id))
+        tx.set_rows('balances', user_id, rows + [{**rows[0], 'id': 2, 'date': '2024-02-02',
+                                                  'day': 738918}])
+    assert database.events.version(user_id) == version
+    response = client.get('/api/occupied_dates', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.get_json()['months'] == {'2024-02': 0b11}
@@ -0,0 +1,45 @@
+from db.integrity import HASHED_FIELDS, IntegrityVerifier
+from db.models import Balance, Database, Transaction
+
+
+def test_month_hashes_follow_writes_and_persist(tmp_path):
+    db = Database(str(tmp_path / 'data.json'))
+    Balance(db).add_balance(1, '2024-01-01', 100)
+    Transaction(db).add_transaction(1, '2024-01-02', 'deposit', 10)
+    Transaction(db).add_transaction(1, '2024-02-02', 'withdrawal', 5)
+    first = Transaction(db).get_transactions_by_user(1)[0]
+    Transaction(db).delete_transaction(first['id'], 1)
+    verifier = IntegrityVerifier(db)
+    for table in HASHED_FIELDS:
+        assert verifier.partition_hashes(table, 1) == verifier.partition_hashes(table, 1, fresh=True)
+
+    assert verifier.verify(user_ids=[1])['issues'] == 0
+
+    reloaded = Database(db.db_path)
+    report = IntegrityVerifier(reloaded).verify(user_ids=[1])
+    assert report['unchanged'] == 1
+    # Hashes lidos da tabela: nenhum registro foi rehashado
+    assert not any(key[0] == 'month_hashes' for key in reloaded.snapshot()._indexes)
+
+
+def test_legacy_users_are_checked_against_transactions(tmp_path):
+    db = Database(str(tmp_path / 'data.json'))
+    row = {'user_id': 1, 'deposits': 0.0, 'withdrawals': 0.0}
+    db.data = {
+        'users': [{'id': 1, 'username': 'ana', 'password': 'x'}],
+        'balances': [{**row, 'id': 1, 'date': '2024-01-01', 'amount': 100.0},
+                     {**row, 'id': 2, 'date': '2024-01-02', 'amount': 999.0, 'deposits': 10.0},
+                     {**row, 'id': 3, 'date': '2024-02-01', 'amount': 50.0}],
+        'transactions': [{'id': 1, 'user_id': 1, 'date': '2024-01-02', 'type': 'deposit', 'amount': 10.0}]
+    }
+    verifier = IntegrityVerifier(db)
+    report = verifier.verify()
+    assert report['legacy'] == 1
+    assert [(i['date'], i['problem'], i['expected']) for i in report['details']] == [
+        ('2024-01-02', 'amount', 110.0)]
+
+    report = verifier.verify(repair=True)
+    assert report['repaired'] >= 1 and report['issues'] == 0
+    assert [(b['date'], b['amount']) for b in Balance(db).get_balances_by_user(1)] == [
+        ('2024-01-01', 100.0), ('2024-01-02', 110.0), ('2024-02-01', 50.0)]
+    assert verifier.verify()['unchanged'] == 1
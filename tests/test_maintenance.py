@@ -0,0 +1,38 @@
+from db.models import Balance, Database, Transaction
+from services.maintenance import RebuildService
+
+
+def _amounts(db, user_id):
+    return [(b['date'], b['amount']) for b in Balance(db).get_balances_by_user(user_id)]
+
+
+def test_rebuild_uses_corrected_transactions(tmp_path):
+    db = Database(str(tmp_path / 'data.json'))
+    Balance(db).add_balance(1, '2024-01-01', 100)
+    Transaction(db).add_transaction(1, '2024-01-02', 'deposit', 10)
+    Transaction(db).add_transaction(1, '2024-01-03', 'withdrawal', 5)
+    # Correção feita direto no registro, sem evento
+    with db.write() as tx:
+        deposit = tx.rows('transactions', 1)[0]
+        tx.update('transactions', deposit, amount=30.0)
+
+    result = RebuildService.rebuild_all(db, user_ids=[1])
+    assert result['workers'] == 1
+    assert result['changed'] == 2
+    assert _amounts(db, 1) == [('2024-01-01', 100.0), ('2024-01-02', 130.0), ('2024-01-03', 125.0)]
+
+    # O estado do registro de eventos parte da correção
+    Transaction(db).add_transaction(1, '2024-01-04', 'deposit', 1)
+    assert _amounts(db, 1)[-1] == ('2024-01-04', 126.0)
+    assert RebuildService.rebuild_all(Database(db.db_path), user_ids=[1])['changed'] == 0
+
+
+def test_payloads_are_compact_tuples(tmp_path):
+    db = Database(str(tmp_path / 'data.json'))
+    Balance(db).add_balance(1, '2024-01-01', 100)
+    Transaction(db).add_transaction(1, '2024-01-02', 'deposit', 10.5)
+    Transaction(db).add_transaction(1, '2024-01-02', 'withdrawal', 0.25)
+    [(user_id, transactions, manual)] = RebuildService.payloads(db, [1])
+    assert user_id == 1
+    assert sorted(transactions) == [('2024-01-02', -25), ('2024-01-02', 1050)]
+    assert manual == [('2024-01-01', 10000, 0, 0)]
@@ -0,0 +1,79 @@
+import os
+
+import pytest
+from flask import Flask
+
+from services.metrics import MetricsRegistry, metrics
+from utils import register_filters
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def enabled_metrics(monkeypatch):
+    monkeypatch.setattr(metrics, 'enabled', False)
+    metrics.reset()
+    yield metrics
+    metrics.reset()
+
+
+def test_disabled_registry_records_nothing():
+    registry = MetricsRegistry()
+    registry.inc('storage_operations_total', op='load')
+    with registry.timer('report_seconds', method='x'):
+        pass
+    assert registry.render() == "\n"
+
+
+def test_render_counters_histograms_and_cache_ratio():
+    registry = MetricsRegistry(enabled=True)
+    registry.describe('storage_operations_total', "Leituras e gravações")
+    registry.inc('storage_operations_total', op='load')
+    registry.inc('storage_operations_total', 2, op='load')
+    registry.inc('cache_requests_total', cache='users', result='hit')
+    registry.inc('cache_requests_total', cache='users', result='hit')
+    registry.inc('cache_requests_total', cache='users', result='miss')
+    registry.observe('report_seconds', 0.003, method='weekly')
+    registry.observe('report_seconds', 2.0, method='weekly')
+
+    text = registry.render()
+    assert '# HELP meta_storage_operations_total Leituras e gravações' in text
+    assert 'meta_storage_operations_total{op="load"} 3' in text
+    assert 'meta_cache_hit_ratio{cache="users"} 0.6667' in text
+    assert 'meta_report_seconds_bucket{method="weekly",le="0.005"} 1' in text
+    assert 'meta_report_seconds_bucket{method="weekly",le="+Inf"} 2' in text
+    assert 'meta_report_seconds_count{method="weekly"} 2' in text
+
+
+def test_request_breakdown_lists_timed_operations():
+    registry = MetricsRegistry(enabled=True)
+    registry.begin_request()
+    with registry.timer('storage_operation_seconds', op='save'):
+        pass
+    elapsed, ops = registry.end_request()
+    assert elapsed >= 0
+    assert [name for name, _ in ops] == ['storage_operation_seconds{op=save}']
+
+
+def _app(**config):
+    from auth.auth import auth_bp
+    from dashboard.dashboard import dashboard_bp
+    app = Flask('tests', template_folder=os.path.join(ROOT_DIR, 'templates'),
+                static_folder=os.path.join(ROOT_DIR, 'static'))
+    app.config.update(SECRET_KEY='tests', **config)
+    app.register_blueprint(auth_bp)
+    app.register_blueprint(dashboard_bp)
+    register_filters(app)
+    return app
+
+
+def test_metrics_endpoint_only_when_enabled(enabled_metrics):
+    assert _app().test_client().get('/metrics').status_code == 404
+
+    client = _app(METRICS_ENABLED=True).test_client()
+    assert client.get('/login').status_code == 200
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    assert 'meta_http_request_duration_seconds_count{endpoint="auth.login",method="GET",status="200"} 1' \
+        in response.get_data(as_text=True)
@@ -0,0 +1,58 @@
+import pytest
+
+from db.models import Balance, Database, Goal, Transaction
+from db.money import round_money, to_cents
+
+
+def test_to_cents():
+    assert to_cents(58.63) == 5863
+    assert to_cents('10.10') == 1010
+    assert to_cents(3) == 300
+    # Meio centavo sobe, a partir do valor decimal (não do float)
+    assert to_cents(0.125) == 13
+    assert to_cents(1.005) == 101
+    assert to_cents(-0.125) == -13
+    assert to_cents('2.675') == 268
+    assert round_money(0.1 + 0.2) == 0.3
+    for bad in ('abc', float('inf'), float('nan'), '1e400'):
+        with pytest.raises(ValueError):
+            to_cents(bad)
+
+
+def test_models_round_amounts_to_cents(tmp_path):
+    db = Database(str(tmp_path / 'data.json'))
+    assert Balance(db).add_balance(1, '2024-01-01', '100.004', deposits='0.1')
+    assert Transaction(db).add_transaction(1, '2024-01-02', 'deposit', 0.1 + 0.2)
+    assert Goal(db).set_goal(1, '1500.999')
+
+    [balance, computed] = Balance(db).get_balances_by_user(1)
+    assert (balance['amount'], balance['deposits']) == (100.0, 0.1)
+    assert computed['amount'] == 100.3
+    assert Transaction(db).get_transactions_by_user(1)[0]['amount'] == 0.3
+    assert Goal(db).get_goal(1)['target_amount'] == 1501.0
+    assert db.events.events(1)[0]['data']['amount'] == 100.0
+
+
+def test_models_reject_non_finite_amounts(tmp_path):
+    db = Database(str(tmp_path / 'data.json'))
+    assert not Balance(db).add_balance(1, '2024-01-01', float('inf'))
+    assert not Transaction(db).add_transaction(1, '2024-01-01', 'deposit', 'nan')
+    assert not Goal(db).set_goal(1, 'muito')
+    assert Balance(db).get_balances_by_user(1) == []
+
+
+def test_history_page_profit_in_cents(tmp_path):
+    from services.history import HistoryService
+    from services.report import ReportService
+
+    db = Database(str(tmp_path / 'data.json'))
+    Balance(db).add_balance(1, '2024-01-01', 0.1)
+    Transaction(db).add_transaction(1, '2024-01-02', 'deposit', 0.2)
+    Balance(db).add_balance(1, '2024-01-03', 1.005)
+    Transaction(db).add_transaction(1, '2024-01-03', 'withdrawal', 0.7)
+
+    page = HistoryService.balance_page(db, 1)['items']
+    expected = ReportService.calculate_balances(Balance(db).get_balances_by_user(1))
+    assert [(p['date'], p['profit'], p['win_percentage']) for p in page] == \
+        [(r['date'], r['profit'], r['win_percentage']) for r in reversed(expected)]
+    assert page[0]['profit'] == 0.71
@@ -0,0 +1,75 @@
+import hashlib
+import threading
+
+import pytest
+
+import db
+from db.models import User
+from services import passwords
+from services.passwords import PasswordHasher, PasswordServiceBusy
+
+
+@pytest.fixture
+def fast_hasher(monkeypatch):
+    hasher = PasswordHasher(iterations=1000, max_workers=2)
+    monkeypatch.setattr(passwords, 'hasher', hasher)
+    yield hasher
+    hasher.shutdown()
+
+
+def _login(app, password):
+    return app.test_client().post('/login', data={'username': 'bia', 'password': password})
+
+
+def test_hash_and_verify(fast_hasher):
+    stored = fast_hasher.hash('segredo')
+    assert stored.startswith('pbkdf2:sha256:1000$')
+    assert fast_hasher.verify(stored, 'segredo')
+    assert not fast_hasher.verify(stored, 'outra')
+    assert not fast_hasher.needs_rehash(stored)
+
+
+def test_rehash_when_cost_changes(fast_hasher):
+    stored = PasswordHasher(iterations=500).hash('segredo')
+    valid, new_hash = fast_hasher.verify_and_update(stored, 'segredo')
+    assert valid and new_hash.startswith(fast_hasher.current_method + '$')
+    assert fast_hasher.verify_and_update(stored, 'errada') == (False, None)
+
+
+def test_legacy_hash_is_migrated_on_login(app, fast_hasher):
+    legacy = hashlib.sha256(b'segredo').hexdigest()
+    users = User(db.get_db())
+    users.create_user('bia', legacy)
+
+    assert _login(app, 'errada').status_code == 200
+    assert users.get_user_by_username('bia')['password'] == legacy
+
+    assert _login(app, 'segredo').status_code == 302
+    stored = users.get_user_by_username('bia')['password']
+    assert stored.startswith(fast_hasher.current_method + '$')
+    assert fast_hasher.verify(stored, 'segredo')
+    assert _login(app, 'segredo').status_code == 302
+
+
+def test_unknown_user_pays_a_verification(app, fast_hasher, monkeypatch):
+    calls = []
+    verify = fast_hasher.verify
+    monkeypatch.setattr(fast_hasher, 'verify', lambda stored, pw: calls.append(stored) or verify(stored, pw))
+    response = _login(app, 'qualquer')
+    assert response.status_code == 200
+    assert 'Credenciais inválidas' in response.get_data(as_text=True)
+    assert len(calls) == 1 and calls[0].startswith(fast_hasher.current_method + '$')
+
+
+def test_full_queue_raises_busy():
+    hasher = PasswordHasher(iterations=1000, max_workers=1, max_pending=1, acquire_timeout=0.01)
+    release = threading.Event()
+    blocked = hasher._submit('verify', release.wait)
+    try:
+        with pytest.raises(PasswordServiceBusy):
+            hasher.verify('x', 'y')
+    finally:
+        release.set()
+        blocked.result()
+        hasher.shutdown()
+    assert not hasher.verify('x', 'y')
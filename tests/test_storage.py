@@ -0,0 +1,51 @@
+import os
+
+from db import codec
+from db.models import Balance, Database
+from db.records import BalanceRecord
+from db.snapshot import LazyPartition
+
+
+def test_save_survives_unserializable_values(tmp_path):
+    path = str(tmp_path / 'data.json')
+    database = Database(path)
+    with database.write() as tx:
+        tx.set_extra('huge', 2 ** 70)
+    # orjson recusa inteiros acima de 64 bits; o json da biblioteca padrão aceita
+    assert Database(path).snapshot().as_dict()['huge'] == 2 ** 70
+
+
+def test_failed_save_keeps_previous_file(tmp_path, monkeypatch):
+    path = str(tmp_path / 'data.json')
+    database = Database(path)
+    with database.write() as tx:
+        tx.set_extra('note', 'primeira')
+    before = open(path, 'rb').read()
+
+    def broken(data, compact=False):
+        raise TypeError("valor não serializável")
+    monkeypatch.setattr(codec, 'dumps', broken)
+    with database.write() as tx:
+        tx.set_extra('note', 'segunda')
+
+    assert open(path, 'rb').read() == before
+    assert database.snapshot().as_dict()['note'] == 'segunda'
+    assert not os.path.exists(path + '.tmp')
+
+
+def test_partitions_are_converted_on_first_access(tmp_path):
+    path = str(tmp_path / 'data.json')
+    database = Database(path)
+    Balance(database).add_balance(1, '2024-01-01', 10)
+    Balance(database).add_balance(2, '2024-01-01', 20)
+
+    reloaded = Database(path)
+    view = reloaded.snapshot()
+    assert all(isinstance(p, LazyPartition) for p in view.tables['balances'].values())
+    untouched = view.rows('balances', 2)
+    assert isinstance(untouched[0], BalanceRecord)
+
+    # Versões seguintes mantêm os registros de partições que não mudaram
+    Balance(reloaded).add_balance(1, '2024-01-02', 11)
+    assert reloaded.snapshot().rows('balances', 2)[0] is untouched[0]
+    assert [b['amount'] for b in Balance(reloaded).get_balances_by_user(1)] == [10.0, 11.0]
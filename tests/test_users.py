@@ -0,0 +1,56 @@
+import db
+from db import models
+from db.models import Database, User
+
+
+def test_lookup_and_uniqueness_ignore_case(tmp_path):
+    users = User(Database(str(tmp_path / 'data.json')))
+    assert users.create_user('Ana', 'x')
+    assert not users.create_user('ANA', 'y')
+    assert not users.create_user('  ', 'y')
+    assert users.get_user_by_username('ana')['username'] == 'Ana'
+    assert users.get_user_by_id(users.get_user_by_username('aNa')['id'])['password'] == 'x'
+
+
+def test_missing_username_cache_is_invalidated(tmp_path, monkeypatch):
+    monkeypatch.setattr(models, 'MISSING_USERNAME_CACHE_SIZE', 2)
+    database = Database(str(tmp_path / 'data.json'))
+    users = User(database)
+    for name in ('bia', 'caio', 'duda'):
+        assert users.get_user_by_username(name) is None
+    # Limitado ao tamanho configurado, descartando o mais antigo
+    assert list(database._missing_usernames) == ['caio', 'duda']
+
+    assert users.create_user('Duda', 'x')
+    assert users.get_user_by_username('duda')['username'] == 'Duda'
+    assert 'duda' not in database._missing_usernames
+
+
+def test_reload_from_disk_clears_missing_cache(tmp_path):
+    path = str(tmp_path / 'data.json')
+    database = Database(path)
+    User(database).create_user('ana', 'x')
+    assert User(database).get_user_by_username('bia') is None
+
+    # Outro processo cadastra o usuário no mesmo arquivo
+    other = Database(path)
+    User(other).create_user('bia', 'y')
+    assert database.reload_if_changed()
+    assert User(database).get_user_by_username('bia')['password'] == 'y'
+
+
+def test_get_db_shares_one_instance_per_file(app):
+    assert db.get_db() is db.get_db()
+    assert db.get_db('outro.json') is not db.get_db()
+
+
+def test_login_keeps_user_record_in_session(app, monkeypatch):
+    from services import passwords
+    monkeypatch.setattr(passwords, 'hasher', passwords.PasswordHasher(iterations=1000))
+    User(db.get_db()).create_user('Ana', passwords.hash_password('segredo'))
+    client = app.test_client()
+    response = client.post('/login', data={'username': 'ANA', 'password': 'segredo'})
+    assert response.status_code == 302
+    with client.session_transaction() as sess:
+        assert sess['user'] == {'id': 1, 'username': 'Ana'}
+    assert client.get('/dashboard').status_code == 200
@@ -1,18 +1,22 @@
 # Nome do arquivo completo: utils.py
 
 from functools import wraps
-from flask import session, redirect, url_for
+from flask import session, redirect, url_for, g
 from dateutil.relativedelta import relativedelta
 
 def login_required(view):
     """
     Decorator para proteger rotas que requerem usuário autenticado.
     Redireciona para login se não houver 'user_id' na sessão.
+    O usuário fica disponível em g.user a partir do registro guardado na
+    sessão no login, sem consultar o banco de dados.
     """
     @wraps(view)
     def wrapped(*args, **kwargs):
         if 'user_id' not in session:
             return redirect(url_for('auth.login'))
+        g.user = session.get('user') or {'id': session['user_id'],
+                                         'username': session.get('username')}
         return view(*args, **kwargs)
     return wrapped
 
@@ -43,7 +47,13 @@ def format_currency(value):
 
 def register_filters(app):
     """
-    Registra filtros e globais Jinja no app Flask.
+    Registra filtros e globais Jinja no app Flask, inclusive asset_url e a
+    rota /assets dos arquivos estáticos com hash, e a rota /metrics quando
+    as métricas estão ligadas (META_METRICS ou METRICS_ENABLED).
     """
+    from services.assets import register_assets
+    from services.metrics import init_app as init_metrics
     app.jinja_env.filters['currency'] = format_currency
     app.jinja_env.globals.update(format_time_difference=format_time_difference)
+    register_assets(app)
+    init_metrics(app)